@@ -0,0 +1,106 @@
+"""
+Benchmark for ``CharStream``.
+
+Lexes grammar files with ``ANTLRv4Lexer`` using ``antlr4.InputStream``
+and ``CharStream``, and reports time it takes to build the stream and to
+lex all tokens, growth of peak RSS while the stream is built, and peak
+RSS of the whole run. Each stream is measured in a separate process,
+so that peak RSS of one run doesn't affect the other.
+
+Text of the grammars is repeated to make a large input; ANTLR grammars
+bundled with the package are used by default.
+
+Usage::
+
+    python benchmarks/char_stream.py [--repeat N] [grammar.g4 ...]
+
+"""
+
+import argparse
+import glob
+import os
+import resource
+import subprocess
+import sys
+import timeit
+
+from antlr4 import CommonTokenStream, InputStream, Token
+
+from sphinx_a4doc.syntax import Lexer, CharStream
+
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+STREAMS = {
+    'InputStream': InputStream,
+    'CharStream': CharStream,
+}
+
+
+def _read(paths, repeat):
+    texts = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            texts.append(f.read())
+    return '\n'.join(texts) * repeat
+
+
+def _rss():
+    # Linux reports kilobytes, macOS reports bytes.
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss * 1024 if sys.platform != 'darwin' else rss
+
+
+def run(stream_name, paths, repeat):
+    text = _read(paths, repeat)
+    stream_class = STREAMS[stream_name]
+
+    rss = _rss()
+    start = timeit.default_timer()
+    stream = stream_class(text)
+    build_time = timeit.default_timer() - start
+    stream_rss = _rss() - rss
+
+    lexer = Lexer(stream)
+    lexer.removeErrorListeners()
+    tokens = CommonTokenStream(lexer)
+    start = timeit.default_timer()
+    tokens.fill()
+    # Lexer doesn't ask for token text, parser does.
+    for token in tokens.tokens:
+        if token.type != Token.EOF:
+            token.text
+    lex_time = timeit.default_timer() - start
+
+    print(f'{stream_name:>12} {len(text):>10} {len(tokens.tokens):>8} '
+          f'{build_time * 1e3:>9.1f} {lex_time:>8.2f} '
+          f'{stream_rss / 2 ** 20:>10.1f} {_rss() / 2 ** 20:>8.1f}')
+
+
+def bench(paths, repeat):
+    print(f'{"stream":>12} {"chars":>10} {"tokens":>8} {"build, ms":>9} {"lex, s":>8} '
+          f'{"stream, MB":>10} {"peak, MB":>8}')
+    sys.stdout.flush()
+    for stream_name in STREAMS:
+        subprocess.run(
+            [sys.executable, __file__, '--run', stream_name, '--repeat', str(repeat), *paths],
+            check=True, env={**os.environ, 'PYTHONPATH': ROOT},
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--run', choices=list(STREAMS))
+    parser.add_argument('paths', nargs='*')
+    args = parser.parse_args()
+
+    paths = args.paths or sorted(glob.glob(os.path.join(ROOT, 'sphinx_a4doc', 'syntax', '*.g4')))
+    if args.run:
+        run(args.run, paths, args.repeat)
+    else:
+        bench(paths, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Benchmark for ``Renderer._optimize_sequence``.
+
+Renders long sequences with many ``x (',' x)*`` patterns using the current
+single-pass implementation and the quadratic one it replaced, which lives
+in the renderer tests.
+
+Usage::
+
+    python benchmarks/optimize_sequence.py
+
+"""
+
+import os
+import sys
+import timeit
+
+from sphinx_a4doc.model.model import LexerRule
+from sphinx_a4doc.model.model_renderer import Renderer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tests'))
+
+from test_renderer import _BaselineRenderer
+
+
+def _make_sequence(n):
+    sep = LexerRule.Literal("','")
+    children = []
+    while len(children) < n:
+        x = LexerRule.Literal(f"'x{len(children)}'")
+        children.append(x)
+        children.append(LexerRule.ZeroPlus(LexerRule.Sequence((sep, x))))
+    return LexerRule.Sequence(tuple(children))
+
+
+def _time(renderer_class, content, number):
+    try:
+        result = renderer_class().visit(content)
+    except RecursionError:
+        # Old implementation recursed once per folded pattern.
+        return None, 'RecursionError'
+    t = min(timeit.repeat(lambda: renderer_class().visit(content), number=number, repeat=3)) / number
+    return result, f'{t * 1e3:7.1f} ms'
+
+
+def bench(sizes=(100, 500, 1500, 5000)):
+    print(f'{"elements":>8} {"before":>14} {"after":>14}')
+    for n in sizes:
+        content = _make_sequence(n)
+        number = max(1, 2000 // n)
+        expected, before = _time(_BaselineRenderer, content, number)
+        result, after = _time(Renderer, content, number)
+        assert expected is None or result == expected
+        print(f'{n:8} {before:>14} {after:>14}')
+
+
+if __name__ == '__main__':
+    bench()
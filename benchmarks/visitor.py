@@ -0,0 +1,86 @@
+"""
+Benchmark for rule content visitors.
+
+Compares table-driven dispatch with the ``getattr``-based one, and renders
+synthetic rule bodies of increasing depth in recursive and iterative modes.
+
+Usage::
+
+    python benchmarks/visitor.py
+
+"""
+
+import sys
+import timeit
+
+from sphinx_a4doc.model.model import LexerRule, ParserRule, intern_content
+from sphinx_a4doc.model.model_renderer import Renderer
+from sphinx_a4doc.model.visitor import RuleContentVisitor
+
+
+class _Visitor(RuleContentVisitor[int]):
+    def visit_default(self, r):
+        return 0
+
+
+def _visit_getattr(visitor, r):
+    # Dispatch the way it was done before visitors had dispatch tables.
+    return getattr(visitor, r.__meta__.visitor_relay)(r)
+
+
+def bench_dispatch(number=200000):
+    nodes = [
+        LexerRule.Literal("'a'"),
+        LexerRule.CharSet('[a-z]'),
+        LexerRule.WILDCARD,
+        ParserRule.WILDCARD,
+        ParserRule.EMPTY,
+    ]
+    visitor = _Visitor()
+
+    def table():
+        for node in nodes:
+            visitor.visit(node)
+
+    def baseline():
+        for node in nodes:
+            _visit_getattr(visitor, node)
+
+    n = number * len(nodes)
+    print('dispatch, ns per node:')
+    print(f'  getattr: {timeit.timeit(baseline, number=number) / n * 1e9:8.1f}')
+    print(f'  table:   {timeit.timeit(table, number=number) / n * 1e9:8.1f}')
+
+
+def _make_deep_body(depth):
+    content = ParserRule.WILDCARD
+    for i in range(depth):
+        if i % 2:
+            content = ParserRule.Sequence((ParserRule.WILDCARD, content))
+        else:
+            content = ParserRule.Alternative((ParserRule.Maybe(content), ParserRule.WILDCARD))
+    return intern_content(content)
+
+
+def _render(content, iterative):
+    renderer = Renderer()
+    renderer._iterative = iterative
+    try:
+        start = timeit.default_timer()
+        renderer.visit(content)
+        return f'{(timeit.default_timer() - start) * 1e3:8.1f} ms'
+    except RecursionError:
+        return '  RecursionError'
+
+
+def bench_depth(depths=(10, 100, 1000, 10000)):
+    print(f'rendering deep bodies (recursion limit is {sys.getrecursionlimit()}):')
+    print(f'  {"depth":>6} {"recursive":>16} {"iterative":>16}')
+    for depth in depths:
+        content = _make_deep_body(depth)
+        print(f'  {depth:6} {_render(content, False):>16} {_render(content, True):>16}')
+
+
+if __name__ == '__main__':
+    bench_dispatch()
+    bench_depth()
@@ -1,11 +1,20 @@
 import os
 
 import sphinx.application
+import sphinx.util.logging
 
 from sphinx_a4doc.domain import A4Domain
 from sphinx_a4doc.diagram_directive import RailroadDiagramNode, RailroadDiagram, LexerRuleDiagram, ParserRuleDiagram
-from sphinx_a4doc.settings import register_settings
+from sphinx_a4doc.settings import register_settings, global_namespace
 from sphinx_a4doc.autodoc_directive import AutoGrammar, AutoRule
+from sphinx_a4doc.model.model import ModelCache
+from sphinx_a4doc.model.impl import ModelCacheImpl
+from sphinx_a4doc.model.persistent_cache import PersistentModelCache
+from sphinx_a4doc.model.preload import find_grammars, preload_models
+from sphinx_a4doc.warmup import warm_up_models
+
+
+logger = sphinx.util.logging.getLogger(__name__)
 
 
 def config_inited(app, config):
@@ -13,6 +22,105 @@ def config_inited(app, config):
     config.html_static_path.insert(0, static_path)
 
 
+def get_persistent_cache():
+    cache = ModelCache.instance()
+    if isinstance(cache, ModelCacheImpl):
+        return cache.get_persistent_cache()
+    return None
+
+
+def builder_inited(app):
+    settings = global_namespace.load_global_settings(app.env)
+    cache = ModelCache.instance()
+    if isinstance(cache, ModelCacheImpl):
+        cache.set_check_hashes(settings.cache_check_hashes)
+        cache.set_fast_loader(settings.fast_loader)
+        cache.set_two_stage_parsing(settings.two_stage_parsing)
+        cache.set_warm_up_parser(settings.warm_up_parser)
+        cache.set_incremental(settings.incremental_reparse)
+        cache.set_token_vocab_files(settings.token_vocab_files)
+        cache.set_limits(
+            settings.cache_max_models,
+            settings.cache_max_memory * 2 ** 20 if settings.cache_max_memory is not None else None
+        )
+    if settings.cache and isinstance(cache, ModelCacheImpl):
+        cache_dir = settings.cache_dir or os.path.join(app.doctreedir, 'a4doc')
+        if not os.path.isabs(cache_dir):
+            cache_dir = os.path.join(app.confdir, cache_dir)
+        persistent = cache.get_persistent_cache()
+        if persistent is None or persistent.get_path() != cache_dir:
+            cache.set_persistent_cache(PersistentModelCache(cache_dir))
+    if settings.preload and isinstance(cache, ModelCacheImpl):
+        paths = find_grammars(settings.base_path, settings.preload)
+        max_workers = app.parallel if app.parallel > 1 else None
+        count = preload_models(cache, paths, max_workers)
+        if count:
+            logger.info(f'a4doc: preloaded {count} grammar(s)')
+
+
+# Cache statistics are collected per document so that they survive
+# parallel reads: each worker reports statistics for documents it has read,
+# and they're merged back into the main environment.
+
+def env_before_read_docs(app, env, docnames):
+    settings = global_namespace.load_global_settings(env)
+    if settings.warm_up and app.parallel > 1:
+        warm_up_models(app, docnames)
+
+    env.a4_model_cache_stats = {}
+    persistent = get_persistent_cache()
+    if persistent is not None:
+        # Grammars loaded before reading any documents.
+        env.a4_model_cache_stats[None] = (persistent.hits, persistent.misses)
+
+
+def source_read(app, docname, source):
+    persistent = get_persistent_cache()
+    if persistent is not None:
+        app.env.temp_data['a4:model_cache_stats'] = (persistent.hits, persistent.misses)
+
+
+def doctree_read(app, doctree):
+    persistent = get_persistent_cache()
+    initial = app.env.temp_data.get('a4:model_cache_stats')
+    if persistent is not None and initial is not None:
+        hits, misses = initial
+        stats = getattr(app.env, 'a4_model_cache_stats', {})
+        stats[app.env.docname] = (persistent.hits - hits, persistent.misses - misses)
+        app.env.a4_model_cache_stats = stats
+
+
+def env_merge_info(app, env, docnames, other):
+    stats = getattr(env, 'a4_model_cache_stats', {})
+    other_stats = getattr(other, 'a4_model_cache_stats', {})
+    for docname in docnames:
+        if docname in other_stats:
+            stats[docname] = other_stats[docname]
+    env.a4_model_cache_stats = stats
+
+
+def build_finished(app, exception):
+    cache = ModelCache.instance()
+    if exception is None and isinstance(cache, ModelCacheImpl):
+        # Only the main process gets here, so states that were added
+        # by parallel workers are lost. That's fine since most of the warm-up
+        # happens before sphinx forks.
+        cache.save_parser_state()
+
+    if isinstance(cache, ModelCacheImpl) and app.verbosity > 0:
+        for model_stats in cache.get_model_stats():
+            logger.verbose(f'a4doc: {model_stats.path}: {model_stats.rules} rule(s), '
+                           f'{model_stats.nodes} node(s), ~{model_stats.size // 1024} KiB')
+
+    stats = getattr(app.env, 'a4_model_cache_stats', None)
+    if not stats:
+        return
+    hits = sum(h for h, _ in stats.values())
+    misses = sum(m for _, m in stats.values())
+    if hits or misses:
+        logger.info(f'a4doc: grammar cache: {hits} hit(s), {misses} miss(es)')
+
+
 def setup(app: sphinx.application.Sphinx):
     app.setup_extension('sphinx_a4doc.contrib.marker_nodes')
 
@@ -36,6 +144,12 @@ def setup(app: sphinx.application.Sphinx):
     app.add_css_file('a4_railroad_diagram.css')
 
     app.connect('config-inited', config_inited)
+    app.connect('builder-inited', builder_inited)
+    app.connect('env-before-read-docs', env_before_read_docs)
+    app.connect('source-read', source_read)
+    app.connect('doctree-read', doctree_read)
+    app.connect('env-merge-info', env_merge_info)
+    app.connect('build-finished', build_finished)
 
     return {
         'version': '1.0.0',
@@ -6,6 +6,7 @@ import docutils.nodes
 import sphinx.addnodes
 import sphinx.util.docutils
 import sphinx.util.nodes
+import sphinx.util.logging
 
 from sphinx_a4doc.settings import GrammarType, OrderSettings, GroupingSettings, EndClass
 from sphinx_a4doc.settings import global_namespace, autogrammar_namespace, autorule_namespace
@@ -19,16 +20,23 @@ from sphinx_a4doc.contrib.marker_nodes import find_or_add_marker
 from typing import *
 
 
+logger = sphinx.util.logging.getLogger(__name__)
+
+
+def resolve_grammar_path(base_path: str, name: str) -> str:
+    # TODO: use grammar resolver
+    if not name.endswith('.g4'):
+        name += '.g4'
+    name = os.path.normpath(os.path.expanduser(name))
+    return os.path.join(base_path, name)
+
+
 class ModelLoaderMixin:
     used_models: Optional[Set[Model]] = None
 
     def load_model(self, name: str) -> Model:
-        # TODO: use grammar resolver
         base_path = global_namespace.load_global_settings(self.env).base_path
-        if not name.endswith('.g4'):
-            name += '.g4'
-        name = os.path.normpath(os.path.expanduser(name))
-        path = os.path.join(base_path, name)
+        path = resolve_grammar_path(base_path, name)
         model = ModelCache.instance().from_file(path)
         if self.used_models is None:
             self.used_models = set()
@@ -66,6 +74,44 @@ class DocsRendererMixin:
                 else:
                     self.state.nested_parse(content, 0, node)
 
+    def render_diagram(self, rule: RuleBase):
+        renderer = Renderer(
+            self.diagram_settings.literal_rendering,
+            self.diagram_settings.cc_to_dash,
+            factor_alternatives=self.diagram_settings.factor_alternatives
+        )
+        dia = renderer.visit(rule.content)
+        if renderer.factored_nodes:
+            logger.verbose(f'a4doc: {rule.position}: factoring alternatives removed '
+                           f'{renderer.factored_nodes} element(s) from {rule.name!r}')
+        return dia
+
+    def render_referrers(self, rule: RuleBase, model: Model, node):
+        referrers = ModelCache.instance().get_referrers(rule, model)
+        if not referrers:
+            return
+
+        for path in sorted({r.model.get_path() for r in referrers if not r.model.is_in_memory()}):
+            self.env.note_dependency(path)
+
+        paragraph = docutils.nodes.paragraph()
+        paragraph += docutils.nodes.Text('Referenced by: ')
+        for i, referrer in enumerate(referrers):
+            if i > 0:
+                paragraph += docutils.nodes.Text(', ')
+            xref = sphinx.addnodes.pending_xref(
+                '',
+                reftype='rule',
+                refdomain='a4',
+                refexplicit=False,
+                reftarget=f'{referrer.model.get_name()}.{referrer.name}',
+                refdoc=self.env.docname,
+                refwarn=False
+            )
+            xref += docutils.nodes.literal(referrer.name, referrer.name)
+            paragraph += xref
+        node += paragraph
+
 
 class AutoGrammar(Grammar, ModelLoaderMixin, DocsRendererMixin):
     """
@@ -120,6 +166,7 @@ class AutoGrammar(Grammar, ModelLoaderMixin, DocsRendererMixin):
         super().__init__(*args, *kwargs)
 
         self.root_rule: Optional[RuleBase] = None
+        self.model: Optional[Model] = None
 
     def run(self):
         self.name = 'a4:grammar'
@@ -128,7 +175,7 @@ class AutoGrammar(Grammar, ModelLoaderMixin, DocsRendererMixin):
             self.options['diagram-cc-to-dash'] = self.options['cc-to-dash']
 
         # Load model from file
-        model = self.load_model(self.arguments[0])
+        model = self.model = self.load_model(self.arguments[0])
         # Early exit
         if model.has_errors():
             self.register_deps()
@@ -336,11 +383,7 @@ class AutoGrammar(Grammar, ModelLoaderMixin, DocsRendererMixin):
             if not rule.is_doxygen_no_diagram:
                 env = self.env
                 grammar = env.ref_context.get('a4:grammar', '__default__')
-                renderer = Renderer(
-                    self.diagram_settings.literal_rendering,
-                    self.diagram_settings.cc_to_dash
-                )
-                dia = renderer.visit(rule.content)
+                dia = self.render_diagram(rule)
 
                 settings = self.diagram_settings
 
@@ -357,6 +400,9 @@ class AutoGrammar(Grammar, ModelLoaderMixin, DocsRendererMixin):
 
             self.render_docs(rule.position.file, docs, desc_content)
 
+            if self.settings.referenced_by:
+                self.render_referrers(rule, self.model, desc_content)
+
             break
 
         return nodes
@@ -463,11 +509,7 @@ class AutoRule(Rule, ModelLoaderMixin, DocsRendererMixin):
                 if not rule.is_doxygen_no_diagram:
                     env = self.env
                     grammar = env.ref_context.get('a4:grammar', '__default__')
-                    renderer = Renderer(
-                        self.diagram_settings.literal_rendering,
-                        self.diagram_settings.cc_to_dash
-                    )
-                    dia = renderer.visit(rule.content)
+                    dia = self.render_diagram(rule)
 
                     settings = self.diagram_settings
 
@@ -477,6 +519,9 @@ class AutoRule(Rule, ModelLoaderMixin, DocsRendererMixin):
 
                 self.render_docs(rule.position.file, docs, doc_node)
 
+                if self.settings.referenced_by:
+                    self.render_referrers(rule, model, doc_node)
+
                 doc_node.replace_self(doc_node.children)
             finally:
                 self.after_content()
@@ -140,6 +140,13 @@ class Diagram:
         return Stack(self, list(items))
 
     def choice(self, *items: 'DiagramItem', default: int = 0):
+        threshold = self.settings.choice_grid_threshold
+        if (
+            threshold is not None and
+            len(items) >= threshold and
+            all(item.height == 0 for item in items)
+        ):
+            return GridChoice(self, list(items))
         return Choice(self, default, list(items))
 
     def optional(self, item: 'DiagramItem', skip: bool = False) -> 'DiagramItem':
@@ -1144,6 +1151,185 @@ class Choice(DiagramItem):
         return fmt
 
 
+# Maps arc directions to directions of their mirror images.
+_MIRROR_ARC = str.maketrans('ew', 'we')
+
+
+@dataclass
+class GridChoice(DiagramItem):
+    def __init__(self, dia: Diagram, items: List[DiagramItem]):
+        assert len(items) >= 1
+        assert all(item.height == 0 for item in items)
+
+        super().__init__(dia, 'g')
+
+        self.items = items
+
+        # Alternatives are packed into columns, top to bottom
+        # and then left to right. All columns are fed from the entry line,
+        # and joined by the exit rail that runs below them:
+        #
+        # ----+-----------+-----------+            /->
+        #     |           |           |            |
+        #     \-># 0 |->+ \-># 3 |->+ \-># 6 |->+  |
+        #     |         | |         | |         |  |
+        #     \-># 1 |->+ \-># 4 |->+ \-># 7 |->+  |
+        #     |         | |         |           |  |
+        #     \-># 2 |->+ \-># 5 |->+           |  |
+        #               |           |           |  |
+        #               \-----------\-----------\--/
+        #
+        # Unlike `Choice`, this layout needs two paths per diagram
+        # instead of two per alternative.
+
+        arc_radius = self.settings.arc_radius
+
+        up = max(item.up for item in self.items)
+        down = max(item.down for item in self.items)
+
+        # Offset of the first row below the entry line, and distance
+        # between rows.
+        self.first_row = max(arc_radius * 2, up + self.settings.vertical_separation)
+        self.row_pitch = max(arc_radius * 2, down + self.settings.vertical_separation + up)
+
+        columns = 1
+        while columns < len(self.items):
+            if self._layout(columns + 1)[1] > self.settings.max_width:
+                break
+            columns += 1
+
+        self.rows = math.ceil(len(self.items) / columns)
+        self.column_widths, self.width = self._layout(columns)
+
+        self.height = 0
+        self.up = 0
+        self.down = (
+            self.first_row + (self.rows - 1) * self.row_pitch +
+            max(arc_radius * 2, down + self.settings.vertical_separation)
+        )
+
+        self.width = math.ceil(self.width)
+
+    def _layout(self, columns: int) -> Tuple[List[int], int]:
+        # Returns widths of alternatives in each column, and total width.
+        rows = math.ceil(len(self.items) / columns)
+        column_widths = [
+            max(item.width for item in self.items[i:i + rows])
+            for i in range(0, len(self.items), rows)
+        ]
+
+        # Each column has an entry rail, an exit rail and two arcs
+        # on each side. Columns are separated, and the last rail
+        # needs two more arcs to get back to the main line.
+        arc_radius = self.settings.arc_radius
+        width = (
+            sum(w + arc_radius * 3 for w in column_widths) +
+            self.settings.horizontal_separation * (len(column_widths) - 1) +
+            arc_radius * 3
+        )
+        return column_widths, width
+
+    def format(self, x, y, width, reverse, alignment_override):
+        fmt = FormattedItem(self)
+
+        left_gap, right_gap = self.determine_gaps(width, alignment_override)
+
+        alignment_override = self.alignment_override_reverse(reverse)
+
+        # Entry and exit lines are the same since height is zero.
+        self.dia.path(x, y) \
+            .h(left_gap) \
+            .format() \
+            .add_to(fmt)
+        self.dia.path(x + left_gap + self.width, y) \
+            .h(right_gap) \
+            .format() \
+            .add_to(fmt)
+
+        x += left_gap
+
+        arc_radius = self.settings.arc_radius
+        bus_y = y + self.down
+
+        # Layout is computed for left-to-right flow. When reversed,
+        # it is mirrored: x coordinates and horizontal moves are flipped,
+        # and so are directions of arcs.
+        if reverse:
+            def mirror(px):
+                return 2 * x + self.width - px
+            dx_sign = -1
+        else:
+            def mirror(px):
+                return px
+            dx_sign = 1
+
+        def arc(sweep):
+            return sweep.translate(_MIRROR_ARC) if reverse else sweep
+
+        # X coordinates of the column starts.
+        column_xs = []
+        column_x = x
+        for column_width in self.column_widths:
+            column_xs.append(column_x)
+            column_x += column_width + arc_radius * 3 + self.settings.horizontal_separation
+
+        # Exit line joins all exit rails, then goes up to the main line.
+        # It starts where the first exit rail ends, see below.
+        first_exit_x = column_xs[0] + self.column_widths[0] + arc_radius * 4
+        exit = self.dia.path(mirror(first_exit_x), bus_y) \
+            .h(dx_sign * (x + self.width - arc_radius * 2 - first_exit_x)) \
+            .arc(arc('se')) \
+            .v(y - bus_y + arc_radius * 2) \
+            .arc(arc('wn'))
+        entry = self.dia.path(mirror(x), y) \
+            .h(dx_sign * (column_xs[-1] - x))
+
+        # Current pen positions, paths are continued with relative moves.
+        entry_x, entry_y = column_xs[-1], y
+        exit_x, exit_y = x + self.width, y
+
+        for column, (column_x, column_width) in enumerate(zip(column_xs, self.column_widths)):
+            items = self.items[column * self.rows:(column + 1) * self.rows]
+            rows_y = [y + self.first_row + i * self.row_pitch for i in range(len(items))]
+
+            ref_x = column_x + arc_radius * 2
+            rail_x = column_x + arc_radius
+            exit_rail_x = ref_x + column_width + arc_radius
+
+            # Entry rail goes down to the last row, other rows branch off it.
+            entry.m(dx_sign * (column_x - entry_x), y - entry_y) \
+                .arc(arc('ne')) \
+                .v(rows_y[-1] - y - arc_radius * 2) \
+                .arc(arc('ws'))
+            entry_x, entry_y = ref_x, rows_y[-1]
+            for row_y in rows_y[:-1]:
+                entry.m(dx_sign * (rail_x - entry_x), row_y - arc_radius - entry_y) \
+                    .arc(arc('ws'))
+                entry_x, entry_y = ref_x, row_y
+
+            # Exit rail goes from the first row down to the exit line,
+            # other rows join it.
+            exit.m(dx_sign * (ref_x + column_width - exit_x), rows_y[0] - exit_y) \
+                .arc(arc('ne')) \
+                .v(bus_y - rows_y[0] - arc_radius * 2) \
+                .arc(arc('ws'))
+            exit_x, exit_y = exit_rail_x + arc_radius, bus_y
+            for row_y in rows_y[1:]:
+                exit.m(dx_sign * (ref_x + column_width - exit_x), row_y - exit_y) \
+                    .arc(arc('ne'))
+                exit_x, exit_y = exit_rail_x, row_y + arc_radius
+
+            for item, row_y in zip(items, rows_y):
+                item_x = mirror(ref_x + column_width) if reverse else ref_x
+                item.format(item_x, row_y, column_width, reverse, alignment_override) \
+                    .add_to(fmt)
+
+        entry.format().add_to(fmt)
+        exit.format().add_to(fmt)
+
+        return fmt
+
+
 @dataclass
 class OneOrMore(DiagramItem):
     item: DiagramItem = None
@@ -7,11 +7,7 @@ import sphinx.writers.html
 import sphinx.util.logging
 import sphinx.environment
 
-import yaml
-import yaml.error
-
 from sphinx_a4doc.contrib.configurator import ManagedDirective
-from sphinx_a4doc.contrib.railroad_diagrams import Diagram, HrefResolver
 
 from sphinx_a4doc.model.model import ModelCache
 from sphinx_a4doc.model.model_renderer import Renderer
@@ -23,7 +19,12 @@ from typing import *
 logger = sphinx.util.logging.getLogger(__name__)
 
 
-class DomainResolver(HrefResolver):
+class DomainResolver:
+    """
+    Implements `HrefResolver` interface from the diagram engine.
+
+    """
+
     def __init__(self, builder, grammar: str):
         self.builder = builder
         self.grammar = grammar
@@ -96,6 +97,9 @@ class RailroadDiagramNode(docutils.nodes.Element, docutils.nodes.General):
 
     @staticmethod
     def visit_node_html(self: sphinx.writers.html.HTMLTranslator, node):
+        # Diagram engine is only imported when there are diagrams to render.
+        from sphinx_a4doc.contrib.railroad_diagrams import Diagram
+
         resolver = DomainResolver(self.builder, node['grammar'])
         dia = Diagram(settings=node['options'], href_resolver=resolver)
         try:
@@ -113,6 +117,7 @@ class RailroadDiagramNode(docutils.nodes.Element, docutils.nodes.General):
         if node['options'].alt:
             self.add_text('{}'.format(node['options'].alt))
         else:
+            import yaml
             self.add_text(yaml.dump(node['diagram']))
         raise docutils.nodes.SkipNode
 
@@ -392,10 +397,23 @@ class RailroadDiagram(sphinx.util.docutils.SphinxDirective, ManagedDirective):
         return [RailroadDiagramNode(content, self.settings, grammar)]
 
     def get_content(self):
+        import yaml
         return yaml.safe_load('\n'.join(self.content))
 
 
 class AntlrDiagram(RailroadDiagram):
+    def render(self, content):
+        renderer = Renderer(
+            self.settings.literal_rendering,
+            self.settings.cc_to_dash,
+            factor_alternatives=self.settings.factor_alternatives
+        )
+        dia = renderer.visit(content)
+        if renderer.factored_nodes:
+            logger.verbose(f'a4doc: {self.state_machine.reporter.source}:{self.lineno}: '
+                           f'factoring alternatives removed {renderer.factored_nodes} element(s)')
+        return dia
+
     def get_imports(self):
         if self.env.temp_data.get('a4:autogrammar_ctx'):
             path = self.env.temp_data['a4:autogrammar_ctx'][-1]
@@ -436,11 +454,7 @@ class LexerRuleDiagram(AntlrDiagram):
         tree = model.lookup('ROOT')
         if tree is None or tree.content is None:
             raise RuntimeError('cannot parse the rule')
-        renderer = Renderer(
-            self.settings.literal_rendering,
-            self.settings.cc_to_dash
-        )
-        return renderer.visit(tree.content)
+        return self.render(tree.content)
 
 
 class ParserRuleDiagram(AntlrDiagram):
@@ -484,8 +498,4 @@ class ParserRuleDiagram(AntlrDiagram):
         tree = model.lookup('root')
         if tree is None or tree.content is None:
             raise RuntimeError('cannot parse the rule')
-        renderer = Renderer(
-            self.settings.literal_rendering,
-            self.settings.cc_to_dash
-        )
-        return renderer.visit(tree.content)
+        return self.render(tree.content)
@@ -0,0 +1,433 @@
+import os
+import re
+import textwrap
+
+from typing import *
+
+from sphinx_a4doc.model.model import Position, LazyContent, RuleBase, LexerRule, ParserRule, Section
+from sphinx_a4doc.model.impl import ModelCacheImpl, ModelImpl
+
+import sphinx.util.logging
+
+__all__ = [
+    'MetaLoader',
+    'RuleBuilder',
+    'LexerRuleBuilder',
+    'ParserRuleBuilder',
+    'SourceContent',
+    'make_suffix_rule',
+    'make_alt_rule',
+    'make_seq_rule',
+    'make_section',
+    'load_docs',
+    'get_alt_literal',
+    'get_seq_literal',
+    'get_suffix_literal',
+]
+
+
+logger = sphinx.util.logging.getLogger(__name__)
+
+
+CMD_RE = re.compile(r'''
+    //@\s*doc\s*:\s*(?P<cmd>[a-zA-Z0-9_-]+)\s*(?P<ctx>.*)
+    ''', re.UNICODE | re.VERBOSE)
+
+
+class MetaLoader:
+    """
+    Populates model meta: grammar name and type, imports and tokens.
+
+    This class does not depend on the ANTLR runtime, so that it can be used
+    by both the ANTLR-based loader and the `FastLoader`.
+
+    """
+
+    def __init__(self, model: ModelImpl, cache: ModelCacheImpl, defer_imports: bool = False):
+        self._model = model
+        self._cache = cache
+        if self._model.is_in_memory():
+            self._basedir = None
+        else:
+            self._basedir = os.path.dirname(self._model.get_path())
+        self._deferred_imports: Optional[List[str]] = [] if defer_imports else None
+
+    def add_import(self, name: str, position: Position):
+        self._add_import_file(name + '.g4', position)
+
+    def add_token_vocab(self, name: str, position: Position):
+        # Token names can be loaded from the `.tokens` file generated
+        # by ANTLR, which is much faster than parsing the lexer grammar.
+        if (
+            self._basedir is not None and
+            isinstance(self._cache, ModelCacheImpl) and
+            self._cache.get_token_vocab_files() and
+            os.path.exists(os.path.join(self._basedir, name + '.tokens'))
+        ):
+            self._add_import_file(name + '.tokens', position)
+        else:
+            self._add_import_file(name + '.g4', position)
+
+    def _add_import_file(self, filename: str, position: Position):
+        if self._model.is_in_memory():
+            logger.error(f'{position}: WARNING: imports are not allowed for in-memory grammars')
+        elif self._deferred_imports is not None:
+            self._deferred_imports.append(filename)
+        else:
+            model = self._cache.from_file(os.path.join(self._basedir, filename))
+            self._model.add_import(model)
+
+    def load_deferred_imports(self):
+        for filename in self._deferred_imports or []:
+            model = self._cache.from_file(os.path.join(self._basedir, filename))
+            self._model.add_import(model)
+        self._deferred_imports = []
+
+    def load_grammar_meta(self, gtype: str, name: str, docs):
+        t = gtype
+        if 'lexer' in t:  # that's nasty =(
+            t = 'lexer'   # in fact, the whole file is nasty =(
+        elif 'parser' in t:
+            t = 'parser'
+        else:
+            t = None
+        self._model.set_name(name)
+        self._model.set_type(t)
+        if docs:
+            docs = load_docs(self._model, docs, allow_cmd=False)
+            self._model.set_model_docs(docs['documentation'])
+
+    def add_token(self, name: str, position: Position):
+        rule = LexerRule(
+            name=name,
+            display_name=None,
+            model=self._model,
+            position=position,
+            is_literal=False,
+            is_fragment=False,
+            content=None,
+            is_doxygen_nodoc=True,
+            is_doxygen_inline=True,
+            is_doxygen_no_diagram=True,
+            importance=1,
+            documentation='',
+            section=None,
+        )
+
+        self._model.set_lexer_rule(rule.name, rule)
+
+
+class RuleBuilder:
+    """
+    Adds rules to a model. Like `MetaLoader`, rule builders don't depend
+    on the ANTLR runtime; loaders extract rules from their syntax trees
+    and pass them to a builder.
+
+    """
+
+    rule_class: Union[Type[RuleBase], Type[LexerRule], Type[ParserRule]] = None
+
+    def __init__(self, model: ModelImpl):
+        self._model = model
+        self._current_section: Optional[Section] = None
+
+    def set_section(self, section: Optional[Section]):
+        self._current_section = section
+
+
+class LexerRuleBuilder(RuleBuilder):
+    rule_class = LexerRule
+
+    def add_rule(self, name: str, line: int, docs, is_fragment: bool,
+                 content: Union[LexerRule.RuleContent, LazyContent], literal: Optional[str]):
+        doc_info = load_docs(self._model, docs)
+
+        if literal is not None:
+            is_literal = True
+        else:
+            is_literal = False
+            literal = ''
+
+        rule = LexerRule(
+            name=name,
+            display_name=doc_info['name'] or None,
+            model=self._model,
+            position=Position(self._model.get_path(), line + self._model.get_offset()),
+            content=content,
+            is_doxygen_nodoc=doc_info['is_doxygen_nodoc'],
+            is_doxygen_inline=doc_info['is_doxygen_inline'],
+            is_doxygen_no_diagram=doc_info['is_doxygen_no_diagram'],
+            importance=doc_info['importance'],
+            documentation=doc_info['documentation'],
+            is_fragment=is_fragment,
+            is_literal=is_literal,
+            section=self._current_section,
+        )
+
+        self._model.set_lexer_rule(rule.name, rule)
+        if is_literal:
+            self._model.set_lexer_rule(literal, rule)
+
+
+class ParserRuleBuilder(RuleBuilder):
+    rule_class = ParserRule
+
+    def add_rule(self, name: str, line: int, docs, content: Union[ParserRule.RuleContent, LazyContent]):
+        doc_info = load_docs(self._model, docs)
+        rule = ParserRule(
+            name=name,
+            display_name=doc_info['name'] or None,
+            model=self._model,
+            position=Position(self._model.get_path(), line + self._model.get_offset()),
+            content=content,
+            is_doxygen_nodoc=doc_info['is_doxygen_nodoc'],
+            is_doxygen_inline=doc_info['is_doxygen_inline'],
+            is_doxygen_no_diagram=doc_info['is_doxygen_no_diagram'],
+            importance=doc_info['importance'],
+            documentation=doc_info['documentation'],
+            section=self._current_section,
+        )
+
+        self._model.set_parser_rule(rule.name, rule)
+
+
+class SourceContent(LazyContent):
+    """
+    Builds rule content by parsing source text of the rule body again.
+
+    Loaders that work with ANTLR parse trees keep the body text and its
+    position instead of the tree itself. This way, the parse tree is freed
+    as soon as the rule is loaded, and the rule can be pickled without
+    building its content.
+
+    """
+
+    def __init__(self, model: ModelImpl, rule_class, text: str, line: int, column: int):
+        self._model = model
+        self._rule_class = rule_class
+        self._text = text
+        self._line = line
+        self._column = column
+
+    def load(self):
+        from sphinx_a4doc.model.loader import parse_rule_body
+        return parse_rule_body(self._model, self._rule_class, self._text, self._line, self._column)
+
+    def is_picklable(self) -> bool:
+        return True
+
+
+def make_suffix_rule(rule_class, element, suffix: Optional[str]):
+    if element == rule_class.EMPTY:
+        return element
+    if suffix is None:
+        return element
+    if suffix.startswith('?'):
+        if isinstance(element, rule_class.Maybe):
+            return element
+        else:
+            return rule_class.Maybe(child=element)
+    if suffix.startswith('+'):
+        return rule_class.OnePlus(child=element)
+    if suffix.startswith('*'):
+        return rule_class.ZeroPlus(child=element)
+    return element
+
+
+def make_alt_rule(rule_class, content):
+    has_empty_alt = False
+    alts = []
+
+    for alt in content:
+        if isinstance(alt, rule_class.Maybe):
+            has_empty_alt = True
+            alt = alt.child
+        if alt == rule_class.EMPTY:
+            has_empty_alt = True
+        elif isinstance(alt, rule_class.Alternative):
+            alts.extend(alt.children)
+        else:
+            alts.append(alt)
+
+    if len(alts) == 0:
+        return rule_class.EMPTY
+    elif len(alts) == 1 and has_empty_alt:
+        return rule_class.Maybe(child=alts[0])
+    elif len(alts) == 1:
+        return alts[0]
+
+    rule = rule_class.Alternative(children=tuple(alts))
+
+    if has_empty_alt:
+        rule = rule_class.Maybe(rule)
+
+    return rule
+
+
+def make_seq_rule(rule_class, content):
+    elements = []
+    linebreaks = set()
+
+    for element in content:
+        if isinstance(element, rule_class.Sequence):
+            elements.extend(element.children)
+        else:
+            elements.append(element)
+        linebreaks.add(len(elements) - 1)
+
+    if len(elements) == 1:
+        return elements[0]
+
+    linebreaks = tuple(True if i in linebreaks else False
+                       for i in range(len(elements)))
+    return rule_class.Sequence(tuple(elements), linebreaks)
+
+
+# Loaders find out whether a lexer rule is a literal without building its
+# content. The functions below mirror simplifications made by `make_*_rule`
+# for this. Parts of a rule are described by the literal they're built into,
+# by an empty string if they're built into `EMPTY`, or by `None` otherwise.
+
+def get_suffix_literal(literal: Optional[str], has_suffix: bool) -> Optional[str]:
+    if literal == '' or not has_suffix:
+        return literal
+    return None
+
+
+def get_alt_literal(literals: List[Optional[str]]) -> Optional[str]:
+    if None in literals:
+        return None
+    if len(literals) == 1:
+        return literals[0]
+    if not any(literals):
+        return ''
+    return None
+
+
+def get_seq_literal(literals: List[Optional[str]]) -> Optional[str]:
+    if None in literals:
+        return None
+    literals = [literal for literal in literals if literal]
+    if len(literals) > 1:
+        return None
+    return literals[0] if literals else ''
+
+
+def make_section(model, headers) -> Optional[Section]:
+    docs: List[Tuple[int, str]] = []
+
+    start_line = None
+    cur_line = None
+    cur_doc: List[str] = []
+
+    for token in headers:
+        text: str = token.text.lstrip('/').strip()
+        line: int = token.line + model.get_offset()
+
+        if start_line is None:
+            start_line = line
+
+        if cur_line is None or cur_line == line - 1:
+            cur_doc.append(text)
+        else:
+            docs.append((start_line, '\n'.join(cur_doc)))
+            start_line = line
+            cur_doc = [text]
+        cur_line = line
+
+    if cur_doc:
+        docs.append((start_line, '\n'.join(cur_doc)))
+
+    if docs:
+        return Section(docs)
+    else:
+        return None
+
+
+def load_docs(model, tokens, allow_cmd=True):
+        is_doxygen_nodoc = False
+        is_doxygen_inline = False
+        is_doxygen_no_diagram = False
+        importance = 1
+        name = None
+        docs: List[Tuple[int, str]] = []
+
+        for token in tokens:
+            text: str = token.text
+            position = Position(model.get_path(), token.line + model.get_offset())
+            if text.startswith('//@'):
+                match = CMD_RE.match(text)
+
+                if match is None:
+                    logger.error(f'{position}: WARNING: invalid command {text!r}')
+                    continue
+
+                if not allow_cmd:
+                    logger.error(f'{position}: WARNING: commands not allowed here')
+                    continue
+
+                cmd = match['cmd']
+
+                if cmd == 'nodoc':
+                    is_doxygen_nodoc = True
+                elif cmd == 'inline':
+                    is_doxygen_inline = True
+                elif cmd == 'no-diagram':
+                    is_doxygen_no_diagram = True
+                elif cmd == 'unimportant':
+                    importance = 0
+                elif cmd == 'importance':
+                    try:
+                        val = int(match['ctx'].strip())
+                    except ValueError:
+                        logger.error(f'{position}: WARNING: importance requires an integer argument')
+                        continue
+                    if val < 0:
+                        logger.error(f'{position}: WARNING: importance should not be negative')
+                    importance = val
+                elif cmd == 'name':
+                    name = match['ctx'].strip()
+                    if not name:
+                        logger.error(f'{position}: WARNING: name command requires an argument')
+                        continue
+                else:
+                    logger.error(f'{position}: WARNING: unknown command {cmd!r}')
+
+                if cmd not in ['name', 'class', 'importance'] and match['ctx']:
+                    logger.warning(f'argument for {cmd!r} command is ignored')
+            else:
+                documentation_lines = []
+
+                lines = text.splitlines()
+
+                if len(lines) == 1:
+                    documentation_lines.append(lines[0][3:-2].strip())
+                else:
+                    first_line = lines[0]
+                    lines = lines[1:]
+
+                    first_line = first_line[3:].strip()
+                    documentation_lines.append(first_line)
+
+                    lines[-1] = lines[-1][:-2].rstrip()
+
+                    if not lines[-1].lstrip():
+                        lines.pop()
+
+                    if all(line.lstrip().startswith('*') for line in lines):
+                        lines = [line.lstrip()[1:] for line in lines]
+
+                    text = textwrap.dedent('\n'.join(lines))
+
+                    documentation_lines.append(text)
+
+                docs.append((position.line, '\n'.join(documentation_lines)))
+
+        return dict(
+            importance=importance,
+            is_doxygen_inline=is_doxygen_inline,
+            is_doxygen_nodoc=is_doxygen_nodoc,
+            is_doxygen_no_diagram=is_doxygen_no_diagram,
+            name=name,
+            documentation=docs
+        )
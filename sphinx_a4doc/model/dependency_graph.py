@@ -0,0 +1,244 @@
+from array import array
+
+from sphinx_a4doc.model.model import Model, RuleBase
+from sphinx_a4doc.model.impl import ModelImpl
+from sphinx_a4doc.model.visitor import get_children
+
+from typing import *
+
+
+__all__ = [
+    'DependencyGraph',
+    'get_dependency_graph',
+]
+
+
+class DependencyGraph:
+    """
+    Graph of dependencies between rules. There is an edge from rule `a`
+    to rule `b` if body of `a` refers `b`.
+
+    Graph is built once and stored as adjacency arrays; rules are identified
+    by their index. Reachable sets and strongly connected components
+    are computed in linear time and memoized.
+
+    Rules of models that are not linked, i.e. models built from ``.tokens``
+    files, have no dependencies in this graph. Their bodies are loaded
+    from lexer grammars, and lexer rules can't refer parser rules anyway.
+
+    """
+
+    def __init__(self, rules: Iterable[RuleBase]):
+        self._rules: List[RuleBase] = []
+        self._index: Dict[RuleBase, int] = {}
+
+        for rule in rules:
+            self._add(rule)
+
+        # Edges of rule `i` are `_targets[_offsets[i]:_offsets[i + 1]]`.
+        self._offsets = array('l', [0])
+        self._targets = array('l')
+
+        # Rules that are referenced but not given explicitly
+        # are added to the end of the list as they are discovered.
+        i = 0
+        while i < len(self._rules):
+            for dependency in _get_dependencies(self._rules[i]):
+                self._targets.append(self._add(dependency))
+            self._offsets.append(len(self._targets))
+            i += 1
+
+        self._reachable: Dict[FrozenSet[int], FrozenSet[RuleBase]] = {}
+        self._components: Optional[List[FrozenSet[RuleBase]]] = None
+        self._component_index: Optional[array] = None
+
+    @classmethod
+    def from_model(cls, model: Model) -> 'DependencyGraph':
+        """
+        Build graph for all rules of the given model and its imports.
+
+        """
+
+        rules = []
+        seen = {model}
+        queue = [model]
+        for m in queue:
+            rules.extend(sorted(m.get_terminals(), key=lambda r: r.position))
+            rules.extend(sorted(m.get_non_terminals(), key=lambda r: r.position))
+            for im in m.get_imports():
+                if im not in seen:
+                    seen.add(im)
+                    queue.append(im)
+        return cls(rules)
+
+    def _add(self, rule: RuleBase) -> int:
+        index = self._index.get(rule)
+        if index is None:
+            index = self._index[rule] = len(self._rules)
+            self._rules.append(rule)
+        return index
+
+    def _get_index(self, rule: RuleBase) -> int:
+        index = self._index.get(rule)
+        if index is None:
+            raise ValueError(f'rule {rule.name!r} is not in the dependency graph')
+        return index
+
+    def get_rules(self) -> List[RuleBase]:
+        """
+        Get all rules in this graph.
+
+        """
+
+        return list(self._rules)
+
+    def get_dependencies(self, rule: RuleBase) -> List[RuleBase]:
+        """
+        Get rules that are directly referenced from the given rule.
+
+        """
+
+        i = self._get_index(rule)
+        return [self._rules[j] for j in self._targets[self._offsets[i]:self._offsets[i + 1]]]
+
+    def get_reachable(self, roots: Iterable[RuleBase]) -> FrozenSet[RuleBase]:
+        """
+        Get set of rules that are reachable from any of the given roots.
+        Roots themselves are always included.
+
+        """
+
+        key = frozenset(map(self._get_index, roots))
+        if key not in self._reachable:
+            offsets, targets = self._offsets, self._targets
+            seen = bytearray(len(self._rules))
+            stack = list(key)
+            for i in stack:
+                seen[i] = 1
+            while stack:
+                i = stack.pop()
+                for j in targets[offsets[i]:offsets[i + 1]]:
+                    if not seen[j]:
+                        seen[j] = 1
+                        stack.append(j)
+            self._reachable[key] = frozenset(
+                rule for rule, is_seen in zip(self._rules, seen) if is_seen
+            )
+        return self._reachable[key]
+
+    def get_components(self) -> List[FrozenSet[RuleBase]]:
+        """
+        Get strongly connected components of this graph. Components
+        are ordered so that every component comes after all components
+        it depends on.
+
+        """
+
+        if self._components is None:
+            self._find_components()
+        return list(self._components)
+
+    def get_component(self, rule: RuleBase) -> FrozenSet[RuleBase]:
+        """
+        Get strongly connected component that contains the given rule,
+        that is, set of rules that are mutually recursive with it.
+
+        """
+
+        if self._components is None:
+            self._find_components()
+        return self._components[self._component_index[self._get_index(rule)]]
+
+    def is_recursive(self, rule: RuleBase) -> bool:
+        """
+        Check if the given rule can (directly or indirectly) refer to itself.
+
+        """
+
+        i = self._get_index(rule)
+        return (
+            len(self.get_component(rule)) > 1 or
+            i in self._targets[self._offsets[i]:self._offsets[i + 1]]
+        )
+
+    def _find_components(self):
+        # Tarjan's algorithm with an explicit stack. It emits components
+        # in reverse topological order, i.e. dependencies go first.
+        offsets, targets = self._offsets, self._targets
+        n = len(self._rules)
+
+        order = array('l', [-1]) * n
+        low = array('l', [0]) * n
+        component_index = array('l', [-1]) * n
+        components: List[FrozenSet[RuleBase]] = []
+        component_stack: List[int] = []
+        counter = 0
+
+        for root in range(n):
+            if order[root] != -1:
+                continue
+            order[root] = low[root] = counter
+            counter += 1
+            component_stack.append(root)
+            call_stack = [(root, offsets[root])]
+            while call_stack:
+                i, edge = call_stack[-1]
+                if edge < offsets[i + 1]:
+                    call_stack[-1] = (i, edge + 1)
+                    j = targets[edge]
+                    if order[j] == -1:
+                        order[j] = low[j] = counter
+                        counter += 1
+                        component_stack.append(j)
+                        call_stack.append((j, offsets[j]))
+                    elif component_index[j] == -1:
+                        low[i] = min(low[i], order[j])
+                    continue
+                call_stack.pop()
+                if call_stack:
+                    parent = call_stack[-1][0]
+                    low[parent] = min(low[parent], low[i])
+                if low[i] == order[i]:
+                    component = []
+                    while True:
+                        j = component_stack.pop()
+                        component_index[j] = len(components)
+                        component.append(self._rules[j])
+                        if j == i:
+                            break
+                    components.append(frozenset(component))
+
+        self._components = components
+        self._component_index = component_index
+
+
+def _get_dependencies(rule: RuleBase) -> List[RuleBase]:
+    if isinstance(rule.model, ModelImpl) and not rule.model.needs_linking():
+        # Don't build bodies that require parsing another grammar.
+        return []
+    dependencies = {}
+    stack = [rule.content] if rule.content is not None else []
+    while stack:
+        r = stack.pop()
+        if isinstance(r, RuleBase.Reference):
+            target = r.get_reference()
+            if target is not None:
+                dependencies.setdefault(target, None)
+        else:
+            stack.extend(reversed(get_children(r)))
+    return list(dependencies)
+
+
+def get_dependency_graph(model: Model) -> DependencyGraph:
+    """
+    Get dependency graph for the given model and its imports.
+
+    Graphs of cached models are memoized, and rebuilt after the model
+    or any model it imports changes.
+
+    """
+
+    if isinstance(model, ModelImpl):
+        return model.get_dependency_graph()
+    else:
+        return DependencyGraph.from_model(model)
@@ -0,0 +1,270 @@
+import os
+import pickle
+import hashlib
+import importlib
+import tempfile
+
+from typing import *
+
+import sphinx.util.logging
+
+from antlr4 import CommonTokenStream
+from antlr4.PredictionContext import PredictionContext
+from antlr4.atn import LexerAction as lexer_actions
+from antlr4.atn.ATNState import ATNState
+from antlr4.atn.PredictionMode import PredictionMode
+from antlr4.atn.SemanticContext import SemanticContext
+from antlr4.dfa.DFA import DFA
+from antlr4.dfa.DFAState import DFAState
+
+from sphinx_a4doc.model.persistent_cache import get_distribution_version
+from sphinx_a4doc.syntax import Lexer, Parser, CharStream
+
+
+__all__ = [
+    'CORPUS_PATH',
+    'warm_up_dfa',
+    'get_dfa_size',
+    'save_dfa',
+    'load_dfa',
+]
+
+
+logger = sphinx.util.logging.getLogger(__name__)
+
+
+DFA_FORMAT = 1
+"""
+Version of the on-disk format. Bump it whenever snapshot layout changes.
+
+"""
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'syntax', 'warmup.g4')
+"""
+Grammar that's used to warm up DFA caches.
+
+"""
+
+
+def warm_up_dfa(paths: Optional[List[str]] = None):
+    """
+    Prime DFA caches of the ANTLR lexer and parser by parsing the given
+    grammars, or the bundled corpus if no grammars are given.
+
+    ANTLR builds its prediction DFAs lazily, and they are shared between
+    all lexer and parser instances within a process. Thus, the first grammar
+    that's parsed in a process is much slower than the following ones.
+    Warming up caches before sphinx forks its workers eliminates this cost.
+
+    """
+
+    for path in paths or [CORPUS_PATH]:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+        except OSError as e:
+            logger.debug(f'a4doc: unable to read {path}: {e}')
+            continue
+
+        lexer = Lexer(CharStream(text))
+        lexer.removeErrorListeners()
+
+        parser = Parser(CommonTokenStream(lexer))
+        parser.removeErrorListeners()
+        parser._interp.predictionMode = PredictionMode.SLL
+        parser.grammarSpec()
+
+
+def get_dfa_size() -> int:
+    """
+    Get total number of DFA states in lexer and parser caches.
+
+    """
+
+    return sum(
+        len(_get_states(dfa))
+        for dfa in Lexer.decisionsToDFA + Parser.decisionsToDFA
+    )
+
+
+def save_dfa(path: str):
+    """
+    Save snapshot of the lexer and parser DFA caches.
+
+    """
+
+    dfas = {
+        'lexer': Lexer.decisionsToDFA,
+        'parser': Parser.decisionsToDFA,
+    }
+
+    # DFA states are stored in a flat list, and edges between them are
+    # stored as references into this list. This way, pickle doesn't
+    # recurse along DFA paths, which can be very long.
+    states: List[DFAState] = []
+    state_ids: Dict[int, int] = {}
+    queue = []
+    for dfa in dfas['lexer'] + dfas['parser']:
+        queue.append(dfa.s0)
+        queue.extend(_get_states(dfa).values())
+    while queue:
+        state = queue.pop()
+        if state is None or id(state) in state_ids:
+            continue
+        state_ids[id(state)] = len(states)
+        states.append(state)
+        queue.extend(state.edges or [])
+
+    snapshot = {
+        'key': _get_key(),
+        'states': [state.__dict__ for state in states],
+        'dfas': {
+            name: [_dump_dfa(dfa) for dfa in dfa_list]
+            for name, dfa_list in dfas.items()
+        },
+    }
+
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                _Pickler(f, state_ids).dump(snapshot)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    except Exception as e:
+        logger.debug(f'a4doc: unable to save DFA snapshot: {e}')
+
+
+def load_dfa(path: str) -> bool:
+    """
+    Restore lexer and parser DFA caches from a snapshot. Returns `False`
+    if there is no valid snapshot. Snapshots made by other versions
+    of a4doc or the ANTLR runtime are ignored.
+
+    """
+
+    try:
+        with open(path, 'rb') as f:
+            unpickler = _Unpickler(f)
+            snapshot = unpickler.load()
+    except FileNotFoundError:
+        return False
+    except Exception as e:
+        logger.debug(f'a4doc: unable to load DFA snapshot: {e}')
+        return False
+
+    if snapshot.get('key') != _get_key():
+        return False
+
+    for i, state in enumerate(snapshot['states']):
+        unpickler.get_state(i).__dict__.update(state)
+
+    lexer_dfas = [_load_dfa(dfa) for dfa in snapshot['dfas']['lexer']]
+    parser_dfas = [_load_dfa(dfa) for dfa in snapshot['dfas']['parser']]
+
+    if len(lexer_dfas) != len(Lexer.decisionsToDFA) or len(parser_dfas) != len(Parser.decisionsToDFA):
+        return False
+
+    # Simulators of existing lexers and parsers refer to these lists,
+    # so we have to update them in place.
+    Lexer.decisionsToDFA[:] = lexer_dfas
+    Parser.decisionsToDFA[:] = parser_dfas
+
+    return True
+
+
+def _get_key() -> str:
+    h = hashlib.sha256()
+    for part in [
+        str(DFA_FORMAT),
+        get_distribution_version(),
+        get_distribution_version('antlr4-python3-runtime'),
+        importlib.import_module(Lexer.__module__).serializedATN(),
+        importlib.import_module(Parser.__module__).serializedATN(),
+    ]:
+        h.update(part.encode('utf-8', 'surrogatepass'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+def _get_states_attr(dfa: DFA) -> str:
+    # Name of this attribute differs between runtime versions.
+    return '_states' if '_states' in dfa.__dict__ else 'states'
+
+
+def _get_states(dfa: DFA) -> Dict[DFAState, DFAState]:
+    return dfa.__dict__[_get_states_attr(dfa)]
+
+
+def _dump_dfa(dfa: DFA):
+    attr = _get_states_attr(dfa)
+    state = dict(dfa.__dict__)
+    states = list(state.pop(attr).values())
+    return attr, state, states
+
+
+def _load_dfa(data) -> DFA:
+    attr, state, states = data
+    dfa = DFA.__new__(DFA)
+    dfa.__dict__.update(state)
+    dfa.__dict__[attr] = {s: s for s in states}
+    return dfa
+
+
+class _Pickler(pickle.Pickler):
+    # ATN states and runtime singletons are stored by reference, so that
+    # restored DFAs point to the ATNs of the currently loaded lexer and
+    # parser, and identity checks within the runtime keep working.
+
+    def __init__(self, file, state_ids: Dict[int, int]):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._state_ids = state_ids
+
+    def persistent_id(self, obj):
+        if isinstance(obj, DFAState):
+            return 'dfa_state', self._state_ids[id(obj)]
+        if isinstance(obj, ATNState):
+            if obj.atn is Lexer.atn:
+                return 'lexer_atn_state', obj.stateNumber
+            else:
+                return 'parser_atn_state', obj.stateNumber
+        if obj is PredictionContext.EMPTY:
+            return 'empty_context', None
+        if obj is SemanticContext.NONE:
+            return 'empty_semantic_context', None
+        if isinstance(obj, lexer_actions.LexerAction) and getattr(type(obj), 'INSTANCE', None) is obj:
+            return 'lexer_action', type(obj).__name__
+        return None
+
+
+class _Unpickler(pickle.Unpickler):
+    def __init__(self, file):
+        super().__init__(file)
+        self._states: Dict[int, DFAState] = {}
+
+    def get_state(self, i: int) -> DFAState:
+        # States are created empty, and filled once the whole snapshot
+        # is loaded.
+        if i not in self._states:
+            self._states[i] = DFAState.__new__(DFAState)
+        return self._states[i]
+
+    def persistent_load(self, pid):
+        kind, value = pid
+        if kind == 'dfa_state':
+            return self.get_state(value)
+        elif kind == 'lexer_atn_state':
+            return Lexer.atn.states[value]
+        elif kind == 'parser_atn_state':
+            return Parser.atn.states[value]
+        elif kind == 'empty_context':
+            return PredictionContext.EMPTY
+        elif kind == 'empty_semantic_context':
+            return SemanticContext.NONE
+        elif kind == 'lexer_action':
+            return getattr(lexer_actions, value).INSTANCE
+        else:
+            raise pickle.UnpicklingError(f'unknown persistent id {pid!r}')
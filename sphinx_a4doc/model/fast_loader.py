@@ -0,0 +1,692 @@
+import re
+
+from typing import *
+
+from sphinx_a4doc.model.model import Model, Position, LazyContent, LexerRule, ParserRule
+from sphinx_a4doc.model.impl import ModelCacheImpl, ModelImpl
+from sphinx_a4doc.model.builder import MetaLoader, LexerRuleBuilder, ParserRuleBuilder
+from sphinx_a4doc.model.builder import make_suffix_rule, make_alt_rule, make_seq_rule, make_section, load_docs
+from sphinx_a4doc.model.builder import get_suffix_literal, get_alt_literal, get_seq_literal
+
+
+__all__ = [
+    'UnsupportedSyntax',
+    'FastLoader',
+]
+
+
+class UnsupportedSyntax(Exception):
+    """
+    Raised when grammar uses syntax that is not supported by the fast loader.
+    Such grammars should be loaded by the ANTLR-based loader instead.
+
+    """
+
+
+# Identifiers, as defined by `NameStartChar` and `NameChar` in `LexBasic.g4`.
+_NAME_START_CHAR = (
+    r'A-Za-z\u00C0-\u00D6\u00D8-\u00F6\u00F8-\u02FF\u0370-\u037D\u037F-\u1FFF'
+    r'\u200C-\u200D\u2070-\u218F\u2C00-\u2FEF\u3001-\uD7FF'
+    r'\uF900-\uFDCF\uFDF0-\uFFFD'
+)
+_NAME_CHAR = _NAME_START_CHAR + r'0-9_\u00B7\u0300-\u036F\u203F-\u2040'
+
+ID = f'[{_NAME_START_CHAR}][{_NAME_CHAR}]*'
+STRING = r"'(?:\\[\s\S]|[^'\r\n\\])*'"
+DQ_STRING = r'"(?:\\[\s\S]|[^"\r\n\\])*"'
+
+DEFAULT_RE = re.compile(rf'''
+    (?P<ws>[\ \t\r\n\f]+)
+    | (?P<header>///[^\r\n]*)
+    | (?P<doc>//@[^\r\n]*)
+    | (?P<line_comment>//[^\r\n]*)
+    | (?P<comment>/\*)
+    | (?P<id>{ID})
+    | (?P<int>0|[1-9][0-9]*)
+    | (?P<string>{STRING})
+    | (?P<punct>::|\+=|->|\.\.|[:,;()}}<>=?*+|$.@\#~])
+    | (?P<charset>\[)
+    | (?P<action>\{{)
+    ''', re.VERBOSE)
+
+BLOCK_MODE_RE = re.compile(rf'''
+    (?P<ws>[\ \t\r\n\f]+)
+    | (?P<line_comment>//[^\r\n]*)
+    | (?P<comment>/\*)
+    | (?P<id>{ID})
+    | (?P<int>0|[1-9][0-9]*)
+    | (?P<string>{STRING})
+    | (?P<punct>[}}.=*;,])
+    ''', re.VERBOSE)
+
+BLOCK_MODE_PUNCT = {
+    'OPTIONS': set('}.=*;'),
+    'TOKENS': set('}.,'),
+    'CHANNELS': set('}.,'),
+}
+
+BLOCK_MODE_TOKENS = {
+    'OPTIONS': {'id', 'int', 'string'},
+    'TOKENS': {'id'},
+    'CHANNELS': {'id'},
+}
+
+CHARSET_RE = re.compile(r'\[(?:[^\]\\]|\\[\s\S])*\]')
+
+ACTION_RE = re.compile(rf'''
+    (?P<open>\{{)
+    | (?P<close>\}})
+    | (?P<skip>\\[\s\S]|{STRING}|{DQ_STRING}|//[^\r\n]*)
+    | (?P<comment>/\*)
+    | (?P<text>[^{{}}\\'"/]+|[\s\S])
+    ''', re.VERBOSE)
+
+BLOCK_START_RE = re.compile(r'[ \t\f\n\r]*\{')
+
+KEYWORDS = {
+    'import', 'fragment', 'lexer', 'parser', 'grammar', 'protected', 'public',
+    'private', 'returns', 'locals', 'throws', 'catch', 'finally', 'mode',
+}
+
+
+class Token:
+    __slots__ = ('kind', 'text', 'line')
+
+    def __init__(self, kind: str, text: str, line: int):
+        self.kind = kind
+        """
+        Token type: ``'TOKEN_REF'``, ``'RULE_REF'``, ``'STRING'``, ``'INT'``,
+        ``'CHARSET'``, ``'ACTION'``, ``'DOC'``, ``'HEADER'``, ``'EOF'``,
+        a keyword in upper case, or punctuation itself.
+
+        """
+
+        self.text = text
+        self.line = line
+
+    def __repr__(self):
+        return f'Token({self.kind!r}, {self.text!r}, {self.line!r})'
+
+
+def tokenize(text: str) -> List[Token]:
+    """
+    Split grammar into tokens.
+
+    This mirrors the ANTLR lexer from `sphinx_a4doc.syntax`, including the
+    `LexerAdaptor` logic that decides whether ``[`` starts a char set
+    or an argument. Anything the ANTLR lexer would handle in an unusual way,
+    i.e. argument blocks, unterminated literals and comments, or characters
+    that would be silently dropped, raises `UnsupportedSyntax`.
+
+    """
+
+    tokens: List[Token] = []
+
+    pos = 0
+    line = 1
+    end = len(text)
+
+    # Emulation of `LexerAdaptor._currentRuleType`.
+    rule_type = None
+
+    # Block mode: 'OPTIONS', 'TOKENS', 'CHANNELS', or `None` for default mode.
+    mode = None
+
+    while pos < end:
+        if mode is None:
+            match = DEFAULT_RE.match(text, pos)
+        else:
+            match = BLOCK_MODE_RE.match(text, pos)
+
+        if match is None:
+            raise UnsupportedSyntax(f'line {line}: unexpected character {text[pos]!r}')
+
+        kind = match.lastgroup
+        value = match.group()
+        next_pos = match.end()
+
+        if kind == 'comment':
+            next_pos = _skip_comment(text, pos, line)
+            if mode is None and text.startswith('/**', pos):
+                if text.startswith('/**/', pos):
+                    # ANTLR matches the longest token, so this would be
+                    # a doc comment that ends with some other comment.
+                    raise UnsupportedSyntax(f'line {line}: empty doc comment')
+                tokens.append(Token('DOC', text[pos:next_pos], line))
+        elif kind == 'header':
+            tokens.append(Token('HEADER', value, line))
+        elif kind == 'doc':
+            if mode is None:
+                tokens.append(Token('DOC', value, line))
+        elif kind == 'id':
+            block = BLOCK_START_RE.match(text, next_pos)
+            if mode is None and value in ('options', 'tokens', 'channels') and block is not None:
+                mode = value.upper()
+                next_pos = block.end()
+                tokens.append(Token(mode, text[pos:next_pos], line))
+            elif mode is None and value in KEYWORDS:
+                tokens.append(Token(value.upper(), value, line))
+            else:
+                token_kind = 'TOKEN_REF' if value[0].isupper() else 'RULE_REF'
+                if rule_type is None:
+                    rule_type = token_kind
+                tokens.append(Token(token_kind, value, line))
+        elif kind == 'int':
+            if mode is not None and kind not in BLOCK_MODE_TOKENS[mode]:
+                raise UnsupportedSyntax(f'line {line}: unexpected number')
+            tokens.append(Token('INT', value, line))
+        elif kind == 'string':
+            if mode is not None and kind not in BLOCK_MODE_TOKENS[mode]:
+                raise UnsupportedSyntax(f'line {line}: unexpected string')
+            tokens.append(Token('STRING', value, line))
+        elif kind == 'punct':
+            if mode is not None:
+                if value not in BLOCK_MODE_PUNCT[mode]:
+                    raise UnsupportedSyntax(f'line {line}: unexpected {value!r}')
+                if value == '}':
+                    mode = None
+            if value == ';':
+                rule_type = None
+            tokens.append(Token(value, value, line))
+        elif kind == 'charset':
+            if rule_type != 'TOKEN_REF':
+                raise UnsupportedSyntax(f'line {line}: argument blocks are not supported')
+            match = CHARSET_RE.match(text, pos)
+            if match is None:
+                raise UnsupportedSyntax(f'line {line}: unterminated char set')
+            next_pos = match.end()
+            tokens.append(Token('CHARSET', match.group(), line))
+        elif kind == 'action':
+            next_pos = _skip_action(text, pos, line)
+            tokens.append(Token('ACTION', text[pos:next_pos], line))
+
+        line += text.count('\n', pos, next_pos)
+        pos = next_pos
+
+    if mode is not None:
+        raise UnsupportedSyntax(f'line {line}: unterminated {mode.lower()} block')
+
+    tokens.append(Token('EOF', '<EOF>', line))
+
+    return tokens
+
+
+def _skip_comment(text: str, pos: int, line: int) -> int:
+    # Doc comments are matched the same way as block comments, but they
+    # search for the closing '*/' starting from the third character.
+    # ANTLR always chooses the longest match.
+    end = text.find('*/', pos + 2)
+    if text.startswith('/**', pos):
+        end = max(end, text.find('*/', pos + 3))
+    if end == -1:
+        raise UnsupportedSyntax(f'line {line}: unterminated comment')
+    return end + 2
+
+
+def _skip_action(text: str, pos: int, line: int) -> int:
+    depth = 0
+    end = len(text)
+    while pos < end:
+        match = ACTION_RE.match(text, pos)
+        kind = match.lastgroup
+        if kind == 'open':
+            depth += 1
+        elif kind == 'close':
+            depth -= 1
+            if depth == 0:
+                return match.end()
+        elif kind == 'comment':
+            pos = _skip_comment(text, pos, line)
+            continue
+        pos = match.end()
+    raise UnsupportedSyntax(f'line {line}: unterminated action')
+
+
+class _Rule(NamedTuple):
+    is_lexer: bool
+    headers: Optional[List[Token]]
+    name: str
+    line: int
+    docs: List[Token]
+    is_fragment: bool
+    content: tuple
+
+
+class _Grammar:
+    def __init__(self):
+        self.docs: List[Token] = []
+        self.gtype: str = ''
+        self.name: str = ''
+        self.imports: List[Tuple[str, str, int]] = []
+        self.rules: List[_Rule] = []
+
+
+class _Parser:
+    """
+    Recursive-descent parser for the subset of ANTLR grammar syntax that's
+    relevant for documentation.
+
+    Rule bodies are parsed into a lightweight tree of tuples. It is converted
+    to rule contents only after the whole file is parsed successfully, so that
+    a grammar that's handed over to ANTLR does not produce duplicate warnings.
+
+    """
+
+    def __init__(self, tokens: List[Token]):
+        self._tokens = tokens
+        self._pos = 0
+
+    def peek(self, n=0) -> Token:
+        return self._tokens[min(self._pos + n, len(self._tokens) - 1)]
+
+    def next(self) -> Token:
+        token = self._tokens[self._pos]
+        if self._pos < len(self._tokens) - 1:
+            self._pos += 1
+        return token
+
+    def expect(self, *kinds: str) -> Token:
+        token = self.next()
+        if token.kind not in kinds:
+            raise UnsupportedSyntax(f'line {token.line}: unexpected {token.text!r}')
+        return token
+
+    def accept(self, *kinds: str) -> Optional[Token]:
+        if self.peek().kind in kinds:
+            return self.next()
+        return None
+
+    def parse_grammar(self) -> _Grammar:
+        grammar = _Grammar()
+
+        while self.peek().kind == 'DOC':
+            grammar.docs.append(self.next())
+
+        if self.peek().kind in ('LEXER', 'PARSER'):
+            grammar.gtype += self.next().text
+        grammar.gtype += self.expect('GRAMMAR').text
+        grammar.name = self.expect('TOKEN_REF', 'RULE_REF').text
+        self.expect(';')
+
+        while True:
+            kind = self.peek().kind
+            if kind == 'OPTIONS':
+                self.parse_options(grammar)
+            elif kind == 'IMPORT':
+                self.next()
+                while True:
+                    token = self.expect('TOKEN_REF', 'RULE_REF')
+                    grammar.imports.append(('import', token.text, token.line))
+                    if not self.accept(','):
+                        break
+                self.expect(';')
+            elif kind == 'TOKENS':
+                self.next()
+                ids = self.parse_id_list()
+                if not ids:
+                    raise UnsupportedSyntax(f'line {self.peek().line}: empty tokens block')
+                for token in ids:
+                    grammar.imports.append(('token', token.text, token.line))
+            elif kind == 'CHANNELS':
+                self.next()
+                self.parse_id_list()
+            elif kind == '@':
+                self.next()
+                if self.peek(1).kind == '::':
+                    self.expect('TOKEN_REF', 'RULE_REF', 'LEXER', 'PARSER')
+                    self.next()
+                self.expect('TOKEN_REF', 'RULE_REF')
+                self.expect('ACTION')
+            else:
+                break
+
+        while self.peek().kind in ('HEADER', 'DOC', 'FRAGMENT', 'TOKEN_REF', 'RULE_REF'):
+            headers = []
+            while self.peek().kind == 'HEADER':
+                headers.append(self.next())
+            grammar.rules.append(self.parse_rule(headers))
+
+        while self.accept('MODE'):
+            self.expect('TOKEN_REF', 'RULE_REF')
+            self.expect(';')
+            while self.peek().kind in ('DOC', 'FRAGMENT', 'TOKEN_REF'):
+                rule = self.parse_rule(None)
+                if not rule.is_lexer:
+                    raise UnsupportedSyntax(f'line {rule.line}: parser rule in lexer mode')
+                grammar.rules.append(rule)
+
+        self.expect('EOF')
+
+        return grammar
+
+    def parse_options(self, grammar: _Grammar):
+        self.expect('OPTIONS')
+        while not self.accept('}'):
+            name = self.expect('TOKEN_REF', 'RULE_REF')
+            self.expect('=')
+            if self.peek().kind in ('STRING', 'INT'):
+                value = self.next().text
+            else:
+                value = self.expect('TOKEN_REF', 'RULE_REF').text
+                while self.accept('.'):
+                    value += '.' + self.expect('TOKEN_REF', 'RULE_REF').text
+            self.expect(';')
+            if name.text == 'tokenVocab':
+                grammar.imports.append(('vocab', value, name.line))
+
+    def parse_id_list(self) -> List[Token]:
+        ids = []
+        while not self.accept('}'):
+            ids.append(self.expect('TOKEN_REF', 'RULE_REF'))
+            if not self.accept(','):
+                self.expect('}')
+                break
+        return ids
+
+    def parse_rule(self, headers: Optional[List[Token]]) -> _Rule:
+        start = self.peek()
+
+        docs = []
+        while self.peek().kind == 'DOC':
+            docs.append(self.next())
+
+        is_fragment = self.accept('FRAGMENT') is not None
+        name = self.expect('TOKEN_REF', 'RULE_REF')
+        is_lexer = name.kind == 'TOKEN_REF'
+
+        if is_fragment and not is_lexer:
+            raise UnsupportedSyntax(f'line {name.line}: rule modifiers are not supported')
+
+        self.expect(':')
+        if is_lexer:
+            content = self.parse_lexer_alt_list()
+        else:
+            content = self.parse_alt_list(labeled=True)
+        self.expect(';')
+
+        if self.peek().kind in ('CATCH', 'FINALLY'):
+            raise UnsupportedSyntax(f'line {name.line}: exception handlers are not supported')
+
+        return _Rule(is_lexer, headers, name.text, start.line, docs, is_fragment, content)
+
+    def parse_alt_list(self, labeled=False):
+        alts = [self.parse_alt(labeled)]
+        while self.accept('|'):
+            alts.append(self.parse_alt(labeled))
+        return 'alt', alts
+
+    def parse_alt(self, labeled):
+        if self.peek().kind == '<':
+            self.parse_element_options()
+            elements = [self.parse_element()]
+        else:
+            elements = []
+        while self.peek().kind not in ('|', ')', ';', '#'):
+            elements.append(self.parse_element())
+        if labeled and self.accept('#'):
+            self.expect('TOKEN_REF', 'RULE_REF')
+        return 'seq', elements
+
+    def parse_element(self):
+        token = self.peek()
+        if token.kind == 'DOC':
+            return 'doc', self.next()
+        if token.kind == 'ACTION':
+            self.next()
+            self.accept('?')
+            return 'empty',
+        if token.kind in ('TOKEN_REF', 'RULE_REF') and self.peek(1).kind in ('=', '+='):
+            self.next()
+            self.next()
+        if self.peek().kind == '(':
+            element = self.parse_block()
+        else:
+            element = self.parse_atom()
+        return self.parse_suffix(element)
+
+    def parse_block(self):
+        self.expect('(')
+        if self.peek().kind in ('OPTIONS', '@', ':'):
+            raise UnsupportedSyntax(f'line {self.peek().line}: block options are not supported')
+        content = self.parse_alt_list()
+        self.expect(')')
+        return content
+
+    def parse_atom(self):
+        token = self.next()
+        if token.kind in ('TOKEN_REF', 'STRING'):
+            self.parse_element_options()
+            return ('ref' if token.kind == 'TOKEN_REF' else 'lit'), token.text
+        if token.kind == 'RULE_REF':
+            self.parse_element_options()
+            return 'ref', token.text
+        if token.kind == '~':
+            return self.parse_not_set()
+        if token.kind == '.':
+            self.parse_element_options()
+            return 'any',
+        raise UnsupportedSyntax(f'line {token.line}: unexpected {token.text!r}')
+
+    def parse_lexer_alt_list(self):
+        alts = [self.parse_lexer_alt()]
+        while self.accept('|'):
+            alts.append(self.parse_lexer_alt())
+        return 'alt', alts
+
+    def parse_lexer_alt(self):
+        elements = []
+        while self.peek().kind not in ('|', ')', ';', '->'):
+            elements.append(self.parse_lexer_element())
+        if not elements:
+            raise UnsupportedSyntax(f'line {self.peek().line}: empty lexer alternatives are not supported')
+        if self.accept('->'):
+            while True:
+                self.expect('TOKEN_REF', 'RULE_REF', 'MODE')
+                if self.accept('('):
+                    self.expect('TOKEN_REF', 'RULE_REF', 'INT')
+                    self.expect(')')
+                if not self.accept(','):
+                    break
+        return 'seq', elements
+
+    def parse_lexer_element(self):
+        token = self.peek()
+        if token.kind == 'ACTION':
+            self.next()
+            self.accept('?')
+            return 'empty',
+        if token.kind in ('TOKEN_REF', 'RULE_REF') and self.peek(1).kind in ('=', '+='):
+            self.next()
+            self.next()
+        if self.peek().kind == '(':
+            self.next()
+            element = self.parse_lexer_alt_list()
+            self.expect(')')
+        else:
+            element = self.parse_lexer_atom()
+        return self.parse_suffix(element)
+
+    def parse_lexer_atom(self):
+        token = self.next()
+        if token.kind == 'STRING' and self.peek().kind == '..':
+            self.next()
+            return 'range', token.text, self.expect('STRING').text
+        if token.kind in ('TOKEN_REF', 'STRING'):
+            self.parse_element_options()
+            return ('ref' if token.kind == 'TOKEN_REF' else 'lit'), token.text
+        if token.kind == '~':
+            return self.parse_not_set()
+        if token.kind == 'CHARSET':
+            return 'charset', token.text
+        if token.kind == '.':
+            self.parse_element_options()
+            return 'any',
+        if token.kind == 'DOC':
+            return 'doc', token
+        raise UnsupportedSyntax(f'line {token.line}: unexpected {token.text!r}')
+
+    def parse_not_set(self):
+        if self.accept('('):
+            elements = [self.parse_set_element()]
+            while self.accept('|'):
+                elements.append(self.parse_set_element())
+            self.expect(')')
+            return 'not', ('alt', elements)
+        else:
+            return 'not', self.parse_set_element()
+
+    def parse_set_element(self):
+        token = self.expect('TOKEN_REF', 'STRING', 'CHARSET')
+        if token.kind == 'STRING' and self.peek().kind == '..':
+            self.next()
+            return 'range', token.text, self.expect('STRING').text
+        if token.kind == 'CHARSET':
+            return 'charset', token.text
+        self.parse_element_options()
+        return ('ref' if token.kind == 'TOKEN_REF' else 'lit'), token.text
+
+    def parse_suffix(self, element):
+        if self.peek().kind in ('?', '*', '+'):
+            suffix = self.next().text
+            if self.accept('?'):
+                suffix += '?'
+            return 'suffix', element, suffix
+        return element
+
+    def parse_element_options(self):
+        if not self.accept('<'):
+            return
+        while True:
+            self.expect('TOKEN_REF', 'RULE_REF')
+            if self.accept('='):
+                self.expect('TOKEN_REF', 'RULE_REF', 'STRING')
+            if not self.accept(','):
+                break
+        self.expect('>')
+
+
+class FastLoader:
+    """
+    Hand-written loader for the common subset of ANTLR grammar syntax.
+
+    It produces exactly the same model as the ANTLR-based `ModelLoader`,
+    but it is much faster because it does not rely on the pure-python
+    ANTLR runtime. When the grammar uses constructs that are not supported,
+    or when it contains syntax errors, `load` raises `UnsupportedSyntax`
+    before modifying the model, and the grammar should be loaded via ANTLR.
+
+    Unsupported constructs are rule arguments, return values, locals
+    and exception handlers, rule modifiers other than ``fragment``,
+    and options in sub-rules.
+
+    """
+
+    def __init__(self, model: ModelImpl, cache: ModelCacheImpl):
+        self._model = model
+        self._meta_loader = MetaLoader(model, cache)
+        self._lexer_rule_builder = LexerRuleBuilder(model)
+        self._parser_rule_builder = ParserRuleBuilder(model)
+
+    def load(self, text: str):
+        grammar = _Parser(tokenize(text)).parse_grammar()
+
+        self._meta_loader.load_grammar_meta(grammar.gtype, grammar.name, grammar.docs)
+
+        for kind, name, line in grammar.imports:
+            position = Position(self._model.get_path(), line + self._model.get_offset())
+            if kind == 'import':
+                self._meta_loader.add_import(name, position)
+            elif kind == 'vocab':
+                self._meta_loader.add_token_vocab(name, position)
+            else:
+                self._meta_loader.add_token(name, position)
+
+        for rule in grammar.rules:
+            if rule.headers is not None:
+                section = make_section(self._model, rule.headers)
+                self._lexer_rule_builder.set_section(section)
+                self._parser_rule_builder.set_section(section)
+            if rule.is_lexer:
+                content = TreeContent(self._model, LexerRule, rule.content)
+                literal = _get_literal(rule.content) or None
+                self._lexer_rule_builder.add_rule(rule.name, rule.line, rule.docs, rule.is_fragment, content, literal)
+            else:
+                content = TreeContent(self._model, ParserRule, rule.content)
+                self._parser_rule_builder.add_rule(rule.name, rule.line, rule.docs, content)
+
+
+def _get_literal(node) -> Optional[str]:
+    # See `get_seq_literal` for the meaning of the returned value.
+    kind = node[0]
+    if kind == 'alt':
+        return get_alt_literal([_get_literal(alt) for alt in node[1]])
+    elif kind == 'seq':
+        return get_seq_literal([_get_literal(element) for element in node[1]])
+    elif kind == 'suffix':
+        return get_suffix_literal(_get_literal(node[1]), node[2] is not None)
+    elif kind == 'lit':
+        return '' if node[1] == "''" else node[1]
+    elif kind == 'charset':
+        return '' if node[1] == '[]' else None
+    elif kind == 'empty':
+        return ''
+    else:
+        return None
+
+
+class TreeContent(LazyContent):
+    """
+    Builds rule content from a tree produced by the fast loader's parser.
+
+    Unlike parse trees, these trees can be pickled, so rule contents
+    stay lazy when models are stored in the persistent cache.
+
+    """
+
+    def __init__(self, model: Model, rule_class, node):
+        self._model = model
+        self._rule_class = rule_class
+        self._node = node
+
+    def load(self):
+        return self._build(self._rule_class, self._node)
+
+    def is_picklable(self) -> bool:
+        return True
+
+    def _build(self, rule_class, node):
+        kind = node[0]
+        if kind == 'alt':
+            return make_alt_rule(rule_class, [self._build(rule_class, alt) for alt in node[1]])
+        elif kind == 'seq':
+            return make_seq_rule(rule_class, [self._build(rule_class, element) for element in node[1]])
+        elif kind == 'suffix':
+            return make_suffix_rule(rule_class, self._build(rule_class, node[1]), node[2])
+        elif kind == 'ref':
+            return rule_class.Reference(model=self._model, name=node[1])
+        elif kind == 'lit':
+            if rule_class is ParserRule:
+                return ParserRule.Reference(model=self._model, name=node[1])
+            elif node[1] == "''":
+                return LexerRule.EMPTY
+            else:
+                return LexerRule.Literal(content=node[1])
+        elif kind == 'range':
+            if rule_class is ParserRule:
+                return ParserRule.EMPTY
+            else:
+                return LexerRule.Range(start=node[1], end=node[2])
+        elif kind == 'charset':
+            if rule_class is ParserRule or node[1] == '[]':
+                return rule_class.EMPTY
+            else:
+                return LexerRule.CharSet(content=node[1])
+        elif kind == 'any':
+            return rule_class.WILDCARD
+        elif kind == 'not':
+            return rule_class.Negation(child=self._build(rule_class, node[1]))
+        elif kind == 'doc':
+            docs = load_docs(self._model, [node[1]], False)['documentation']
+            return rule_class.Doc(value='\n'.join(d[1] for d in docs))
+        else:
+            return rule_class.EMPTY
@@ -1,660 +1,949 @@
 import os
-import re
-import textwrap
+import sys
+import time
+import hashlib
+import collections
 
-from typing import *
+from dataclasses import dataclass, replace
 
-from antlr4 import CommonTokenStream, InputStream
-from antlr4.error.ErrorListener import ErrorListener
+from typing import *
 
-from sphinx_a4doc.model.model import ModelCache, Model, Position, RuleBase, LexerRule, ParserRule, Section
-from sphinx_a4doc.syntax import Lexer, Parser, ParserVisitor
+from sphinx_a4doc.model.model import ModelCache, Model, RuleBase, LexerRule, ParserRule, Section
+from sphinx_a4doc.model.incremental import split_grammar
+from sphinx_a4doc.model.persistent_cache import PersistentModelCache
+from sphinx_a4doc.model.linker import UnresolvedReference, link_rule
+from sphinx_a4doc.model.importance import compute_importance
+from sphinx_a4doc.model.visitor import get_children
 
 import sphinx.util.logging
 
 __all__ = [
     'ModelCacheImpl',
     'ModelImpl',
-    'MetaLoader',
-    'RuleLoader',
-    'LexerRuleLoader',
-    'ParserRuleLoader',
+    'ModelStats',
+    'LoaderSettings',
 ]
 
 
 logger = sphinx.util.logging.getLogger(__name__)
 
 
-CMD_RE = re.compile(r'''
-    //@\s*doc\s*:\s*(?P<cmd>[a-zA-Z0-9_-]+)\s*(?P<ctx>.*)
-    ''', re.UNICODE | re.VERBOSE)
-
-
-class LoggingErrorListener(ErrorListener):
-    def __init__(self, path: str, offset: int):
-        self._path = path
-        self._offset = offset
-
-    def syntaxError(self, recognizer, offending_symbol, line, column, msg, e):
-        logger.error(f'{self._path}:{line + self._offset}: WARNING: {msg}')
+DFA_SNAPSHOT_NAME = 'dfa.pickle'
 
 
-class ModelCacheImpl(ModelCache):
-    def __init__(self):
-        self._loaded: Dict[str, Model] = {}
+@dataclass(frozen=True)
+class ModelStats:
+    """
+    Approximate memory usage of a cached model.
 
-    def from_file(self, path: Union[str, Tuple[str, int]]) -> 'Model':
-        if isinstance(path, tuple):
-            path, offset = path
-        else:
-            path, offset = path, 0
+    """
 
-        path = os.path.abspath(os.path.normpath(path))
+    path: str
+    """Path of the grammar file"""
 
-        if path in self._loaded:
-            return self._loaded[path]
+    rules: int
+    """Number of rules in the model"""
 
-        if not os.path.exists(path):
-            logger.error(f'unable to load {path!r}: file not found')
-            model = self._loaded[path] = ModelImpl(path, offset, False, True)
-            return model
+    nodes: int
+    """Number of distinct rule content nodes. Contents that weren't built
+    by the time the model was measured are not counted"""
 
-        with open(path, 'r', encoding='utf-8', errors='strict') as f:
-            self._loaded[path] = self._do_load(f.read(), path, offset, False, [])
+    size: int
+    """Approximate size of the model, in bytes"""
 
-        return self._loaded[path]
 
-    def from_text(self, text: str, path: Union[str, Tuple[str, int]] = '<in-memory>', imports: List['Model'] = None) -> 'Model':
-        if isinstance(path, tuple):
-            path, offset = path
-        else:
-            path, offset = path, 0
-        return self._do_load(text, path, offset, True, imports)
+@dataclass(frozen=True)
+class LoaderSettings:
+    """
+    Settings that control how a cache loads grammars. They're passed
+    to processes that load grammars in parallel, see `preload_models`.
 
-    def _do_load(self, text: str, path: str, offset: int, in_memory: bool, imports: List['Model']) -> 'Model':
-        content = InputStream(text)
+    """
 
-        lexer = Lexer(content)
-        lexer.removeErrorListeners()
-        lexer.addErrorListener(LoggingErrorListener(path, offset))
+    fast_loader: bool = False
+    two_stage_parsing: bool = True
+    warm_up_parser: bool = False
+    token_vocab_files: bool = False
+    incremental: bool = False
 
-        tokens = CommonTokenStream(lexer)
 
-        parser = Parser(tokens)
-        parser.removeErrorListeners()
-        parser.addErrorListener(LoggingErrorListener(path, offset))
+class ModelCacheImpl(ModelCache):
+    def __init__(self):
+        # Models are ordered from least to most recently used.
+        self._loaded: OrderedDict[str, Model] = collections.OrderedDict()
+        self._signatures: Dict[str, Optional[Tuple[int, int, str]]] = {}
+        self._persistent: Optional[PersistentModelCache] = None
+        self._check_hashes = False
+        self._fast_loader = False
+        self._two_stage_parsing = True
+        self._warm_up_parser = False
+        self._dfa_size: Optional[int] = None
+        self._loading_depth = 0
+        self._unlinked: List[Model] = []
+        # Reverse reference indexes, keyed by paths of their root models.
+        self._referrers: Dict[str, Dict[RuleBase, List[RuleBase]]] = {}
+        self._incremental = False
+        self._token_vocab_files = False
+        self._texts: Dict[str, str] = {}
+        self._max_models: Optional[int] = None
+        self._max_size: Optional[int] = None
+        self._stats: Dict[str, ModelStats] = {}
+        self._total_size = 0
+
+    def get_persistent_cache(self) -> Optional[PersistentModelCache]:
+        return self._persistent
+
+    def set_persistent_cache(self, persistent: Optional[PersistentModelCache]):
+        self._persistent = persistent
+
+    def set_check_hashes(self, check_hashes: bool):
+        """
+        If enabled, a file whose mtime or size changed is only considered
+        modified if its contents changed as well.
+
+        """
+        self._check_hashes = check_hashes
+
+    def get_fast_loader(self) -> bool:
+        return self._fast_loader
+
+    def set_fast_loader(self, fast_loader: bool):
+        """
+        If enabled, grammars are loaded by `FastLoader` when possible.
+
+        """
+        self._fast_loader = fast_loader
+
+    def get_two_stage_parsing(self) -> bool:
+        return self._two_stage_parsing
+
+    def set_two_stage_parsing(self, two_stage_parsing: bool):
+        """
+        If enabled, grammars are parsed with fast SLL prediction first,
+        and only re-parsed with full LL prediction if SLL parsing fails.
+
+        """
+        self._two_stage_parsing = two_stage_parsing
+
+    def set_incremental(self, incremental: bool):
+        """
+        If enabled, grammars that were modified since they've been loaded
+        are updated in place, and only rules whose text changed are parsed
+        again. Grammar text is kept in memory for this.
+
+        """
+        self._incremental = incremental
+        if not incremental:
+            self._texts.clear()
+
+    def get_token_vocab_files(self) -> bool:
+        return self._token_vocab_files
+
+    def set_token_vocab_files(self, token_vocab_files: bool):
+        """
+        If enabled, lexer grammars that are imported via the ``tokenVocab``
+        option are not parsed if there is a ``.tokens`` file next to them.
+        Token names are loaded from that file instead, and the lexer grammar
+        is only parsed if a body of one of its tokens is needed.
+
+        """
+        self._token_vocab_files = token_vocab_files
+
+    def get_loader_settings(self) -> LoaderSettings:
+        return LoaderSettings(
+            fast_loader=self._fast_loader,
+            two_stage_parsing=self._two_stage_parsing,
+            warm_up_parser=self._warm_up_parser,
+            token_vocab_files=self._token_vocab_files,
+            incremental=self._incremental,
+        )
 
-        tree = parser.grammarSpec()
+    def set_loader_settings(self, settings: LoaderSettings):
+        """
+        Apply settings returned by `get_loader_settings` of another cache.
+
+        """
+        self.set_fast_loader(settings.fast_loader)
+        self.set_two_stage_parsing(settings.two_stage_parsing)
+        self.set_warm_up_parser(settings.warm_up_parser)
+        self.set_token_vocab_files(settings.token_vocab_files)
+        self.set_incremental(settings.incremental)
+
+    def set_limits(self, max_models: Optional[int] = None, max_size: Optional[int] = None):
+        """
+        Limit number of cached models, or their approximate total size
+        in bytes. Once a limit is exceeded, least recently used models
+        are evicted. Models that are imported by other cached models
+        are never evicted.
+
+        """
+        self._max_models = max_models
+        self._max_size = max_size
+        self._evict()
+
+    def get_model_stats(self) -> List[ModelStats]:
+        """
+        Get approximate memory usage of every cached model,
+        from least to most recently used.
+
+        Models are measured once, and are measured again only after
+        they're reloaded.
+
+        """
+        return [self._get_stats(path) for path in self._loaded]
+
+    def _get_stats(self, path: str) -> ModelStats:
+        stats = self._stats.get(path)
+        if stats is None:
+            stats = self._stats[path] = _get_model_stats(self._loaded[path])
+            self._total_size += stats.size
+        return stats
+
+    def _forget_stats(self, path: str):
+        stats = self._stats.pop(path, None)
+        if stats is not None:
+            self._total_size -= stats.size
+
+    def _is_over_limit(self) -> bool:
+        if self._max_models is not None and len(self._loaded) > self._max_models:
+            return True
+        if self._max_size is not None:
+            if len(self._stats) < len(self._loaded):
+                # Measure models that were loaded since the last check.
+                for path in self._loaded:
+                    self._get_stats(path)
+            return self._total_size > self._max_size
+        return False
+
+    def _evict(self, keep: Optional[Model] = None):
+        while self._is_over_limit():
+            imported = {im for model in self._loaded.values() for im in model.get_imports()}
+            for path, model in self._loaded.items():
+                if model is not keep and model not in imported:
+                    break
+            else:
+                return  # all models are in use
+            logger.debug(f'a4doc: evicting {path} from the cache')
+            self._drop(path)
+            self._referrers.clear()
 
-        if parser.getNumberOfSyntaxErrors():
-            return ModelImpl(path, offset, in_memory, True)
+    def _drop(self, path: str) -> Optional[Model]:
+        self._signatures.pop(path, None)
+        self._texts.pop(path, None)
+        self._forget_stats(path)
+        return self._loaded.pop(path, None)
 
-        model = ModelImpl(path, offset, in_memory, False)
+    def set_warm_up_parser(self, warm_up_parser: bool):
+        """
+        If enabled, DFA caches of the ANTLR parser are warmed up before
+        the first grammar is parsed. If there is a persistent cache,
+        they're restored from a snapshot instead, see `save_parser_state`.
 
-        for im in imports or []:
-            model.add_import(im)
+        """
+        self._warm_up_parser = warm_up_parser
 
-        MetaLoader(model, self).visit(tree)
-        LexerRuleLoader(model).visit(tree)
-        ParserRuleLoader(model).visit(tree)
+    def save_parser_state(self):
+        """
+        Save snapshot of the parser DFA caches next to the persistent cache
+        if they've grown since they were warmed up.
 
-        return model
+        """
 
+        path = self._get_dfa_snapshot_path()
+        if self._dfa_size is None or path is None:
+            return
 
-class ModelImpl(Model):
-    def __init__(self, path: str, offset: int, in_memory: bool, has_errors: bool):
-        self._path = path
-        self._in_memory = in_memory
-        self._offset = offset
-        self._has_errors = has_errors
+        from sphinx_a4doc.model.dfa_cache import save_dfa, get_dfa_size
 
-        self._lexer_rules: Dict[str, LexerRule] = {}
-        self._parser_rules: Dict[str, ParserRule] = {}
-        self._imports: Set[Model] = set()
+        size = get_dfa_size()
+        if size > self._dfa_size:
+            save_dfa(path)
+            self._dfa_size = size
 
-        self._type: Optional[str] = None
-        self._name: Optional[str] = None
-        self._docs: Optional[List[Tuple[int, str]]] = None
+    def from_file(self, path: Union[str, Tuple[str, int]]) -> 'Model':
+        # Models are linked once the outermost call finishes,
+        # i.e. when all of their imports are loaded.
+        self._loading_depth += 1
+        try:
+            model = self._from_file(path)
+        finally:
+            self._loading_depth -= 1
+            if self._loading_depth == 0:
+                self._link_loaded()
+        if self._loading_depth == 0:
+            self._evict(keep=model)
+        return model
 
-    def has_errors(self) -> bool:
-        return self._has_errors
+    def _from_file(self, path: Union[str, Tuple[str, int]]) -> 'Model':
+        if isinstance(path, tuple):
+            path, offset = path
+        else:
+            path, offset = path, 0
 
-    def get_type(self) -> Optional[str]:
-        return self._type
+        path = os.path.abspath(os.path.normpath(path))
 
-    def set_type(self, t: str):
-        self._type = t
+        if path in self._loaded:
+            self._refresh(path)
 
-    def get_name(self) -> str:
-        return self._name
+        if path in self._loaded:
+            self._loaded.move_to_end(path)
+            return self._loaded[path]
 
-    def set_name(self, n: str):
-        self._name = n
+        if not os.path.exists(path):
+            logger.error(f'unable to load {path!r}: file not found')
+            model = self._loaded[path] = ModelImpl(path, offset, False, True)
+            self._signatures[path] = None
+            self._unlinked.append(model)
+            return model
 
-    def is_in_memory(self):
-        return self._in_memory
+        stat = os.stat(path)
 
-    def get_path(self) -> str:
-        return self._path
+        with open(path, 'r', encoding='utf-8', errors='strict') as f:
+            text = f.read()
 
-    def get_model_docs(self) -> Optional[List[Tuple[int, str]]]:
-        return self._docs
+        self._signatures[path] = (stat.st_mtime_ns, stat.st_size, _hash_text(text))
 
-    def set_model_docs(self, docs: Optional[List[Tuple[int, str]]]):
-        self._docs = docs
+        if path.endswith('.tokens'):
+            from sphinx_a4doc.model.token_vocab import load_token_vocab
+            self._loaded[path] = load_token_vocab(self, text, path)
+            return self._loaded[path]
 
-    def get_offset(self) -> int:
-        return self._offset
+        if self._incremental:
+            self._texts[path] = text
 
-    def add_import(self, model: 'Model'):
-        self._imports.add(model)
+        if self._persistent is not None:
+            cached = self._persistent.load(text, path, offset)
+            if cached is not None:
+                model, imports = cached
+                # Register model before loading imports in case they're cyclic.
+                self._loaded[path] = model
+                self._unlinked.append(model)
+                for im in imports:
+                    if im.endswith('.tokens') and not self._token_vocab_files:
+                        im = os.path.splitext(im)[0] + '.g4'
+                    model.add_import(self.from_file(im))
+                return model
 
-    def set_lexer_rule(self, name: str, rule: LexerRule):
-        self._lexer_rules[name] = rule
+        self._loaded[path] = self._do_load(text, path, offset, False, [])
+        self._unlinked.append(self._loaded[path])
 
-    def set_parser_rule(self, name: str, rule: ParserRule):
-        self._parser_rules[name] = rule
+        if self._persistent is not None and not self._loaded[path].has_errors():
+            self._persistent.store(text, path, offset, self._loaded[path])
 
-    def lookup_local(self, name: str) -> Optional[RuleBase]:
-        if name in self._lexer_rules:
-            return self._lexer_rules[name]
-        if name in self._parser_rules:
-            return self._parser_rules[name]
+        return self._loaded[path]
 
-        return None
+    def is_loaded(self, path: str) -> bool:
+        return os.path.abspath(os.path.normpath(path)) in self._loaded
 
-    def get_imports(self) -> Iterable[Model]:
-        return iter(self._imports)
+    def export(self, path: str) -> Tuple[str, Optional[Tuple[int, int, str]], Model, List[str], Optional[str]]:
+        """
+        Get a loaded model along with everything that's needed to add it
+        to another cache via `merge()`.
 
-    def get_terminals(self) -> Iterable[LexerRule]:
-        return iter(set(self._lexer_rules.values()))
+        """
 
-    def get_non_terminals(self) -> Iterable[ParserRule]:
-        return iter(set(self._parser_rules.values()))
+        path = os.path.abspath(os.path.normpath(path))
+        model = self._loaded[path]
+        imports = sorted(m.get_path() for m in model.get_imports())
+        return path, self._signatures.get(path), model, imports, self._texts.get(path)
+
+    def merge(self, entries: Iterable[Tuple[str, Optional[Tuple[int, int, str]], Model, List[str], Optional[str]]]):
+        """
+        Add models exported from another cache, usually the one that lives
+        in another process. Models that are already loaded are not replaced.
+
+        Imports are linked after all models are added, so models that
+        import each other end up referring to the merged instances.
+
+        """
+
+        merged = []
+
+        for path, signature, model, imports, text in entries:
+            if path in self._loaded:
+                continue
+            self._loaded[path] = model
+            self._signatures[path] = signature
+            if self._incremental and text is not None:
+                self._texts[path] = text
+            self._unlinked.append(model)
+            merged.append((model, imports))
+
+        self._loading_depth += 1
+        try:
+            for model, imports in merged:
+                for im in imports:
+                    model.add_import(self.from_file(im))
+        finally:
+            self._loading_depth -= 1
+            if self._loading_depth == 0:
+                self._link_loaded()
+        if self._loading_depth == 0:
+            self._evict()
+
+    def invalidate(self, path: str):
+        """
+        Drop model for the given file from the cache, along with all models
+        that import it, directly or indirectly.
+
+        """
 
+        path = os.path.abspath(os.path.normpath(path))
 
-class MetaLoader(ParserVisitor):
-    def __init__(self, model: ModelImpl, cache: ModelCacheImpl):
-        self._model = model
-        self._cache = cache
-        if self._model.is_in_memory():
-            self._basedir = None
-        else:
-            self._basedir = os.path.dirname(self._model.get_path())
+        self._referrers.clear()
+
+        stack = [path]
+        while stack:
+            path = stack.pop()
+            model = self._drop(path)
+            if model is None:
+                continue
+            if isinstance(model, ModelImpl):
+                # Someone may still hold the dropped model.
+                model.invalidate_symbols()
+            for dependent_path, dependent in list(self._loaded.items()):
+                if model in dependent.get_imports():
+                    stack.append(dependent_path)
+
+    def _refresh(self, path: str):
+        # Check the model and everything that it imports; invalidate
+        # models whose files were changed since they've been loaded.
+        stale = []
+        seen = set()
+        models = [self._loaded[path]]
+        while models:
+            model = models.pop()
+            if model in seen:
+                continue
+            seen.add(model)
+            if not model.is_in_memory() and self._is_stale(model.get_path()):
+                stale.append(model.get_path())
+            models.extend(model.get_imports())
+        for stale_path in stale:
+            if self._incremental and self._update(stale_path):
+                continue
+            logger.debug(f'a4doc: {stale_path} was modified, reloading')
+            self.invalidate(stale_path)
+
+    def _update(self, path: str) -> bool:
+        # Incremental reparse: rules whose text didn't change are kept,
+        # changed rules are parsed again and spliced into the model.
+        # Returns `False` if the model should be reloaded from scratch,
+        # i.e. if anything but rule specs changed.
+        model = self._loaded.get(path)
+        old_text = self._texts.get(path)
+        if not isinstance(model, ModelImpl) or model.has_errors() or old_text is None:
+            return False
+
+        try:
+            stat = os.stat(path)
+            with open(path, 'r', encoding='utf-8', errors='strict') as f:
+                text = f.read()
+        except (OSError, UnicodeError):
+            return False
+
+        old = split_grammar(old_text)
+        new = split_grammar(text)
+        if (
+            old is None or new is None or old.header != new.header or
+            len(set(old.names)) != len(old.names) or len(set(new.names)) != len(new.names)
+        ):
+            return False
+
+        old_chunks: Dict[str, int] = {chunk: i for i, chunk in enumerate(old.chunks)}
+        changed = [i for i, chunk in enumerate(new.chunks) if chunk not in old_chunks]
+        if len(changed) == len(new.chunks):
+            return False
+
+        # Rules can be stored under several names, e.g. literal tokens
+        # are also stored under their literal.
+        keys: Dict[RuleBase, List[str]] = {}
+        for name, rule in model.get_lexer_rules().items():
+            keys.setdefault(rule, []).append(name)
+        for name, rule in model.get_parser_rules().items():
+            keys.setdefault(rule, []).append(name)
+
+        owned = {model.lookup_local(name) for name in old.names}
+        lexer_rules = {k: r for k, r in model.get_lexer_rules().items() if r not in owned}
+        parser_rules = {k: r for k, r in model.get_parser_rules().items() if r not in owned}
+
+        for i, chunk in enumerate(new.chunks):
+            if chunk not in old_chunks:
+                continue
+            j = old_chunks[chunk]
+            old_rule = model.lookup_local(old.names[j])
+            if old_rule is None:
+                return False
+            rule = _shift_rule(old_rule, new.lines[i] - old.lines[j])
+            rules = lexer_rules if isinstance(rule, LexerRule) else parser_rules
+            for key in keys[old_rule]:
+                rules[key] = rule
+
+        model.set_rules(lexer_rules, parser_rules)
+
+        # Changed rules are parsed along with the grammar header. They're
+        # padded with newlines, so that line numbers stay the same.
+        parts = [new.header]
+        line = 1 + new.header.count('\n')
+        for i in changed:
+            parts.append('\n' * (new.lines[i] - line))
+            parts.append(new.chunks[i])
+            line = new.lines[i] + new.chunks[i].count('\n')
+
+        # If parsing fails, the model is reloaded from scratch,
+        # and errors are reported then.
+        if changed:
+            collector = sphinx.util.logging.LogCollector()
+            with collector.collect():
+                result = self._do_load(''.join(parts), path, model.get_offset(), False, [], model)
+            if result is not model or model.has_errors():
+                return False
+            for record in collector.logs:
+                logger.handle(record)
+
+        logger.verbose(f'a4doc: {path} was modified, reparsed {len(changed)} of {len(new.chunks)} rules')
+
+        self._signatures[path] = (stat.st_mtime_ns, stat.st_size, _hash_text(text))
+        self._texts[path] = text
+        self._forget_stats(path)
+        self._referrers.clear()
+
+        if self._persistent is not None:
+            self._persistent.store(text, path, model.get_offset(), model)
+
+        # Models that import this one may refer to the replaced rules,
+        # and their symbol indexes include them.
+        dependents = [model]
+        for dependent in dependents:
+            self._unlinked.append(dependent)
+            if isinstance(dependent, ModelImpl):
+                dependent.invalidate_symbols()
+            for other in self._loaded.values():
+                if dependent in other.get_imports() and other not in dependents:
+                    dependents.append(other)
+
+        return True
+
+    def _link_loaded(self):
+        unlinked, self._unlinked = self._unlinked, []
+        if unlinked:
+            self._referrers.clear()
+        for model in unlinked:
+            # Rules are linked lazily, when their contents are accessed.
+            if isinstance(model, ModelImpl):
+                model.unlink()
+
+    def get_referrers(self, rule: RuleBase, model: Model) -> List[RuleBase]:
+        # Reverse index only depends on the import closure of the root model,
+        # so it doesn't matter what else is loaded. It's rebuilt after models
+        # are loaded or invalidated.
+        if model.is_in_memory():
+            return self._build_referrers(model).get(rule, [])
+        index = self._referrers.get(model.get_path())
+        if index is None:
+            index = self._referrers[model.get_path()] = self._build_referrers(model)
+        return index.get(rule, [])
+
+    @staticmethod
+    def _build_referrers(root: Model) -> Dict[RuleBase, List[RuleBase]]:
+        index: Dict[RuleBase, Set[RuleBase]] = {}
+        seen = {root}
+        models = [root]
+        while models:
+            model = models.pop()
+            if isinstance(model, ModelImpl):
+                for referrer, target in model.get_references():
+                    index.setdefault(target, set()).add(referrer)
+            for im in model.get_imports():
+                if im not in seen:
+                    seen.add(im)
+                    models.append(im)
+        return {
+            target: sorted(referrers, key=lambda r: (r.position, r.name))
+            for target, referrers in index.items()
+        }
+
+    def _is_stale(self, path: str) -> bool:
+        if path not in self._signatures:
+            return False  # not loaded by this cache
+
+        signature = self._signatures[path]
+
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return signature is not None
+
+        if signature is None:
+            return True
+
+        mtime, size, text_hash = signature
+
+        if (stat.st_mtime_ns, stat.st_size) == (mtime, size):
+            return False
+
+        if self._check_hashes:
+            try:
+                with open(path, 'r', encoding='utf-8', errors='strict') as f:
+                    new_hash = _hash_text(f.read())
+            except (OSError, ValueError):
+                return True
+            if new_hash == text_hash:
+                self._signatures[path] = (stat.st_mtime_ns, stat.st_size, text_hash)
+                return False
+
+        return True
 
-    def add_import(self, name: str, position: Position):
-        if self._model.is_in_memory():
-            logger.error(f'{position}: WARNING: imports are not allowed for in-memory grammars')
-        else:
-            model = self._cache.from_file(os.path.join(self._basedir, name + '.g4'))
-            self._model.add_import(model)
-
-    def visitGrammarSpec(self, ctx):
-        t = ctx.gtype.getText()
-        if 'lexer' in t:  # that's nasty =(
-            t = 'lexer'   # in fact, the whole file is nasty =(
-        elif 'parser' in t:
-            t = 'parser'
+    def from_text(self, text: str, path: Union[str, Tuple[str, int]] = '<in-memory>', imports: List['Model'] = None) -> 'Model':
+        if isinstance(path, tuple):
+            path, offset = path
         else:
-            t = None
-        self._model.set_name(ctx.gname.getText())
-        self._model.set_type(t)
-        if ctx.docs:
-            docs = load_docs(self._model, ctx.docs, allow_cmd=False)
-            self._model.set_model_docs(docs['documentation'])
-        return super(MetaLoader, self).visitGrammarSpec(ctx)
-
-    def visitParserRuleSpec(self, ctx: Parser.ParserRuleSpecContext):
-        return None  # do not recurse into this
-
-    def visitLexerRuleSpec(self, ctx: Parser.LexerRuleSpecContext):
-        return None  # do not recurse into this
-
-    def visitModeSpec(self, ctx: Parser.ModeSpecContext):
-        return None  # do not recurse into this
-
-    def visitOption(self, ctx: Parser.OptionContext):
-        if ctx.name.getText() == 'tokenVocab':
-            self.add_import(ctx.value.getText(),
-                            Position(self._model.get_path(), ctx.start.line + self._model.get_offset()))
-
-    def visitDelegateGrammar(self, ctx: Parser.DelegateGrammarContext):
-        self.add_import(ctx.value.getText(),
-                        Position(self._model.get_path(), ctx.start.line + self._model.get_offset()))
-
-    def visitTokensSpec(self, ctx: Parser.TokensSpecContext):
-        tokens: List[Parser.IdentifierContext] = ctx.defs.defs
-        for token in tokens:
-            rule = LexerRule(
-                name=token.getText(),
-                display_name=None,
-                model=self._model,
-                position=Position(self._model.get_path(), token.start.line + self._model.get_offset()),
-                is_literal=False,
-                is_fragment=False,
-                content=None,
-                is_doxygen_nodoc=True,
-                is_doxygen_inline=True,
-                is_doxygen_no_diagram=True,
-                importance=1,
-                documentation='',
-                section=None,
-            )
-
-            self._model.set_lexer_rule(rule.name, rule)
-
-
-class RuleLoader(ParserVisitor):
-    rule_class: Union[Type[RuleBase], Type[LexerRule], Type[ParserRule]] = None
-
-    def __init__(self, model: ModelImpl):
-        self._model = model
-        self._current_section: Optional[Section] = None
-
-    def wrap_suffix(self, element, suffix):
-        if element == self.rule_class.EMPTY:
-            return element
-        if suffix is None:
-            return element
-        suffix: str = suffix.getText()
-        if suffix.startswith('?'):
-            if isinstance(element, self.rule_class.Maybe):
-                return element
-            else:
-                return self.rule_class.Maybe(child=element)
-        if suffix.startswith('+'):
-            return self.rule_class.OnePlus(child=element)
-        if suffix.startswith('*'):
-            return self.rule_class.ZeroPlus(child=element)
-        return element
-
-    def make_alt_rule(self, content):
-        has_empty_alt = False
-        alts = []
-
-        for alt in [self.visit(alt) for alt in content]:
-            if isinstance(alt, self.rule_class.Maybe):
-                has_empty_alt = True
-                alt = alt.child
-            if alt == self.rule_class.EMPTY:
-                has_empty_alt = True
-            elif isinstance(alt, self.rule_class.Alternative):
-                alts.extend(alt.children)
-            else:
-                alts.append(alt)
-
-        if len(alts) == 0:
-            return self.rule_class.EMPTY
-        elif len(alts) == 1 and has_empty_alt:
-            return self.rule_class.Maybe(child=alts[0])
-        elif len(alts) == 1:
-            return alts[0]
-
-        rule = self.rule_class.Alternative(children=tuple(alts))
-
-        if has_empty_alt:
-            rule = self.rule_class.Maybe(rule)
-
-        return rule
-
-    def make_seq_rule(self, content):
-        elements = []
-        linebreaks = set()
-
-        for element in [self.visit(element) for element in content]:
-            if isinstance(element, self.rule_class.Sequence):
-                elements.extend(element.children)
-            else:
-                elements.append(element)
-            linebreaks.add(len(elements) - 1)
-
-        if len(elements) == 1:
-            return elements[0]
-
-        linebreaks = tuple(True if i in linebreaks else False
-                           for i in range(len(elements)))
-        return self.rule_class.Sequence(tuple(elements), linebreaks)
-
-    def visitRuleSpec(self, ctx: Parser.RuleSpecContext):
-        docs: List[Tuple[int, str]] = []
+            path, offset = path, 0
+        return self._do_load(text, path, offset, True, imports)
 
-        start_line = None
-        cur_line = None
-        cur_doc: List[str] = []
+    def _do_load(self, text: str, path: str, offset: int, in_memory: bool, imports: List['Model'],
+                 target: Optional['ModelImpl'] = None) -> 'Model':
+        # If `target` is given, rules are added to it instead of a new model.
+        if self._fast_loader:
+            from sphinx_a4doc.model.fast_loader import FastLoader, UnsupportedSyntax
 
-        for token in ctx.headers:
-            text: str = token.text.lstrip('/').strip()
-            line: int = token.line + self._model.get_offset()
+            model = target or ModelImpl(path, offset, in_memory, False)
 
-            if start_line is None:
-                start_line = line
+            for im in imports or []:
+                model.add_import(im)
 
-            if cur_line is None or cur_line == line - 1:
-                cur_doc.append(text)
+            try:
+                FastLoader(model, self).load(text)
+            except UnsupportedSyntax as e:
+                logger.debug(f'a4doc: falling back to ANTLR for {path}: {e}')
             else:
-                docs.append((start_line, '\n'.join(cur_doc)))
-                start_line = line
-                cur_doc = [text]
-            cur_line = line
-
-        if cur_doc:
-            docs.append((start_line, '\n'.join(cur_doc)))
-
-        if docs:
-            self._current_section = Section(docs)
-        else:
-            self._current_section = None
-        super(RuleLoader, self).visitRuleSpec(ctx)
+                return model
 
+        if not self._two_stage_parsing:
+            return self._parse(text, path, offset, in_memory, imports, sll=False, target=target)
 
-class LexerRuleLoader(RuleLoader):
-    rule_class = LexerRule
+        start = time.perf_counter()
+        model = self._parse(text, path, offset, in_memory, imports, sll=True, target=target)
+        sll_time = time.perf_counter() - start
 
-    def visitParserRuleSpec(self, ctx: Parser.ParserRuleSpecContext):
-        return None  # do not recurse into this
-
-    def visitPrequelConstruct(self, ctx: Parser.PrequelConstructContext):
-        return None  # do not recurse into this
-
-    def visitLexerRuleSpec(self, ctx: Parser.LexerRuleSpecContext):
-        content: LexerRule.RuleContent = self.visit(ctx.lexerRuleBlock())
-
-        doc_info = load_docs(self._model, ctx.docs)
-
-        if isinstance(content, LexerRule.Literal):
-            is_literal = True
-            literal = content.content
-        else:
-            is_literal = False
-            literal = ''
-
-        rule = LexerRule(
-            name=ctx.name.text,
-            display_name=doc_info['name'] or None,
-            model=self._model,
-            position=Position(self._model.get_path(), ctx.start.line + self._model.get_offset()),
-            content=content,
-            is_doxygen_nodoc=doc_info['is_doxygen_nodoc'],
-            is_doxygen_inline=doc_info['is_doxygen_inline'],
-            is_doxygen_no_diagram=doc_info['is_doxygen_no_diagram'],
-            importance=doc_info['importance'],
-            documentation=doc_info['documentation'],
-            is_fragment=bool(ctx.frag),
-            is_literal=is_literal,
-            section=self._current_section,
-        )
+        if model is not None:
+            logger.verbose(f'a4doc: parsed {path} in {sll_time:.3f}s (SLL)')
+            return model
 
-        self._model.set_lexer_rule(rule.name, rule)
-        if is_literal:
-            self._model.set_lexer_rule(literal, rule)
+        start = time.perf_counter()
+        model = self._parse(text, path, offset, in_memory, imports, sll=False, target=target)
+        ll_time = time.perf_counter() - start
 
-    def visitLexerAltList(self, ctx: Parser.LexerAltListContext):
-        return self.make_alt_rule(ctx.alts)
+        logger.verbose(f'a4doc: parsed {path} in {sll_time + ll_time:.3f}s '
+                       f'(SLL failed after {sll_time:.3f}s, LL took {ll_time:.3f}s)')
+        return model
 
-    def visitLexerAlt(self, ctx: Parser.LexerAltContext):
-        return self.visit(ctx.lexerElements())
+    def _parse(self, text: str, path: str, offset: int, in_memory: bool, imports: List['Model'], sll: bool,
+               target: Optional['ModelImpl'] = None) -> Optional['Model']:
+        # ANTLR runtime and the generated parser are heavy, so they're only
+        # imported when a grammar needs to be parsed.
+        from sphinx_a4doc.model.loader import parse
 
-    def visitLexerElements(self, ctx: Parser.LexerElementsContext):
-        return self.make_seq_rule(ctx.elements)
+        if self._warm_up_parser and self._dfa_size is None:
+            self._warm_up_dfa()
 
-    def visitLexerElementLabeled(self, ctx: Parser.LexerElementLabeledContext):
-        return self.wrap_suffix(self.visit(ctx.value), ctx.suffix)
+        return parse(self, text, path, offset, in_memory, imports, sll, target)
 
-    def visitLexerElementAtom(self, ctx: Parser.LexerElementAtomContext):
-        return self.wrap_suffix(self.visit(ctx.value), ctx.suffix)
+    def _warm_up_dfa(self):
+        from sphinx_a4doc.model.dfa_cache import warm_up_dfa, load_dfa, get_dfa_size
 
-    def visitLexerElementBlock(self, ctx: Parser.LexerElementBlockContext):
-        return self.wrap_suffix(self.visit(ctx.value), ctx.suffix)
+        path = self._get_dfa_snapshot_path()
+        if path is None or not load_dfa(path):
+            warm_up_dfa()
+        self._dfa_size = get_dfa_size()
 
-    def visitLexerElementAction(self, ctx: Parser.LexerElementActionContext):
-        return LexerRule.EMPTY
+    def _get_dfa_snapshot_path(self) -> Optional[str]:
+        if self._persistent is None:
+            return None
+        return os.path.join(self._persistent.get_path(), DFA_SNAPSHOT_NAME)
 
-    def visitLabeledLexerElement(self, ctx: Parser.LabeledLexerElementContext):
-        return self.visit(ctx.lexerAtom() or ctx.lexerBlock())
 
-    def visitLexerBlock(self, ctx: Parser.LexerBlockContext):
-        return self.visit(ctx.lexerAltList())
+def _hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
 
-    def visitCharacterRange(self, ctx: Parser.CharacterRangeContext):
-        return LexerRule.Range(start=ctx.start.text, end=ctx.end.text)
 
-    def visitTerminalRef(self, ctx: Parser.TerminalRefContext):
-        return LexerRule.Reference(model=self._model, name=ctx.value.text)
+def _get_model_stats(model: Model) -> ModelStats:
+    rules = {*model.get_terminals(), *model.get_non_terminals()}
 
-    def visitTerminalLit(self, ctx: Parser.TerminalLitContext):
-        content = ctx.value.text
-        if content == "''":
-            return LexerRule.EMPTY
-        else:
-            return LexerRule.Literal(content=ctx.value.text)
+    size = sys.getsizeof(model) + sys.getsizeof(model.__dict__)
+    if isinstance(model, ModelImpl):
+        size += sys.getsizeof(model.get_lexer_rules()) + sys.getsizeof(model.get_parser_rules())
 
-    def visitLexerAtomCharSet(self, ctx: Parser.LexerAtomCharSetContext):
-        content = ctx.value.text
-        if content == '[]':
-            return LexerRule.EMPTY
-        else:
-            return LexerRule.CharSet(content=content)
+    # Content nodes are shared, so each one is only counted once.
+    # Contents that weren't built yet are skipped, as building them
+    # just to measure their size defeats the purpose.
+    seen = set()
+    for rule in rules:
+        size += sys.getsizeof(rule) + sys.getsizeof(rule.__dict__)
+        for _, doc in rule.documentation or []:
+            size += sys.getsizeof(doc)
+        content = rule.__dict__.get('content') or rule.__dict__.get('_unlinked_content')
+        stack = [content] if content is not None else []
+        while stack:
+            node = stack.pop()
+            if id(node) not in seen:
+                seen.add(id(node))
+                size += sys.getsizeof(node)
+                stack.extend(get_children(node))
 
-    def visitLexerAtomWildcard(self, ctx: Parser.LexerAtomWildcardContext):
-        return LexerRule.WILDCARD
+    return ModelStats(model.get_path(), len(rules), len(seen), size)
 
-    def visitLexerAtomDoc(self, ctx: Parser.LexerAtomDocContext):
-        docs = load_docs(self._model, [ctx.value], False)['documentation']
-        return LexerRule.Doc(value='\n'.join(d[1] for d in docs))
 
-    def visitNotElement(self, ctx: Parser.NotElementContext):
-        return LexerRule.Negation(child=self.visit(ctx.value))
+def _shift_rule(rule: RuleBase, delta: int) -> RuleBase:
+    # Move rule that was declared `delta` lines above or below.
+    if delta == 0:
+        return rule
 
-    def visitNotBlock(self, ctx: Parser.NotBlockContext):
-        return LexerRule.Negation(child=self.visit(ctx.value))
+    def shift_docs(docs):
+        return [(line + delta, doc) for line, doc in docs] if docs is not None else None
 
-    def visitBlockSet(self, ctx: Parser.BlockSetContext):
-        return self.make_alt_rule(ctx.elements)
+    return replace(
+        rule,
+        position=replace(rule.position, line=rule.position.line + delta),
+        documentation=shift_docs(rule.documentation),
+        section=Section(shift_docs(rule.section.docs)) if rule.section is not None else None,
+        # Don't build or link content if it's not built or linked yet.
+        content=(
+            rule.__dict__.get('_lazy_content') or
+            rule.__dict__.get('_unlinked_content') or
+            rule.content
+        ),
+    )
 
-    def visitSetElementRef(self, ctx: Parser.SetElementRefContext):
-        return LexerRule.Reference(model=self._model, name=ctx.value.text)
 
-    def visitSetElementLit(self, ctx: Parser.SetElementLitContext):
-        content = ctx.value.text
-        if content == "''":
-            return LexerRule.EMPTY
-        else:
-            return LexerRule.Literal(content=ctx.value.text)
+class ModelImpl(Model):
+    def __init__(self, path: str, offset: int, in_memory: bool, has_errors: bool):
+        self._path = path
+        self._in_memory = in_memory
+        self._offset = offset
+        self._has_errors = has_errors
 
-    def visitSetElementCharSet(self, ctx: Parser.SetElementCharSetContext):
-        content = ctx.value.text
-        if content == '[]':
-            return LexerRule.EMPTY
-        else:
-            return LexerRule.CharSet(content=content)
-
-
-class ParserRuleLoader(RuleLoader):
-    rule_class = ParserRule
-
-    def visitParserRuleSpec(self, ctx: Parser.ParserRuleSpecContext):
-        content: ParserRule.RuleContent = self.visit(ctx.ruleBlock())
-        doc_info = load_docs(self._model, ctx.docs)
-        rule = ParserRule(
-            name=ctx.name.text,
-            display_name=doc_info['name'] or None,
-            model=self._model,
-            position=Position(self._model.get_path(), ctx.start.line + self._model.get_offset()),
-            content=content,
-            is_doxygen_nodoc=doc_info['is_doxygen_nodoc'],
-            is_doxygen_inline=doc_info['is_doxygen_inline'],
-            is_doxygen_no_diagram=doc_info['is_doxygen_no_diagram'],
-            importance=doc_info['importance'],
-            documentation=doc_info['documentation'],
-            section=self._current_section,
-        )
+        self._lexer_rules: Dict[str, LexerRule] = {}
+        self._parser_rules: Dict[str, ParserRule] = {}
+        self._imports: Set[Model] = set()
 
-        self._model.set_parser_rule(rule.name, rule)
+        self._type: Optional[str] = None
+        self._name: Optional[str] = None
+        self._docs: Optional[List[Tuple[int, str]]] = None
 
-    def visitPrequelConstruct(self, ctx: Parser.PrequelConstructContext):
-        return None  # do not recurse into this
+        # Incremented whenever imports of this model change, or when
+        # the model is updated. Model cache also increments versions
+        # of models that import the updated one.
+        self._version = 0
 
-    def visitLexerRuleSpec(self, ctx: Parser.LexerRuleSpecContext):
-        return None  # do not recurse into this
+        self._symbols: Optional[Dict[str, RuleBase]] = None
+        self._symbols_version = -1
 
-    def visitModeSpec(self, ctx: Parser.ModeSpecContext):
-        return None  # do not recurse into this
+        self._dependency_graph = None
+        self._dependency_graph_version = -1
 
-    def visitRuleAltList(self, ctx: Parser.RuleAltListContext):
-        return self.make_alt_rule(ctx.alts)
+        # Unresolved references and referred rules for every linked rule.
+        self._links: Dict[RuleBase, Tuple[List[UnresolvedReference], List[RuleBase]]] = {}
 
-    def visitAltList(self, ctx: Parser.AltListContext):
-        return self.make_alt_rule(ctx.alts)
+    def invalidate_symbols(self):
+        """
+        Invalidate symbol index and other data that is derived from
+        this model and its imports.
 
-    def visitLabeledAlt(self, ctx: Parser.LabeledAltContext):
-        return self.visit(ctx.alternative())
+        This is called when imports change. Setting rules doesn't call it,
+        so that loading a grammar invalidates the model once, not once
+        per rule; whoever updates rules of a model that was already
+        looked up should call it for the model and for every model that
+        imports it.
 
-    def visitAlternative(self, ctx: Parser.AlternativeContext):
-        return self.make_seq_rule(ctx.elements)
+        """
+        self._version += 1
 
-    def visitParserElementLabeled(self, ctx: Parser.ParserElementLabeledContext):
-        return self.wrap_suffix(self.visit(ctx.value), ctx.suffix)
+    def get_version(self) -> int:
+        """
+        Get counter that changes whenever this model or the models it
+        imports change. Data derived from the model can be memoized
+        until it changes.
 
-    def visitParserElementAtom(self, ctx: Parser.ParserElementAtomContext):
-        return self.wrap_suffix(self.visit(ctx.value), ctx.suffix)
+        """
+        return self._version
 
-    def visitParserElementBlock(self, ctx: Parser.ParserElementBlockContext):
-        return self.wrap_suffix(self.visit(ctx.value), ctx.suffix)
+    def has_errors(self) -> bool:
+        return self._has_errors
 
-    def visitParserElementAction(self, ctx: Parser.ParserElementActionContext):
-        return ParserRule.EMPTY
+    def get_type(self) -> Optional[str]:
+        return self._type
 
-    def visitParserInlineDoc(self, ctx: Parser.ParserInlineDocContext):
-        docs = load_docs(self._model, [ctx.value], False)['documentation']
-        return ParserRule.Doc(value='\n'.join(d[1] for d in docs))
+    def set_type(self, t: str):
+        self._type = t
 
-    def visitLabeledElement(self, ctx: Parser.LabeledElementContext):
-        return self.visit(ctx.atom() or ctx.block())
+    def get_name(self) -> str:
+        return self._name
 
-    def visitBlock(self, ctx: Parser.BlockContext):
-        return self.visit(ctx.altList())
+    def set_name(self, n: str):
+        self._name = n
 
-    def visitAtomWildcard(self, ctx: Parser.AtomWildcardContext):
-        return ParserRule.WILDCARD
+    def is_in_memory(self):
+        return self._in_memory
 
-    def visitTerminalRef(self, ctx: Parser.TerminalRefContext):
-        return ParserRule.Reference(model=self._model, name=ctx.value.text)
+    def get_path(self) -> str:
+        return self._path
 
-    def visitTerminalLit(self, ctx: Parser.TerminalLitContext):
-        return ParserRule.Reference(model=self._model, name=ctx.value.text)
+    def get_model_docs(self) -> Optional[List[Tuple[int, str]]]:
+        return self._docs
 
-    def visitRuleref(self, ctx: Parser.RulerefContext):
-        return ParserRule.Reference(model=self._model, name=ctx.value.text)
+    def set_model_docs(self, docs: Optional[List[Tuple[int, str]]]):
+        self._docs = docs
 
-    def visitNotElement(self, ctx: Parser.NotElementContext):
-        return ParserRule.Negation(child=self.visit(ctx.value))
+    def get_offset(self) -> int:
+        return self._offset
 
-    def visitNotBlock(self, ctx: Parser.NotBlockContext):
-        return ParserRule.Negation(child=self.visit(ctx.value))
+    def get_unresolved_references(self) -> List[UnresolvedReference]:
+        """
+        Get references that can't be resolved, ordered by position.
 
-    def visitBlockSet(self, ctx: Parser.BlockSetContext):
-        return self.make_alt_rule(ctx.elements)
+        Note that this builds and links contents of all rules.
 
-    def visitSetElementRef(self, ctx: Parser.SetElementRefContext):
-        return ParserRule.Reference(model=self._model, name=ctx.value.text)
+        """
+        return [ref for rule in self._link_all() for ref in self._links.get(rule, ([], []))[0]]
 
-    def visitSetElementLit(self, ctx: Parser.SetElementLitContext):
-        return ParserRule.Reference(model=self._model, name=ctx.value.text)
+    def get_references(self) -> List[Tuple[RuleBase, RuleBase]]:
+        """
+        Get ``(referrer, target)`` pairs for every pair of rules such that
+        body of ``referrer`` is declared in this model and refers ``target``.
 
-    def visitSetElementCharSet(self, ctx: Parser.SetElementCharSetContext):
-        # Char sets are not allowed in parser rules,
-        # yet our grammar can match them...
-        return ParserRule.EMPTY
+        Note that this builds and links contents of all rules.
 
-    def visitCharacterRange(self, ctx: Parser.CharacterRangeContext):
-        # This also makes no sense...
-        return ParserRule.EMPTY
+        """
+        return [(rule, target) for rule in self._link_all() for target in self._links.get(rule, ([], []))[1]]
 
+    def _link_all(self) -> List[RuleBase]:
+        rules: List[RuleBase] = [*self.get_terminals(), *self.get_non_terminals()]
+        rules.sort(key=lambda rule: rule.position)
+        for rule in rules:
+            getattr(rule, 'content')
+        return rules
 
-def load_docs(model, tokens, allow_cmd=True):
-        is_doxygen_nodoc = False
-        is_doxygen_inline = False
-        is_doxygen_no_diagram = False
-        importance = 1
-        name = None
-        docs: List[Tuple[int, str]] = []
+    def needs_linking(self) -> bool:
+        """
+        Check whether references in this model should be resolved.
 
-        for token in tokens:
-            text: str = token.text
-            position = Position(model.get_path(), token.line + model.get_offset())
-            if text.startswith('//@'):
-                match = CMD_RE.match(text)
+        """
+        return True
 
-                if match is None:
-                    logger.error(f'{position}: WARNING: invalid command {text!r}')
-                    continue
+    def link_rule(self, rule: RuleBase, content: RuleBase.RuleContent):
+        if not self.needs_linking():
+            return
+        unresolved, targets = link_rule(rule, content)
+        self._links[rule] = unresolved, targets
+        # Importance of references depends on the rules they're bound to.
+        compute_importance(content)
+        for ref in unresolved:
+            logger.verbose(f'a4doc: {ref}')
 
-                if not allow_cmd:
-                    logger.error(f'{position}: WARNING: commands not allowed here')
-                    continue
+    def unlink(self):
+        """
+        Forget bindings of all references, e.g. because imported models
+        were changed. References are bound again when contents of rules
+        are accessed.
 
-                cmd = match['cmd']
-
-                if cmd == 'nodoc':
-                    is_doxygen_nodoc = True
-                elif cmd == 'inline':
-                    is_doxygen_inline = True
-                elif cmd == 'no-diagram':
-                    is_doxygen_no_diagram = True
-                elif cmd == 'unimportant':
-                    importance = 0
-                elif cmd == 'importance':
-                    try:
-                        val = int(match['ctx'].strip())
-                    except ValueError:
-                        logger.error(f'{position}: WARNING: importance requires an integer argument')
-                        continue
-                    if val < 0:
-                        logger.error(f'{position}: WARNING: importance should not be negative')
-                    importance = val
-                elif cmd == 'name':
-                    name = match['ctx'].strip()
-                    if not name:
-                        logger.error(f'{position}: WARNING: name command requires an argument')
-                        continue
-                else:
-                    logger.error(f'{position}: WARNING: unknown command {cmd!r}')
-
-                if cmd not in ['name', 'class', 'importance'] and match['ctx']:
-                    logger.warning(f'argument for {cmd!r} command is ignored')
-            else:
-                documentation_lines = []
+        """
+        self._links.clear()
+        for rule in {*self._lexer_rules.values(), *self._parser_rules.values()}:
+            rule.unlink()
 
-                lines = text.splitlines()
+    def add_import(self, model: 'Model'):
+        self._imports.add(model)
+        self.invalidate_symbols()
 
-                if len(lines) == 1:
-                    documentation_lines.append(lines[0][3:-2].strip())
-                else:
-                    first_line = lines[0]
-                    lines = lines[1:]
+    def set_lexer_rule(self, name: str, rule: LexerRule):
+        self._lexer_rules[name] = rule
 
-                    first_line = first_line[3:].strip()
-                    documentation_lines.append(first_line)
+    def set_parser_rule(self, name: str, rule: ParserRule):
+        self._parser_rules[name] = rule
 
-                    lines[-1] = lines[-1][:-2].rstrip()
+    def lookup_local(self, name: str) -> Optional[RuleBase]:
+        if name in self._lexer_rules:
+            return self._lexer_rules[name]
+        if name in self._parser_rules:
+            return self._parser_rules[name]
 
-                    if not lines[-1].lstrip():
-                        lines.pop()
+        return None
 
-                    if all(line.lstrip().startswith('*') for line in lines):
-                        lines = [line.lstrip()[1:] for line in lines]
+    def lookup(self, name: str) -> Optional[RuleBase]:
+        if self._symbols_version != self._version:
+            self._symbols = self._build_symbols()
+            self._symbols_version = self._version
+        if self._symbols is None:
+            return super().lookup(name)
+        return self._symbols.get(name)
+
+    def _build_symbols(self) -> Optional[Dict[str, RuleBase]]:
+        # Flatten symbols of the whole import closure into a single dict.
+        # Models are visited in BFS order, and symbols that were found first
+        # take precedence, so local symbols shadow imported ones.
+        symbols: Dict[str, RuleBase] = {}
+        seen = {self}
+        queue = [self]
+        for model in queue:
+            if not isinstance(model, ModelImpl):
+                return None  # can't enumerate symbols of other models
+            for rules in (model._lexer_rules, model._parser_rules):
+                for name, rule in rules.items():
+                    symbols.setdefault(name, rule)
+            for im in model._imports:
+                if im not in seen:
+                    seen.add(im)
+                    queue.append(im)
+        return symbols
+
+    def get_dependency_graph(self) -> 'DependencyGraph':
+        """
+        Get dependency graph for this model and its imports.
+
+        """
+        if self._dependency_graph_version != self._version:
+            from sphinx_a4doc.model.dependency_graph import DependencyGraph
+            self._dependency_graph = DependencyGraph.from_model(self)
+            self._dependency_graph_version = self._version
+        return self._dependency_graph
+
+    def get_lexer_rules(self) -> Dict[str, LexerRule]:
+        return self._lexer_rules
+
+    def get_parser_rules(self) -> Dict[str, ParserRule]:
+        return self._parser_rules
+
+    def set_rules(self, lexer_rules: Dict[str, LexerRule], parser_rules: Dict[str, ParserRule]):
+        self._lexer_rules = lexer_rules
+        self._parser_rules = parser_rules
 
-                    text = textwrap.dedent('\n'.join(lines))
+    def get_imports(self) -> Iterable[Model]:
+        return iter(self._imports)
 
-                    documentation_lines.append(text)
+    def get_terminals(self) -> Iterable[LexerRule]:
+        return iter(set(self._lexer_rules.values()))
 
-                docs.append((position.line, '\n'.join(documentation_lines)))
+    def get_non_terminals(self) -> Iterable[ParserRule]:
+        return iter(set(self._parser_rules.values()))
 
-        return dict(
-            importance=importance,
-            is_doxygen_inline=is_doxygen_inline,
-            is_doxygen_nodoc=is_doxygen_nodoc,
-            is_doxygen_no_diagram=is_doxygen_no_diagram,
-            name=name,
-            documentation=docs
-        )
+    def __getstate__(self):
+        # Imported models are not pickled, see `PersistentModelCache`.
+        state = self.__dict__.copy()
+        state['_imports'] = set()
+        state['_symbols'] = None
+        state['_symbols_version'] = -1
+        state['_dependency_graph'] = None
+        state['_dependency_graph_version'] = -1
+        state['_links'] = {}
+        # Nodes are re-interned when unpickled, see `intern_content`.
+        state.pop('_interned_content', None)
+        return state
+
+
+def __getattr__(name):
+    # Loaders used to live in this module.
+    if name in ('ModelLoader', 'MetaLoader', 'RuleLoader', 'LexerRuleLoader', 'ParserRuleLoader'):
+        import sphinx_a4doc.model.loader
+        return getattr(sphinx_a4doc.model.loader, name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -0,0 +1,105 @@
+from sphinx_a4doc.model.model import RuleBase, LexerRule
+from sphinx_a4doc.model.visitor import RuleContentVisitor, get_children
+
+from typing import *
+
+
+__all__ = [
+    'compute_importance',
+    'get_importance',
+]
+
+
+class _ImportanceCalculator(RuleContentVisitor[int]):
+    # Calculates importance of a node whose children already have
+    # their importance stored.
+
+    def visit_literal(self, r: LexerRule.Literal) -> int:
+        return 1
+
+    def visit_range(self, r: LexerRule.Range) -> int:
+        return 1
+
+    def visit_charset(self, r: LexerRule.CharSet) -> int:
+        return 1
+
+    def visit_reference(self, r: RuleBase.Reference) -> int:
+        rule = r.get_reference()
+        if rule is None:
+            return 1
+        else:
+            return rule.importance
+
+    def visit_doc(self, r: RuleBase.Doc) -> int:
+        return 0
+
+    def visit_wildcard(self, r: RuleBase.Wildcard) -> int:
+        return 1
+
+    def visit_negation(self, r: RuleBase.Negation) -> int:
+        return r.child._importance
+
+    def visit_zero_plus(self, r: RuleBase.ZeroPlus) -> int:
+        return r.child._importance
+
+    def visit_one_plus(self, r: RuleBase.OnePlus) -> int:
+        return r.child._importance
+
+    def visit_maybe(self, r: RuleBase.Maybe) -> int:
+        return r.child._importance
+
+    def visit_sequence(self, r: RuleBase.Sequence) -> int:
+        # Rules that match an empty string have empty sequences as bodies.
+        return max((c._importance for c in r.children), default=0)
+
+    def visit_alternative(self, r: RuleBase.Alternative) -> int:
+        return max(c._importance for c in r.children)
+
+
+_calculator = _ImportanceCalculator()
+
+
+def _store_importance(roots: Iterable[RuleBase.RuleContent], overwrite: bool):
+    # Bottom-up pass with an explicit stack. Nodes are shared, so each one
+    # is only calculated once per pass.
+    done = set()
+    stack = [(root, False) for root in roots]
+    while stack:
+        node, children_done = stack.pop()
+        if children_done:
+            object.__setattr__(node, '_importance', _calculator.visit(node))
+            done.add(id(node))
+        elif id(node) in done:
+            continue
+        elif not overwrite and getattr(node, '_importance', None) is not None:
+            continue
+        else:
+            stack.append((node, True))
+            stack.extend((child, False) for child in get_children(node))
+
+
+def compute_importance(content: RuleBase.RuleContent):
+    """
+    Calculate importance of every node of the given rule content,
+    and store it on the nodes.
+
+    Importance of a reference is importance of the rule it's bound to,
+    so this should be called every time the content is linked.
+
+    """
+
+    _store_importance([content], overwrite=True)
+
+
+def get_importance(r: RuleBase.RuleContent) -> int:
+    """
+    Get importance of the given content node. If it wasn't calculated
+    when the rule was linked, it is calculated now.
+
+    """
+
+    importance = getattr(r, '_importance', None)
+    if importance is None:
+        _store_importance([r], overwrite=False)
+        importance = r._importance
+    return importance
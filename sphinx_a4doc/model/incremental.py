@@ -0,0 +1,164 @@
+import re
+
+from typing import *
+
+
+__all__ = [
+    'GrammarSplit',
+    'split_grammar',
+]
+
+
+class GrammarSplit(NamedTuple):
+    """
+    Grammar text split at rule boundaries.
+
+    Concatenation of the header and all chunks gives the original text.
+
+    """
+
+    header: str
+    """Everything before the first rule: grammar declaration, options, imports, etc."""
+
+    chunks: List[str]
+    """Rule specs, each one starts with comments that precede the rule"""
+
+    names: List[str]
+    """Names of rules declared in each chunk"""
+
+    lines: List[int]
+    """Lines at which chunks start"""
+
+
+# Identifiers, see `NameStartChar` and `NameChar` in `LexBasic.g4`.
+_NAME_START_CHAR = (
+    r'A-Za-z\u00C0-\u00D6\u00D8-\u00F6\u00F8-\u02FF\u0370-\u037D\u037F-\u1FFF'
+    r'\u200C-\u200D\u2070-\u218F\u2C00-\u2FEF\u3001-\uD7FF'
+    r'\uF900-\uFDCF\uFDF0-\uFFFD'
+)
+_NAME_CHAR = _NAME_START_CHAR + r'0-9_\u00B7\u0300-\u036F\u203F-\u2040'
+
+TOKEN_RE = re.compile(rf'''
+    (?P<ws>[\ \t\r\n\f]+)
+    | (?P<comment>//[^\r\n]*|/\*[\s\S]*?\*/)
+    | (?P<string>'(?:\\[\s\S]|[^'\r\n\\])*')
+    | (?P<id>[{_NAME_START_CHAR}][{_NAME_CHAR}]*)
+    | (?P<bracket>\[(?:\\[\s\S]|[^\]\\])*\])
+    | (?P<action>\{{)
+    | (?P<punct>[\s\S])
+    ''', re.VERBOSE)
+
+ACTION_RE = re.compile(r'''
+    (?P<open>\{)
+    | (?P<close>\})
+    | (?P<skip>\\[\s\S]|'(?:\\[\s\S]|[^'\r\n\\])*'|"(?:\\[\s\S]|[^"\r\n\\])*"|//[^\r\n]*|/\*[\s\S]*?\*/)
+    | (?P<text>[^{}\\'"/]+|[\s\S])
+    ''', re.VERBOSE)
+
+# Keywords that can't start a rule.
+KEYWORDS = {
+    'grammar', 'lexer', 'parser', 'import', 'options', 'tokens', 'channels',
+    'catch', 'finally', 'returns', 'locals', 'throws', 'mode',
+}
+
+MODIFIERS = {'fragment', 'public', 'private', 'protected'}
+
+
+def split_grammar(text: str) -> Optional[GrammarSplit]:
+    """
+    Split grammar text at rule boundaries, so that rules can be reparsed
+    independently. A rule boundary is placed right after the end of the
+    previous rule, so comments that precede a rule, including doc comments
+    and section headers, belong to it.
+
+    Returns `None` if the grammar contains lexer modes (rules that follow
+    a mode declaration can't be parsed on their own), or if its structure
+    can't be recognized.
+
+    """
+
+    starts: List[int] = []
+    names: List[str] = []
+    lines: List[int] = []
+
+    pos = 0
+    line = 1
+    end = len(text)
+
+    # Kind of the last significant token, and position and line
+    # right after it.
+    prev = None
+    prev_end = 0
+    prev_line = 1
+
+    in_rule = False
+    in_body = False
+    depth = 0
+
+    while pos < end:
+        match = TOKEN_RE.match(text, pos)
+        kind = match.lastgroup
+        value = match.group()
+        next_pos = match.end()
+
+        if kind == 'action':
+            next_pos = _skip_action(text, pos)
+            if next_pos is None:
+                return None
+            value = '}'
+        elif kind == 'punct' and value in '[/\'':
+            return None  # unterminated literal, comment or argument
+
+        if kind not in ('ws', 'comment'):
+            if in_rule:
+                if kind == 'punct' and value in '()':
+                    depth += 1 if value == '(' else -1
+                elif kind == 'punct' and value == ':' and depth == 0:
+                    in_body = True
+                elif kind == 'punct' and value == ';' and depth == 0 and in_body:
+                    in_rule = in_body = False
+                elif names[-1] is None and kind == 'id' and value not in MODIFIERS:
+                    names[-1] = value
+            elif kind == 'id' and value == 'mode':
+                return None
+            elif kind == 'id' and value not in KEYWORDS and prev in (None, ';', '}'):
+                in_rule = True
+                depth = 0
+                starts.append(prev_end)
+                lines.append(prev_line)
+                names.append(value if value not in MODIFIERS else None)
+
+            prev = value if kind in ('punct', 'action') else kind
+            prev_end = next_pos
+            prev_line = line + text.count('\n', pos, next_pos)
+
+        line += text.count('\n', pos, next_pos)
+        pos = next_pos
+
+    if in_rule or not starts or None in names:
+        return None
+
+    bounds = starts + [end]
+
+    return GrammarSplit(
+        header=text[:starts[0]],
+        chunks=[text[bounds[i]:bounds[i + 1]] for i in range(len(starts))],
+        names=names,
+        lines=lines,
+    )
+
+
+def _skip_action(text: str, pos: int) -> Optional[int]:
+    depth = 0
+    end = len(text)
+    while pos < end:
+        match = ACTION_RE.match(text, pos)
+        kind = match.lastgroup
+        if kind == 'open':
+            depth += 1
+        elif kind == 'close':
+            depth -= 1
+            if depth == 0:
+                return match.end()
+        pos = match.end()
+    return None
@@ -0,0 +1,70 @@
+from dataclasses import dataclass, field
+
+from sphinx_a4doc.model.model import Position, RuleBase
+from sphinx_a4doc.model.visitor import get_children
+
+from typing import *
+
+
+__all__ = [
+    'UnresolvedReference',
+    'link_rule',
+]
+
+
+@dataclass(frozen=True)
+class UnresolvedReference:
+    """
+    Reference to a rule that couldn't be found in the model
+    or in any of its imports.
+
+    """
+
+    name: str
+    """Name of the referenced rule"""
+
+    rule: RuleBase = field(repr=False)
+    """Rule in which the reference is used"""
+
+    position: Position
+    """Position of the rule in which the reference is used"""
+
+    def __str__(self):
+        return f'{self.position}: unresolved reference {self.name!r} in rule {self.rule.name!r}'
+
+
+# Symbols that are always available, but aren't declared in any model.
+BUILTIN_SYMBOLS = {'EOF'}
+
+
+def link_rule(rule: RuleBase, content: RuleBase.RuleContent) -> Tuple[List[UnresolvedReference], List[RuleBase]]:
+    """
+    Resolve every reference in the given content of the given rule
+    and bind it to the rule it refers to. Should be called once
+    the rule's model and all of its imports are loaded.
+
+    Returns list of references that couldn't be resolved, and list
+    of rules that are referred by the content.
+
+    """
+
+    unresolved: List[UnresolvedReference] = []
+    targets: Dict[RuleBase, None] = {}
+
+    stack = [content]
+    while stack:
+        r = stack.pop()
+        if isinstance(r, RuleBase.Reference):
+            r.bind(None)
+            target = r.model.lookup(r.name)
+            if target is not None:
+                r.bind(target)
+                targets.setdefault(target)
+            elif r.name not in BUILTIN_SYMBOLS and not r.name.startswith("'"):
+                # Parser rules may use literals that are not declared anywhere;
+                # ANTLR creates implicit tokens for them.
+                unresolved.append(UnresolvedReference(r.name, rule, rule.position))
+        else:
+            stack.extend(reversed(get_children(r)))
+
+    return unresolved, list(targets)
@@ -0,0 +1,483 @@
+from typing import *
+
+from antlr4 import CommonTokenStream
+from antlr4.atn.PredictionMode import PredictionMode
+from antlr4.error.ErrorListener import ErrorListener
+from antlr4.error.ErrorStrategy import BailErrorStrategy
+from antlr4.error.Errors import ParseCancellationException
+
+from sphinx_a4doc.model.model import Model, Position, LexerRule, ParserRule
+from sphinx_a4doc.model.impl import ModelCacheImpl, ModelImpl
+from sphinx_a4doc.model.builder import MetaLoader, RuleBuilder, LexerRuleBuilder, ParserRuleBuilder, SourceContent
+from sphinx_a4doc.model.builder import make_suffix_rule, make_alt_rule, make_seq_rule, make_section, load_docs
+from sphinx_a4doc.model.builder import get_suffix_literal, get_alt_literal, get_seq_literal
+from sphinx_a4doc.syntax import Lexer, Parser, ParserListener, ParserVisitor, CharStream
+
+import sphinx.util.logging
+
+__all__ = [
+    'parse',
+    'parse_rule_body',
+    'ModelLoader',
+    'MetaLoader',
+    'MetaVisitor',
+    'RuleLoader',
+    'LexerRuleLoader',
+    'ParserRuleLoader',
+]
+
+
+logger = sphinx.util.logging.getLogger(__name__)
+
+
+class LoggingErrorListener(ErrorListener):
+    def __init__(self, path: str, offset: int):
+        self._path = path
+        self._offset = offset
+
+    def syntaxError(self, recognizer, offending_symbol, line, column, msg, e):
+        logger.error(f'{self._path}:{line + self._offset}: WARNING: {msg}')
+
+
+def parse(cache: ModelCacheImpl, text: str, path: str, offset: int, in_memory: bool,
+          imports: List[Model], sll: bool, model: Optional[ModelImpl] = None) -> Optional[Model]:
+    """
+    Parse grammar with ANTLR.
+
+    With `sll`, the parser uses SLL prediction and bails out on the first
+    error. In this case, `None` is returned if parsing fails, and nothing
+    is reported, so that the grammar can be parsed again in LL mode.
+
+    If `model` is given, rules are added to it instead of a new model.
+
+    """
+
+    content = CharStream(text)
+
+    lexer = Lexer(content)
+    lexer.removeErrorListeners()
+    lexer.addErrorListener(LoggingErrorListener(path, offset))
+
+    tokens = CommonTokenStream(lexer)
+
+    parser = Parser(tokens)
+    parser.removeErrorListeners()
+    if sll:
+        parser._interp.predictionMode = PredictionMode.SLL
+        parser._errHandler = BailErrorStrategy()
+    else:
+        parser.addErrorListener(LoggingErrorListener(path, offset))
+
+    if model is None:
+        model = ModelImpl(path, offset, in_memory, False)
+
+    for im in imports or []:
+        model.add_import(im)
+
+    # Model is populated while the file is being parsed,
+    # see `ModelLoader` for details.
+    loader = ModelLoader(parser, model, cache)
+    parser.addParseListener(loader)
+
+    if sll:
+        # Messages from the first stage are only reported if it succeeds.
+        # Imports are loaded after parsing, so only messages about
+        # this file are collected here.
+        collector = sphinx.util.logging.LogCollector()
+        with collector.collect():
+            try:
+                parser.grammarSpec()
+            except ParseCancellationException:
+                failed = True
+            else:
+                failed = False
+        if failed:
+            return None
+        for record in collector.logs:
+            logger.handle(record)
+    else:
+        parser.grammarSpec()
+
+    if parser.getNumberOfSyntaxErrors():
+        return ModelImpl(path, offset, in_memory, True)
+
+    loader.load_imports()
+
+    return model
+
+
+def parse_rule_body(model: ModelImpl, rule_class, text: str, line: int, column: int):
+    """
+    Parse body of a lexer or parser rule and build its content.
+
+    `line` and `column` give position of the body in the grammar file,
+    so that tokens keep their original positions.
+
+    """
+
+    # Rule bodies are always followed by a semicolon. Parser needs it
+    # to predict empty alternatives at the end of the body.
+    lexer = Lexer(CharStream(text + ';'))
+    lexer.line = line
+    lexer.column = column
+    # Lexer tracks rule type to tell char sets from rule arguments,
+    # and we start in the middle of a rule.
+    if rule_class is LexerRule:
+        lexer.setCurrentRuleType(Lexer.TOKEN_REF)
+    else:
+        lexer.setCurrentRuleType(Lexer.RULE_REF)
+    lexer.removeErrorListeners()
+    lexer.addErrorListener(LoggingErrorListener(model.get_path(), model.get_offset()))
+
+    parser = Parser(CommonTokenStream(lexer))
+    parser.removeErrorListeners()
+    parser.addErrorListener(LoggingErrorListener(model.get_path(), model.get_offset()))
+
+    if rule_class is LexerRule:
+        return LexerRuleLoader(model).visit(parser.lexerRuleBlock())
+    else:
+        return ParserRuleLoader(model).visit(parser.ruleBlock())
+
+
+class ModelLoader(ParserListener):
+    """
+    Populates model in a single pass, while the grammar is being parsed.
+
+    This listener is attached to the parser. Each rule is loaded as soon as
+    the parser finishes it, and its subtree is then detached from the parse
+    tree, so the whole tree is never kept in memory.
+
+    Heavy lifting is done by `MetaVisitor`, `LexerRuleLoader`
+    and `ParserRuleLoader` which are applied to the corresponding subtrees.
+
+    """
+
+    def __init__(self, parser: Parser, model: ModelImpl, cache: ModelCacheImpl):
+        self._parser = parser
+        self._meta_loader = MetaVisitor(model, cache, defer_imports=True)
+        self._lexer_rule_loader = LexerRuleLoader(model)
+        self._parser_rule_loader = ParserRuleLoader(model)
+
+    def load_imports(self):
+        """
+        Load grammars imported by this grammar. Should be called
+        once parsing is finished.
+
+        """
+
+        self._meta_loader.load_deferred_imports()
+
+    def _has_errors(self, ctx):
+        # Model is discarded if there are syntax errors, so there is no point
+        # in loading anything once the first error was reported. Contexts
+        # also carry an exception when the parser bails out.
+        return ctx.exception is not None or self._parser.getNumberOfSyntaxErrors() > 0
+
+    def exitGrammarSpec(self, ctx: Parser.GrammarSpecContext):
+        if not self._has_errors(ctx):
+            self._meta_loader.load_grammar_meta(ctx.gtype.getText(), ctx.gname.getText(), ctx.docs)
+
+    def exitPrequelConstruct(self, ctx: Parser.PrequelConstructContext):
+        if not self._has_errors(ctx):
+            self._meta_loader.visit(ctx)
+
+    def exitRuleSpec(self, ctx: Parser.RuleSpecContext):
+        if not self._has_errors(ctx):
+            self._lexer_rule_loader.load_section(ctx)
+            self._parser_rule_loader.load_section(ctx)
+            if ctx.lexerRuleSpec() is not None:
+                self._lexer_rule_loader.visit(ctx.lexerRuleSpec())
+            elif ctx.parserRuleSpec() is not None:
+                self._parser_rule_loader.visit(ctx.parserRuleSpec())
+        ctx.parentCtx.removeLastChild()
+
+    def exitLexerRuleSpec(self, ctx: Parser.LexerRuleSpecContext):
+        # Lexer rules that are declared within modes are not wrapped
+        # into rule specs, so we have to handle them separately.
+        if isinstance(ctx.parentCtx, Parser.ModeSpecContext):
+            if not self._has_errors(ctx):
+                self._lexer_rule_loader.visit(ctx)
+            ctx.parentCtx.removeLastChild()
+
+
+class MetaVisitor(MetaLoader, ParserVisitor):
+    """
+    Loads model meta from a parse tree.
+
+    """
+
+    def visitGrammarSpec(self, ctx):
+        self.load_grammar_meta(ctx.gtype.getText(), ctx.gname.getText(), ctx.docs)
+        return super(MetaVisitor, self).visitGrammarSpec(ctx)
+
+    def visitParserRuleSpec(self, ctx: Parser.ParserRuleSpecContext):
+        return None  # do not recurse into this
+
+    def visitLexerRuleSpec(self, ctx: Parser.LexerRuleSpecContext):
+        return None  # do not recurse into this
+
+    def visitModeSpec(self, ctx: Parser.ModeSpecContext):
+        return None  # do not recurse into this
+
+    def visitOption(self, ctx: Parser.OptionContext):
+        if ctx.name.getText() == 'tokenVocab':
+            self.add_token_vocab(ctx.value.getText(),
+                            Position(self._model.get_path(), ctx.start.line + self._model.get_offset()))
+
+    def visitDelegateGrammar(self, ctx: Parser.DelegateGrammarContext):
+        self.add_import(ctx.value.getText(),
+                        Position(self._model.get_path(), ctx.start.line + self._model.get_offset()))
+
+    def visitTokensSpec(self, ctx: Parser.TokensSpecContext):
+        tokens: List[Parser.IdentifierContext] = ctx.defs.defs
+        for token in tokens:
+            self.add_token(token.getText(),
+                           Position(self._model.get_path(), token.start.line + self._model.get_offset()))
+
+
+class RuleLoader(RuleBuilder, ParserVisitor):
+    def wrap_suffix(self, element, suffix):
+        if suffix is not None:
+            suffix = suffix.getText()
+        return make_suffix_rule(self.rule_class, element, suffix)
+
+    def make_alt_rule(self, content):
+        return make_alt_rule(self.rule_class, [self.visit(alt) for alt in content])
+
+    def make_seq_rule(self, content):
+        return make_seq_rule(self.rule_class, [self.visit(element) for element in content])
+
+    def visitRuleSpec(self, ctx: Parser.RuleSpecContext):
+        self.load_section(ctx)
+        super(RuleLoader, self).visitRuleSpec(ctx)
+
+    def load_section(self, ctx: Parser.RuleSpecContext):
+        self.set_section(make_section(self._model, ctx.headers))
+
+    def make_lazy_content(self, ctx) -> SourceContent:
+        """
+        Make placeholder for a rule body. It doesn't refer the parse tree,
+        see `SourceContent`.
+
+        """
+
+        text = ctx.start.getInputStream().getText(ctx.start.start, ctx.stop.stop)
+        return SourceContent(self._model, self.rule_class, text, ctx.start.line, ctx.start.column)
+
+
+class LexerRuleLoader(LexerRuleBuilder, RuleLoader):
+
+    def visitParserRuleSpec(self, ctx: Parser.ParserRuleSpecContext):
+        return None  # do not recurse into this
+
+    def visitPrequelConstruct(self, ctx: Parser.PrequelConstructContext):
+        return None  # do not recurse into this
+
+    def visitLexerRuleSpec(self, ctx: Parser.LexerRuleSpecContext):
+        content = self.make_lazy_content(ctx.lexerRuleBlock())
+        literal = self.get_literal(ctx.lexerRuleBlock())
+        self.add_rule(ctx.name.text, ctx.start.line, ctx.docs, bool(ctx.frag), content, literal)
+
+    def get_literal(self, ctx) -> Optional[str]:
+        """
+        If the given part of a lexer rule is built into a single literal,
+        return this literal. Rule content is not built.
+
+        """
+
+        return self._get_literal(ctx) or None
+
+    def _get_literal(self, ctx) -> Optional[str]:
+        # See `get_seq_literal` for the meaning of the returned value.
+        if ctx is None:
+            return ''  # empty alternative
+        elif isinstance(ctx, (Parser.LexerRuleBlockContext, Parser.LexerBlockContext)):
+            return self._get_literal(ctx.lexerAltList())
+        elif isinstance(ctx, Parser.LexerAltListContext):
+            return get_alt_literal([self._get_literal(alt) for alt in ctx.alts])
+        elif isinstance(ctx, Parser.LexerAltContext):
+            return self._get_literal(ctx.lexerElements())
+        elif isinstance(ctx, Parser.LexerElementsContext):
+            return get_seq_literal([self._get_literal(element) for element in ctx.elements])
+        elif isinstance(ctx, (Parser.LexerElementLabeledContext,
+                              Parser.LexerElementAtomContext,
+                              Parser.LexerElementBlockContext)):
+            return get_suffix_literal(self._get_literal(ctx.value), ctx.suffix is not None)
+        elif isinstance(ctx, Parser.LexerElementActionContext):
+            return ''
+        elif isinstance(ctx, Parser.LabeledLexerElementContext):
+            return self._get_literal(ctx.lexerAtom() or ctx.lexerBlock())
+        elif isinstance(ctx, Parser.LexerAtomTerminalContext):
+            return self._get_literal(ctx.terminal())
+        elif isinstance(ctx, Parser.TerminalLitContext):
+            return '' if ctx.value.text == "''" else ctx.value.text
+        elif isinstance(ctx, Parser.LexerAtomCharSetContext):
+            return '' if ctx.value.text == '[]' else None
+        else:
+            return None
+
+    def visitLexerAltList(self, ctx: Parser.LexerAltListContext):
+        return self.make_alt_rule(ctx.alts)
+
+    def visitLexerAlt(self, ctx: Parser.LexerAltContext):
+        return self.visit(ctx.lexerElements())
+
+    def visitLexerElements(self, ctx: Parser.LexerElementsContext):
+        return self.make_seq_rule(ctx.elements)
+
+    def visitLexerElementLabeled(self, ctx: Parser.LexerElementLabeledContext):
+        return self.wrap_suffix(self.visit(ctx.value), ctx.suffix)
+
+    def visitLexerElementAtom(self, ctx: Parser.LexerElementAtomContext):
+        return self.wrap_suffix(self.visit(ctx.value), ctx.suffix)
+
+    def visitLexerElementBlock(self, ctx: Parser.LexerElementBlockContext):
+        return self.wrap_suffix(self.visit(ctx.value), ctx.suffix)
+
+    def visitLexerElementAction(self, ctx: Parser.LexerElementActionContext):
+        return LexerRule.EMPTY
+
+    def visitLabeledLexerElement(self, ctx: Parser.LabeledLexerElementContext):
+        return self.visit(ctx.lexerAtom() or ctx.lexerBlock())
+
+    def visitLexerBlock(self, ctx: Parser.LexerBlockContext):
+        return self.visit(ctx.lexerAltList())
+
+    def visitCharacterRange(self, ctx: Parser.CharacterRangeContext):
+        return LexerRule.Range(start=ctx.start.text, end=ctx.end.text)
+
+    def visitTerminalRef(self, ctx: Parser.TerminalRefContext):
+        return LexerRule.Reference(model=self._model, name=ctx.value.text)
+
+    def visitTerminalLit(self, ctx: Parser.TerminalLitContext):
+        content = ctx.value.text
+        if content == "''":
+            return LexerRule.EMPTY
+        else:
+            return LexerRule.Literal(content=ctx.value.text)
+
+    def visitLexerAtomCharSet(self, ctx: Parser.LexerAtomCharSetContext):
+        content = ctx.value.text
+        if content == '[]':
+            return LexerRule.EMPTY
+        else:
+            return LexerRule.CharSet(content=content)
+
+    def visitLexerAtomWildcard(self, ctx: Parser.LexerAtomWildcardContext):
+        return LexerRule.WILDCARD
+
+    def visitLexerAtomDoc(self, ctx: Parser.LexerAtomDocContext):
+        docs = load_docs(self._model, [ctx.value], False)['documentation']
+        return LexerRule.Doc(value='\n'.join(d[1] for d in docs))
+
+    def visitNotElement(self, ctx: Parser.NotElementContext):
+        return LexerRule.Negation(child=self.visit(ctx.value))
+
+    def visitNotBlock(self, ctx: Parser.NotBlockContext):
+        return LexerRule.Negation(child=self.visit(ctx.value))
+
+    def visitBlockSet(self, ctx: Parser.BlockSetContext):
+        return self.make_alt_rule(ctx.elements)
+
+    def visitSetElementRef(self, ctx: Parser.SetElementRefContext):
+        return LexerRule.Reference(model=self._model, name=ctx.value.text)
+
+    def visitSetElementLit(self, ctx: Parser.SetElementLitContext):
+        content = ctx.value.text
+        if content == "''":
+            return LexerRule.EMPTY
+        else:
+            return LexerRule.Literal(content=ctx.value.text)
+
+    def visitSetElementCharSet(self, ctx: Parser.SetElementCharSetContext):
+        content = ctx.value.text
+        if content == '[]':
+            return LexerRule.EMPTY
+        else:
+            return LexerRule.CharSet(content=content)
+
+
+class ParserRuleLoader(ParserRuleBuilder, RuleLoader):
+
+    def visitParserRuleSpec(self, ctx: Parser.ParserRuleSpecContext):
+        content = self.make_lazy_content(ctx.ruleBlock())
+        self.add_rule(ctx.name.text, ctx.start.line, ctx.docs, content)
+
+    def visitPrequelConstruct(self, ctx: Parser.PrequelConstructContext):
+        return None  # do not recurse into this
+
+    def visitLexerRuleSpec(self, ctx: Parser.LexerRuleSpecContext):
+        return None  # do not recurse into this
+
+    def visitModeSpec(self, ctx: Parser.ModeSpecContext):
+        return None  # do not recurse into this
+
+    def visitRuleAltList(self, ctx: Parser.RuleAltListContext):
+        return self.make_alt_rule(ctx.alts)
+
+    def visitAltList(self, ctx: Parser.AltListContext):
+        return self.make_alt_rule(ctx.alts)
+
+    def visitLabeledAlt(self, ctx: Parser.LabeledAltContext):
+        return self.visit(ctx.alternative())
+
+    def visitAlternative(self, ctx: Parser.AlternativeContext):
+        return self.make_seq_rule(ctx.elements)
+
+    def visitParserElementLabeled(self, ctx: Parser.ParserElementLabeledContext):
+        return self.wrap_suffix(self.visit(ctx.value), ctx.suffix)
+
+    def visitParserElementAtom(self, ctx: Parser.ParserElementAtomContext):
+        return self.wrap_suffix(self.visit(ctx.value), ctx.suffix)
+
+    def visitParserElementBlock(self, ctx: Parser.ParserElementBlockContext):
+        return self.wrap_suffix(self.visit(ctx.value), ctx.suffix)
+
+    def visitParserElementAction(self, ctx: Parser.ParserElementActionContext):
+        return ParserRule.EMPTY
+
+    def visitParserInlineDoc(self, ctx: Parser.ParserInlineDocContext):
+        docs = load_docs(self._model, [ctx.value], False)['documentation']
+        return ParserRule.Doc(value='\n'.join(d[1] for d in docs))
+
+    def visitLabeledElement(self, ctx: Parser.LabeledElementContext):
+        return self.visit(ctx.atom() or ctx.block())
+
+    def visitBlock(self, ctx: Parser.BlockContext):
+        return self.visit(ctx.altList())
+
+    def visitAtomWildcard(self, ctx: Parser.AtomWildcardContext):
+        return ParserRule.WILDCARD
+
+    def visitTerminalRef(self, ctx: Parser.TerminalRefContext):
+        return ParserRule.Reference(model=self._model, name=ctx.value.text)
+
+    def visitTerminalLit(self, ctx: Parser.TerminalLitContext):
+        return ParserRule.Reference(model=self._model, name=ctx.value.text)
+
+    def visitRuleref(self, ctx: Parser.RulerefContext):
+        return ParserRule.Reference(model=self._model, name=ctx.value.text)
+
+    def visitNotElement(self, ctx: Parser.NotElementContext):
+        return ParserRule.Negation(child=self.visit(ctx.value))
+
+    def visitNotBlock(self, ctx: Parser.NotBlockContext):
+        return ParserRule.Negation(child=self.visit(ctx.value))
+
+    def visitBlockSet(self, ctx: Parser.BlockSetContext):
+        return self.make_alt_rule(ctx.elements)
+
+    def visitSetElementRef(self, ctx: Parser.SetElementRefContext):
+        return ParserRule.Reference(model=self._model, name=ctx.value.text)
+
+    def visitSetElementLit(self, ctx: Parser.SetElementLitContext):
+        return ParserRule.Reference(model=self._model, name=ctx.value.text)
+
+    def visitSetElementCharSet(self, ctx: Parser.SetElementCharSetContext):
+        # Char sets are not allowed in parser rules,
+        # yet our grammar can match them...
+        return ParserRule.EMPTY
+
+    def visitCharacterRange(self, ctx: Parser.CharacterRangeContext):
+        # This also makes no sense...
+        return ParserRule.EMPTY
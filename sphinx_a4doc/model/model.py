@@ -1,5 +1,8 @@
+import operator
+
 from abc import ABCMeta, abstractmethod
-from dataclasses import dataclass, field, replace
+from dataclasses import dataclass, field, fields, replace
+from weakref import WeakValueDictionary
 from typing import *
 
 try:
@@ -12,9 +15,11 @@ __all__ = [
     'ModelCache',
     'Model',
     'Position',
+    'LazyContent',
     'RuleBase',
     'ParserRule',
     'LexerRule',
+    'intern_content',
 ]
 
 
@@ -46,7 +51,8 @@ class ModelCache(metaclass=ABCMeta):
     def from_file(self, path: Union[str, Tuple[str, int]]) -> 'Model':
         """
         Load model from file. If file is not found, returns an empty model.
-        Models are cached by absolute path.
+        Models are cached by absolute path. Cached models are reloaded
+        if their files, or files of the grammars they import, were modified.
 
         """
 
@@ -59,6 +65,18 @@ class ModelCache(metaclass=ABCMeta):
 
         """
 
+    def get_referrers(self, rule: 'RuleBase', model: 'Model') -> List['RuleBase']:
+        """
+        Get rules that refer the given rule, ordered by their positions.
+        Rules of the given model and of all models it imports, directly
+        or indirectly, are searched.
+
+        Caches that don't track references return an empty list.
+
+        """
+
+        return []
+
 
 class Model(metaclass=ABCMeta):
     @abstractmethod
@@ -184,6 +202,15 @@ class Model(metaclass=ABCMeta):
 
         """
 
+    def link_rule(self, rule: 'RuleBase', content: 'RuleBase.RuleContent'):
+        """
+        Called when content of a rule declared in this model is accessed
+        for the first time, or for the first time since `RuleBase.unlink`
+        was called. Implementations may bind references in the content
+        to their targets.
+
+        """
+
 
 @dataclass(order=True, frozen=True)
 class Position:
@@ -214,6 +241,164 @@ def meta(**kwargs):
     return wrapper
 
 
+def cached_hash(cls: 'RuleBase.RuleContent'):
+    """
+    Decorator that makes generated ``__hash__`` of an AST node dataclass
+    cache its result. It also remembers names of node's fields,
+    see `intern_content`. Attributes listed in node's ``__extra_fields__``
+    are remembered as well: they don't take part in comparison, but
+    they are preserved when a node is interned or pickled.
+
+    Should be applied after ``@dataclass``. Node classes declare
+    their ``__slots__`` explicitly.
+
+    """
+
+    hash_impl = cls.__dict__.get('__hash__')
+    if hash_impl is not None:
+        def __hash__(self):
+            h = getattr(self, '_hash', None)
+            if h is None:
+                h = hash_impl(self)
+                object.__setattr__(self, '_hash', h)
+            return h
+        cls.__hash__ = __hash__
+    _field_names[cls] = tuple(f.name for f in fields(cls)) + cls.__extra_fields__
+    return cls
+
+
+_field_names: Dict[type, Tuple[str, ...]] = {}
+
+# Canonical nodes that don't refer any model. Nodes that contain references
+# are stored in a table that belongs to the referred model, see `_get_table`.
+# Keys of these tables hold the model, so a global table would keep all
+# models alive forever.
+_interned: MutableMapping[tuple, 'RuleBase.RuleContent'] = WeakValueDictionary()
+
+
+def intern_content(content: 'RuleBase.RuleContent') -> 'RuleBase.RuleContent':
+    """
+    Get a canonical instance of the given AST node.
+
+    Nodes are hash-consed: structurally equal subtrees are replaced with
+    a single shared instance, so equal nodes are usually the same object.
+    Children are interned as well. Nodes that contain references are shared
+    only within the model they refer, and are freed together with it.
+
+    """
+
+    # Tree is processed bottom-up with an explicit stack, so that deep trees
+    # don't hit the recursion limit. This also guarantees that hashes
+    # of children are cached by the time their parent is hashed.
+    canonical: Dict[int, RuleBase.RuleContent] = {}
+    stack = [(content, False)]
+    while stack:
+        node, children_done = stack.pop()
+        if id(node) in canonical:
+            continue
+        if children_done:
+            canonical[id(node)] = _intern_node(node, canonical)
+        elif getattr(node, '_hash', None) is not None and _is_canonical(node):
+            # Children of a canonical node are canonical as well.
+            canonical[id(node)] = node
+        else:
+            stack.append((node, True))
+            for name in _field_names[type(node)]:
+                value = getattr(node, name)
+                if isinstance(value, RuleBase.RuleContent):
+                    stack.append((value, False))
+                elif isinstance(value, tuple) and value and isinstance(value[0], RuleBase.RuleContent):
+                    stack.extend((child, False) for child in value)
+
+    return canonical[id(content)]
+
+
+def _is_canonical(content: 'RuleBase.RuleContent') -> bool:
+    key = (type(content), *[getattr(content, name) for name in _field_names[type(content)]])
+    return _get_table(_get_model(content)).get(key) is content
+
+
+def _get_model(content) -> Optional['Model']:
+    # Get model referred by the given node, if any.
+    if isinstance(content, RuleBase.Reference):
+        return content.model
+    return getattr(content, '_model', None)
+
+
+def _get_table(model: Optional['Model']) -> MutableMapping[tuple, 'RuleBase.RuleContent']:
+    if model is None:
+        return _interned
+    table = getattr(model, '_interned_content', None)
+    if table is None:
+        table = WeakValueDictionary()
+        model._interned_content = table
+    return table
+
+
+def _intern_node(content: 'RuleBase.RuleContent', canonical: Dict[int, 'RuleBase.RuleContent']):
+    # Intern a node whose children are already interned.
+    cls = type(content)
+
+    values = []
+    changes = {}
+    model = None
+    for name in _field_names[cls]:
+        value = getattr(content, name)
+        if isinstance(value, RuleBase.RuleContent):
+            new_value = canonical.get(id(value), value)
+            model = model or _get_model(new_value)
+        elif isinstance(value, tuple) and value and isinstance(value[0], RuleBase.RuleContent):
+            new_value = tuple(canonical.get(id(child), child) for child in value)
+            if all(map(operator.is_, value, new_value)):
+                new_value = value
+            model = model or next(filter(None, map(_get_model, new_value)), None)
+        else:
+            new_value = value
+        if new_value is not value:
+            changes[name] = new_value
+        values.append(new_value)
+
+    if changes:
+        content = cls(*values)
+
+    if model is not None and not isinstance(content, RuleBase.Reference):
+        object.__setattr__(content, '_model', model)
+
+    return _get_table(_get_model(content)).setdefault((cls, *values), content)
+
+
+def _make_content(cls, values):
+    # Used to unpickle AST nodes. Their children are unpickled first,
+    # so they're interned already.
+    return _intern_node(cls(*values), {})
+
+
+class LazyContent(metaclass=ABCMeta):
+    """
+    Placeholder for a rule body that is built on first access.
+
+    Model loaders may pass an instance of this class as rule's `content`.
+    Bodies of rules that are never rendered are not built at all.
+
+    """
+
+    @abstractmethod
+    def load(self) -> 'RuleBase.RuleContent':
+        """
+        Build rule body.
+
+        """
+
+    def is_picklable(self) -> bool:
+        """
+        Check whether this placeholder can be pickled as is. If it can't,
+        rule body is built before the rule is pickled.
+
+        """
+
+        return False
+
+
 @dataclass(eq=False, frozen=True)
 class Section:
     """
@@ -277,6 +462,60 @@ class RuleBase:
     section: Optional[Section]
     """Which section this rule belong to?"""
 
+    def __post_init__(self):
+        # Content is linked on first access, see `__getattr__`.
+        if isinstance(self.content, LazyContent):
+            # Content will be built on first access as well.
+            object.__setattr__(self, '_lazy_content', self.content)
+            object.__delattr__(self, 'content')
+        elif self.content is not None:
+            object.__setattr__(self, '_unlinked_content', intern_content(self.content))
+            object.__delattr__(self, 'content')
+
+    def __getattr__(self, name):
+        # Only called if content was not built or not linked yet.
+        if name == 'content':
+            content = self._get_unlinked_content()
+            if content is not None:
+                object.__setattr__(self, 'content', content)
+                object.__delattr__(self, '_unlinked_content')
+                if self.model is not None:
+                    self.model.link_rule(self, content)
+                return content
+        raise AttributeError(f'{type(self).__name__!r} object has no attribute {name!r}')
+
+    def _get_unlinked_content(self) -> Optional['RuleBase.RuleContent']:
+        # Build content, but don't link it.
+        lazy_content = self.__dict__.get('_lazy_content')
+        if lazy_content is not None:
+            object.__setattr__(self, '_unlinked_content', intern_content(lazy_content.load()))
+            object.__delattr__(self, '_lazy_content')
+        return self.__dict__.get('_unlinked_content')
+
+    def unlink(self):
+        """
+        Mark content of this rule as not linked, so that `Model.link_rule`
+        is called again next time it's accessed. Content that wasn't built
+        yet is not built.
+
+        """
+
+        content = self.__dict__.get('content')
+        if content is not None:
+            object.__setattr__(self, '_unlinked_content', content)
+            object.__delattr__(self, 'content')
+
+    def __getstate__(self):
+        lazy_content = self.__dict__.get('_lazy_content')
+        if lazy_content is not None and not lazy_content.is_picklable():
+            # Build content so that it can be pickled.
+            self._get_unlinked_content()
+        state = self.__dict__.copy()
+        if state.get('content') is not None:
+            # Reference bindings are not pickled, see `RuleContent.__reduce__`.
+            state['_unlinked_content'] = state.pop('content')
+        return state
+
     def __str__(self):
         lines = [self.name]
 
@@ -302,8 +541,14 @@ class RuleBase:
         """
         Base class for AST nodes that form lexer and parser rules.
 
+        Nodes are immutable and hash-consed, see `intern_content`.
+
         """
 
+        __slots__ = ('__weakref__', '_hash', '_str', '_importance', '_model')
+
+        __extra_fields__ = ()
+
         @dataclass(frozen=True)
         class Meta:
             precedence: int = 0
@@ -313,12 +558,24 @@ class RuleBase:
         __meta__ = Meta()
 
         def __str__(self):
+            s = getattr(self, '_str', None)
+            if s is not None:
+                return s
             p = self.__meta__.precedence
-            return self.__meta__.formatter(
+            s = self.__meta__.formatter(
                 self,
                 lambda x: f'{x}' if x.__meta__.precedence > p else f'({x})'
             )
+            object.__setattr__(self, '_str', s)
+            return s
+
+        def __reduce__(self):
+            # Nodes are re-interned when unpickled. Reference bindings
+            # are not pickled since targets may live in other models.
+            values = tuple(getattr(self, name) for name in _field_names[type(self)])
+            return _make_content, (type(self), values)
 
+    @cached_hash
     @dataclass(frozen=True)
     @meta(visitor_relay='visit_reference')
     @meta(precedence=4, formatter=lambda x, f: f'{x.name}')
@@ -328,6 +585,8 @@ class RuleBase:
 
         """
 
+        __slots__ = ('model', 'name', '_target')
+
         model: Model
         """Reference to the model in which the rule is used"""
 
@@ -340,8 +599,25 @@ class RuleBase:
             Returns None if reference is invalid.
 
             """
+            target = getattr(self, '_target', None)
+            if target is not None:
+                return target
             return self.model.lookup(self.name)
 
+        def bind(self, target: Optional['RuleBase']):
+            """
+            Remember the rule this reference resolves to, so that
+            `get_reference` doesn't have to look it up again.
+            Passing `None` drops the binding.
+
+            """
+            if target is None:
+                if hasattr(self, '_target'):
+                    object.__delattr__(self, '_target')
+            else:
+                object.__setattr__(self, '_target', target)
+
+    @cached_hash
     @dataclass(frozen=True)
     @meta(visitor_relay='visit_doc')
     @meta(precedence=4, formatter=lambda x, f: f'/** {x.value} */')
@@ -351,8 +627,11 @@ class RuleBase:
 
         """
 
+        __slots__ = ('value',)
+
         value: str
 
+    @cached_hash
     @dataclass(frozen=True)
     @meta(visitor_relay='visit_wildcard')
     @meta(precedence=4, formatter=lambda x, f: f'.')
@@ -362,6 +641,9 @@ class RuleBase:
 
         """
 
+        __slots__ = ()
+
+    @cached_hash
     @dataclass(frozen=True)
     @meta(visitor_relay='visit_negation')
     @meta(precedence=3, formatter=lambda x, f: f'~{f(x.child)}')
@@ -371,9 +653,12 @@ class RuleBase:
 
         """
 
+        __slots__ = ('child',)
+
         child: 'RuleBase.RuleContent'
         """Rules that will be negated"""
 
+    @cached_hash
     @dataclass(frozen=True)
     @meta(visitor_relay='visit_zero_plus')
     @meta(precedence=3, formatter=lambda x, f: f'{f(x.child)}*')
@@ -383,9 +668,12 @@ class RuleBase:
 
         """
 
+        __slots__ = ('child',)
+
         child: 'RuleBase.RuleContent'
         """Rule which will be parsed zero or more times"""
 
+    @cached_hash
     @dataclass(frozen=True)
     @meta(visitor_relay='visit_one_plus')
     @meta(precedence=3, formatter=lambda x, f: f'{f(x.child)}+')
@@ -395,9 +683,12 @@ class RuleBase:
 
         """
 
+        __slots__ = ('child',)
+
         child: 'RuleBase.RuleContent'
         """Rule which will be parsed one or more times"""
 
+    @cached_hash
     @dataclass(frozen=True)
     @meta(visitor_relay='visit_maybe')
     @meta(precedence=3, formatter=lambda x, f: f'{f(x.child)}?')
@@ -407,10 +698,13 @@ class RuleBase:
 
         """
 
+        __slots__ = ('child',)
+
         child: 'RuleBase.RuleContent'
         """Rule which will be parsed"""
 
-    @dataclass(frozen=True)
+    @cached_hash
+    @dataclass(frozen=True, init=False)
     @meta(visitor_relay='visit_sequence')
     @meta(precedence=1, formatter=lambda x, f: ' '.join(map(f, x.children)))
     class Sequence(RuleContent):
@@ -419,14 +713,22 @@ class RuleBase:
 
         """
 
+        __slots__ = ('children', 'linebreaks')
+
+        # `linebreaks` is a bitmask which describes where it is preferable
+        # to wrap sequence. It only affects rendering, so it's not
+        # a dataclass field and doesn't take part in comparison. Slotted
+        # fields can't have defaults, hence the hand-written `__init__`.
+        __extra_fields__ = ('linebreaks',)
+
         children: Tuple['RuleBase.RuleContent', ...]
         """Children rules that will be parsed in order"""
 
-        linebreaks: Optional[Tuple[bool, ...]] = field(
-            default=None, compare=False, repr=False)
-        """Bitmask which describes where it is preferable to wrap sequence"""
+        def __init__(self, children: Tuple['RuleBase.RuleContent', ...],
+                     linebreaks: Optional[Tuple[bool, ...]] = None):
+            object.__setattr__(self, 'children', children)
+            object.__setattr__(self, 'linebreaks', linebreaks)
 
-        def __post_init__(self):
             assert self.linebreaks is None or \
                    len(self.linebreaks) == len(self.children)
 
@@ -436,6 +738,7 @@ class RuleBase:
             else:
                 return tuple([False] * len(self.children))
 
+    @cached_hash
     @dataclass(frozen=True)
     @meta(visitor_relay='visit_alternative')
     @meta(precedence=0, formatter=lambda x, f: ' | '.join(map(f, x.children)))
@@ -445,6 +748,8 @@ class RuleBase:
 
         """
 
+        __slots__ = ('children',)
+
         children: Tuple['RuleBase.RuleContent', ...]
         """Children rules"""
 
@@ -461,6 +766,7 @@ class LexerRule(RuleBase):
     is_fragment: bool
     """Indicates that this rule is a fragment"""
 
+    @cached_hash
     @dataclass(frozen=True)
     class RuleContent(RuleBase.RuleContent):
         """
@@ -468,6 +774,9 @@ class LexerRule(RuleBase):
 
         """
 
+        __slots__ = ()
+
+    @cached_hash
     @dataclass(frozen=True)
     @meta(visitor_relay='visit_lexer_literal')
     @meta(precedence=4, formatter=lambda x, f: f'{x.content}')
@@ -477,9 +786,12 @@ class LexerRule(RuleBase):
 
         """
 
+        __slots__ = ('content',)
+
         content: str
         """Formatted content of the literal, with special symbols escaped"""
 
+    @cached_hash
     @dataclass(frozen=True)
     @meta(visitor_relay='visit_lexer_range')
     @meta(precedence=4, formatter=lambda x, f: f'{x.start}..{x.end}')
@@ -489,12 +801,15 @@ class LexerRule(RuleBase):
 
         """
 
+        __slots__ = ('start', 'end')
+
         start: str
         """Range first symbol"""
 
         end: str
         """Range last symbol"""
 
+    @cached_hash
     @dataclass(frozen=True)
     @meta(visitor_relay='visit_lexer_charset')
     @meta(precedence=4, formatter=lambda x, f: f'{x.content}')
@@ -504,66 +819,94 @@ class LexerRule(RuleBase):
 
         """
 
+        __slots__ = ('content',)
+
         content: str
         """Character set description, bracks included"""
 
+    @cached_hash
     @dataclass(frozen=True)
     @meta(visitor_relay='visit_lexer_reference')
     class Reference(RuleContent, RuleBase.Reference):
+        __slots__ = ()
+
         def get_reference(self) -> Optional['LexerRule']:
             rule = super().get_reference()
             if rule is not None:
                 assert isinstance(rule, LexerRule)
             return rule
 
+    @cached_hash
     @dataclass(frozen=True)
     @meta(visitor_relay='visit_lexer_doc')
     class Doc(RuleContent, RuleBase.Doc):
-        pass
+        __slots__ = ()
 
+    @cached_hash
     @dataclass(frozen=True)
     @meta(visitor_relay='visit_lexer_wildcard')
     class Wildcard(RuleContent, RuleBase.Wildcard):
-        pass
+        __slots__ = ()
 
+    @cached_hash
     @dataclass(frozen=True)
     @meta(visitor_relay='visit_lexer_negation')
     class Negation(RuleContent, RuleBase.Negation):
+        __slots__ = ()
+
         child: 'LexerRule.RuleContent'
 
+    @cached_hash
     @dataclass(frozen=True)
     @meta(visitor_relay='visit_lexer_zero_plus')
     class ZeroPlus(RuleContent, RuleBase.ZeroPlus):
+        __slots__ = ()
+
         child: 'LexerRule.RuleContent'
 
+    @cached_hash
     @dataclass(frozen=True)
     @meta(visitor_relay='visit_lexer_one_plus')
     class OnePlus(RuleContent, RuleBase.OnePlus):
+        __slots__ = ()
+
         child: 'LexerRule.RuleContent'
 
+    @cached_hash
     @dataclass(frozen=True)
     @meta(visitor_relay='visit_lexer_maybe')
     class Maybe(RuleContent, RuleBase.Maybe):
+        __slots__ = ()
+
         child: 'LexerRule.RuleContent'
 
-    @dataclass(frozen=True)
+    @cached_hash
+    @dataclass(frozen=True, init=False)
     @meta(visitor_relay='visit_lexer_sequence')
     class Sequence(RuleContent, RuleBase.Sequence):
+        __slots__ = ()
+
         children: Tuple['LexerRule.RuleContent', ...]
 
+        __init__ = RuleBase.Sequence.__init__
+
+    @cached_hash
     @dataclass(frozen=True)
     @meta(visitor_relay='visit_lexer_alternative')
     class Alternative(RuleContent, RuleBase.Alternative):
+        __slots__ = ()
+
         children: Tuple['LexerRule.RuleContent', ...]
 
-    WILDCARD = Wildcard()
-    EMPTY = Sequence(())
+    WILDCARD = intern_content(Wildcard())
+    EMPTY = intern_content(Sequence(()))
 
 
 @dataclass(eq=False, frozen=True)
 class ParserRule(RuleBase):
     content: Optional['ParserRule.RuleContent']
 
+    @cached_hash
     @dataclass(frozen=True)
     class RuleContent(RuleBase.RuleContent):
         """
@@ -571,50 +914,75 @@ class ParserRule(RuleBase):
 
         """
 
+        __slots__ = ()
+
+    @cached_hash
     @dataclass(frozen=True)
     @meta(visitor_relay='visit_parser_reference')
     class Reference(RuleContent, RuleBase.Reference):
-        pass
+        __slots__ = ()
 
+    @cached_hash
     @dataclass(frozen=True)
     @meta(visitor_relay='visit_parser_doc')
     class Doc(RuleContent, RuleBase.Doc):
-        pass
+        __slots__ = ()
 
+    @cached_hash
     @dataclass(frozen=True)
     @meta(visitor_relay='visit_parser_wildcard')
     class Wildcard(RuleContent, RuleBase.Wildcard):
-        pass
+        __slots__ = ()
 
+    @cached_hash
     @dataclass(frozen=True)
     @meta(visitor_relay='visit_parser_negation')
     class Negation(RuleContent, RuleBase.Negation):
+        __slots__ = ()
+
         child: 'ParserRule.RuleContent'
 
+    @cached_hash
     @dataclass(frozen=True)
     @meta(visitor_relay='visit_parser_zero_plus')
     class ZeroPlus(RuleContent, RuleBase.ZeroPlus):
+        __slots__ = ()
+
         child: 'ParserRule.RuleContent'
 
+    @cached_hash
     @dataclass(frozen=True)
     @meta(visitor_relay='visit_parser_one_plus')
     class OnePlus(RuleContent, RuleBase.OnePlus):
+        __slots__ = ()
+
         child: 'ParserRule.RuleContent'
 
+    @cached_hash
     @dataclass(frozen=True)
     @meta(visitor_relay='visit_parser_maybe')
     class Maybe(RuleContent, RuleBase.Maybe):
+        __slots__ = ()
+
         child: 'ParserRule.RuleContent'
 
-    @dataclass(frozen=True)
+    @cached_hash
+    @dataclass(frozen=True, init=False)
     @meta(visitor_relay='visit_parser_sequence')
     class Sequence(RuleContent, RuleBase.Sequence):
+        __slots__ = ()
+
         children: Tuple['ParserRule.RuleContent', ...]
 
+        __init__ = RuleBase.Sequence.__init__
+
+    @cached_hash
     @dataclass(frozen=True)
     @meta(visitor_relay='visit_parser_alternative')
     class Alternative(RuleContent, RuleBase.Alternative):
+        __slots__ = ()
+
         children: Tuple['ParserRule.RuleContent', ...]
 
-    WILDCARD = Wildcard()
-    EMPTY = Sequence(())
+    WILDCARD = intern_content(Wildcard())
+    EMPTY = intern_content(Sequence(()))
@@ -1,62 +1,110 @@
 from typing import *
 
 import re
+import copy
 
-from sphinx_a4doc.model.model import RuleBase, LexerRule, ParserRule
+from weakref import WeakKeyDictionary
+
+from sphinx_a4doc.model.model import RuleBase, LexerRule, ParserRule, intern_content
+from sphinx_a4doc.model.impl import ModelImpl
+from sphinx_a4doc.model.importance import get_importance
 from sphinx_a4doc.model.visitor import *
 from sphinx_a4doc.settings import LiteralRendering
 
+import sphinx.util.logging
+
+
+logger = sphinx.util.logging.getLogger(__name__)
+
 
 def cc_to_dash(name: str) -> str:
     s1 = re.sub('(.)([A-Z][a-z]+)', r'\1-\2', name)
     return re.sub('([a-z0-9])([A-Z])', r'\1-\2', s1).lower()
 
 
-class ImportanceProvider(CachedRuleContentVisitor[int]):
+class ImportanceProvider:
     """
-    Given a rule content item, calculates its importance.
-
-    """
-
-    def visit_literal(self, r: LexerRule.Literal) -> int:
-        return 1
-
-    def visit_range(self, r: LexerRule.Range) -> int:
-        return 1
+    Given a rule content item, returns its importance.
 
-    def visit_charset(self, r: LexerRule.CharSet) -> int:
-        return 1
+    Importance is calculated once per rule, when the rule's content
+    is linked, and stored on content nodes; see `compute_importance`.
 
-    def visit_reference(self, r: RuleBase.Reference) -> int:
-        rule = r.get_reference()
-        if rule is None:
-            return 1
-        else:
-            return rule.importance
+    """
 
-    def visit_doc(self, r: RuleBase.Doc) -> int:
-        return 0
+    def visit(self, r: RuleBase.RuleContent) -> int:
+        return get_importance(r)
 
-    def visit_wildcard(self, r: RuleBase.Wildcard) -> int:
-        return 1
 
-    def visit_negation(self, r: RuleBase.Negation) -> int:
-        return self.visit(r.child)
+class _InlineCache:
+    """
+    Expansions of inline rules, shared by all renderers of the same class
+    and with the same settings.
 
-    def visit_zero_plus(self, r: RuleBase.ZeroPlus) -> int:
-        return self.visit(r.child)
+    Expansions include names and links of the rules they refer, so data
+    of a rule is dropped whenever its model or anything it imports changes.
 
-    def visit_one_plus(self, r: RuleBase.OnePlus) -> int:
-        return self.visit(r.child)
+    """
 
-    def visit_maybe(self, r: RuleBase.Maybe) -> int:
-        return self.visit(r.child)
+    def __init__(self):
+        self._versions: Dict[RuleBase, int] = WeakKeyDictionary()
+        self._expansions: Dict[RuleBase, Dict[tuple, dict]] = WeakKeyDictionary()
+        self._recursive: Dict[RuleBase, bool] = WeakKeyDictionary()
+
+    def _sync(self, rule: RuleBase):
+        version = rule.model.get_version() if isinstance(rule.model, ModelImpl) else 0
+        if self._versions.get(rule) != version:
+            self._expansions.pop(rule, None)
+            self._recursive.pop(rule, None)
+            self._versions[rule] = version
+
+    def get_expansions(self, rule: RuleBase) -> Dict[tuple, dict]:
+        """
+        Get expansions of the given rule, keyed by renderer settings.
+
+        """
+
+        self._sync(rule)
+        return self._expansions.setdefault(rule, {})
+
+    def is_recursive(self, rule: RuleBase) -> bool:
+        """
+        Check if expanding the given inline rule leads back to it.
+        A warning is issued the first time a recursive rule is found.
+
+        """
+
+        self._sync(rule)
+        if rule not in self._recursive:
+            self._recursive[rule] = _is_inline_recursive(rule)
+            if self._recursive[rule]:
+                logger.error(f'{rule.position}: WARNING: inline rule {rule.name!r} is recursive, '
+                             f'it is rendered as a reference where it refers itself')
+        return self._recursive[rule]
+
+
+def _is_inline_recursive(rule: RuleBase) -> bool:
+    seen = {rule}
+    stack = [rule.content]
+    while stack:
+        r = stack.pop()
+        if isinstance(r, RuleBase.Reference):
+            target = r.get_reference()
+            if target is rule:
+                return True
+            if (
+                target is not None and
+                target not in seen and
+                target.is_doxygen_inline and
+                target.content is not None
+            ):
+                seen.add(target)
+                stack.append(target.content)
+        else:
+            stack.extend(get_children(r))
+    return False
 
-    def visit_sequence(self, r: RuleBase.Sequence) -> int:
-        return max(self.visit(c) for c in r.children)
 
-    def visit_alternative(self, r: RuleBase.Alternative) -> int:
-        return max(self.visit(c) for c in r.children)
+_inline_cache = _InlineCache()
 
 
 class Renderer(CachedRuleContentVisitor[dict]):
@@ -64,13 +112,21 @@ class Renderer(CachedRuleContentVisitor[dict]):
         self,
         literal_rendering: LiteralRendering = LiteralRendering.CONTENTS_UNQUOTED,
         do_cc_to_dash: bool = False,
-        importance_provider: ImportanceProvider = ImportanceProvider()
+        importance_provider: ImportanceProvider = ImportanceProvider(),
+        factor_alternatives: bool = False
     ):
         super().__init__()
 
         self._do_cc_to_dash = do_cc_to_dash
         self.literal_rendering = literal_rendering
         self.importance_provider = importance_provider
+        self.factor_alternatives = factor_alternatives
+
+        self.factored_nodes = 0
+        """Number of repeated elements removed by factoring alternatives"""
+
+        # Recursive inline rules that are being expanded by this renderer.
+        self._expanding: FrozenSet[RuleBase] = frozenset()
 
     @staticmethod
     def _sequence(*items, linebreaks):
@@ -155,8 +211,12 @@ class Renderer(CachedRuleContentVisitor[dict]):
                 return self._terminal(name)
             else:
                 return self._non_terminal(self._cc_to_dash(r.name))
-        elif rule.is_doxygen_inline and rule.content is not None:
-            return self.visit(rule.content)
+        elif (
+            rule.is_doxygen_inline and
+            rule.content is not None and
+            rule not in self._expanding
+        ):
+            return self._inline(rule)
         elif isinstance(rule, LexerRule):
             path = f'{rule.model.get_name()}.{rule.name}'
             if rule.is_literal and self.literal_rendering is not LiteralRendering.NAME:
@@ -175,6 +235,32 @@ class Renderer(CachedRuleContentVisitor[dict]):
         else:
             assert False
 
+    def _inline(self, rule: RuleBase):
+        if _inline_cache.is_recursive(rule):
+            # Expansion of a recursive rule depends on which rules
+            # are being expanded, so it is not memoized. Results of this
+            # renderer are cached per node, so a copy with an empty cache
+            # expands the rule, and renders references to it as links.
+            renderer = copy.copy(self)
+            renderer._cache = type(self._cache)()
+            renderer._depth = 0
+            renderer._expanding = self._expanding | {rule}
+            renderer.factored_nodes = 0
+            result = renderer.visit(rule.content)
+            self.factored_nodes += renderer.factored_nodes
+            return result
+
+        # Expansions of other rules don't depend on where they're used.
+        # Expansion depends on everything that affects rendering
+        # of the rule body, including the renderer class itself
+        # since subclasses may override visitor methods.
+        key = (type(self), self.literal_rendering, self._do_cc_to_dash, self.importance_provider,
+               self.factor_alternatives)
+        expansions = _inline_cache.get_expansions(rule)
+        if key not in expansions:
+            expansions[key] = self.visit(rule.content)
+        return expansions[key]
+
     def visit_doc(self, r: RuleBase.Doc):
         return self._comment(r.value)
 
@@ -213,65 +299,186 @@ class Renderer(CachedRuleContentVisitor[dict]):
                                        list(r.get_linebreaks()))
 
     def visit_alternative(self, r: RuleBase.Alternative):
+        if self.factor_alternatives:
+            factored = self._factor_alternative(r)
+            if factored is not None:
+                return self.visit(factored)
         default = max(enumerate(r.children),
                       key=lambda x: self.importance_provider.visit(x[1]))[0]
         return self._choice(*[self.visit(c) for c in r.children], default=default)
 
+    def _factor_alternative(self, r: RuleBase.Alternative) -> Optional[RuleBase.RuleContent]:
+        # Adjacent alternatives that start with the same elements,
+        # e.g. `a b x | a b y`, are replaced with `a b (x | y)`; then,
+        # adjacent alternatives that end with the same elements are
+        # factored the same way. Order of alternatives is preserved.
+        # Factored choices are factored again when they're visited.
+        # Returns `None` if nothing can be factored.
+        rule_class = LexerRule if isinstance(r, LexerRule.RuleContent) else ParserRule
+
+        alts = []
+        for alt in r.children:
+            if isinstance(alt, RuleBase.Sequence):
+                alts.append(tuple(zip(alt.children, alt.get_linebreaks())))
+            else:
+                alts.append(((alt, False),))
+
+        factored = self._factor_runs(rule_class, alts, from_start=True)
+        factored = self._factor_runs(rule_class, factored, from_start=False)
+
+        if len(factored) == len(alts):
+            return None
+
+        return intern_content(_make_alt(rule_class, factored))
+
+    def _factor_runs(self, rule_class, alts, from_start: bool):
+        result = []
+        i = 0
+        while i < len(alts):
+            # Find run of alternatives that share the first (last) element.
+            j = i + 1
+            if alts[i]:
+                edge = alts[i][0 if from_start else -1][0]
+                while j < len(alts) and alts[j] and alts[j][0 if from_start else -1][0] == edge:
+                    j += 1
+            if j - i == 1:
+                result.append(alts[i])
+                i += 1
+                continue
+
+            run = alts[i:j]
+            if not from_start:
+                run = [alt[::-1] for alt in run]
+
+            common = 1
+            while all(
+                len(alt) > common and alt[common][0] == run[0][common][0]
+                for alt in run
+            ):
+                common += 1
+
+            self.factored_nodes += (len(run) - 1) * common
+
+            shared = run[0][:common]
+            rest = [alt[common:] for alt in run]
+            if not from_start:
+                shared = shared[::-1]
+                rest = [alt[::-1] for alt in rest]
+
+            choice = _make_alt(rule_class, rest)
+            if choice == rule_class.EMPTY:
+                result.append(shared)
+            elif from_start:
+                result.append(shared + ((choice, True),))
+            else:
+                result.append(((choice, True),) + shared)
+            i = j
+        return result
+
     def _optimize_sequence(self, seq: List[RuleBase.RuleContent], lb: List[bool]):
         assert len(seq) == len(lb)
 
         # We are trying to find a sub-sequence of form `x y z (A B x y z)*`
         # and replace it with a single 'OneOrMore(Seq(x, y, z), Seq(A, B))'.
-        for i in range(len(seq) - 1, -1, -1):
+        #
+        # The sequence is scanned backwards. Matching only looks at elements
+        # that precede a `ZeroPlus`, so once a sub-sequence is replaced,
+        # scanning resumes right before it, and every element is visited
+        # once. Result is collected in reverse order.
+        items = []
+        items_lb = []
+
+        i = len(seq) - 1
+        while i >= 0:
             # Our ZeroPlus rule with a sequence inside:
             star = seq[i]
 
-            if not isinstance(star, RuleBase.ZeroPlus):
-                continue
-            if not isinstance(star.child, RuleBase.Sequence):
+            if (
+                not isinstance(star, RuleBase.ZeroPlus) or
+                not isinstance(star.child, RuleBase.Sequence)
+            ):
+                items.append(star)
+                items_lb.append(lb[i])
+                i -= 1
                 continue
 
-            nested_seq = list(star.child.children)
-            nested_seq_lb = list(star.child.get_linebreaks())
-
-            for j in range(len(nested_seq) - 1, -1, -1):
-                k = i + j - len(nested_seq)
-                if k < 0 or seq[k] != nested_seq[j]:
-                    # Index of the seq after which our sub-sequence start
-                    # (e.g. 0 if the first element of our sub-sequence
-                    # is the first element of the sequence):
-                    seq_start = k + 1
-                    # Index of the nested_seq which splits main part
-                    # and the repeat part (e.g. for [A, B, x, y, z]
-                    # the index is 2):
-                    nested_seq_start = j + 1
-                    break
-            else:
-                seq_start = i - len(nested_seq)
-                nested_seq_start = 0
+            nested_seq = star.child.children
+            nested_seq_lb = star.child.get_linebreaks()
+
+            # Index of the nested_seq which splits main part
+            # and the repeat part (e.g. for [A, B, x, y, z]
+            # the index is 2):
+            nested_seq_start = len(nested_seq)
+            # Index of the seq at which our sub-sequence starts
+            # (e.g. 0 if the first element of our sub-sequence
+            # is the first element of the sequence):
+            seq_start = i
+            while (
+                nested_seq_start > 0 and
+                seq_start > 0 and
+                seq[seq_start - 1] == nested_seq[nested_seq_start - 1]
+            ):
+                nested_seq_start -= 1
+                seq_start -= 1
 
             if seq_start == i:
                 # matched no elements from the nested sequence
+                items.append(star)
+                items_lb.append(lb[i])
+                i -= 1
                 continue
 
-            repeat = self._optimize_sequence(nested_seq[:nested_seq_start],
-                                             nested_seq_lb[:nested_seq_start])
-            main = self._optimize_sequence(nested_seq[nested_seq_start:],
-                                           nested_seq_lb[nested_seq_start:])
+            repeat = self._optimize_sequence(list(nested_seq[:nested_seq_start]),
+                                             list(nested_seq_lb[:nested_seq_start]))
+            main = self._optimize_sequence(list(nested_seq[nested_seq_start:]),
+                                           list(nested_seq_lb[nested_seq_start:]))
 
-            item = self._one_or_more(main, repeat)
+            items.append(self._one_or_more(main, repeat))
+            items_lb.append(any(lb[seq_start:i + 1]))
+            i = seq_start - 1
 
-            seq[seq_start:i + 1] = [item]
-            lb[seq_start:i + 1] = [any(lb[seq_start:i + 1])]
-
-            return self._optimize_sequence(seq, lb)
+        items.reverse()
+        items_lb.reverse()
 
         return self._sequence(*[
-            e if isinstance(e, dict) else self.visit(e) for e in seq
-        ], linebreaks=lb)
+            e if isinstance(e, dict) else self.visit(e) for e in items
+        ], linebreaks=items_lb)
 
     def _cc_to_dash(self, name):
         if self._do_cc_to_dash:
             return cc_to_dash(name)
         else:
             return name
+
+
+def _make_seq(rule_class, elements: Tuple[Tuple[RuleBase.RuleContent, bool], ...]):
+    # Elements are pairs of a node and a linebreak flag.
+    if not elements:
+        return rule_class.EMPTY
+    if len(elements) == 1:
+        return elements[0][0]
+    return rule_class.Sequence(
+        tuple(node for node, _ in elements),
+        tuple(lb for _, lb in elements)
+    )
+
+
+def _make_alt(rule_class, alts: List[Tuple[Tuple[RuleBase.RuleContent, bool], ...]]):
+    children = []
+    for alt in alts:
+        child = _make_seq(rule_class, alt)
+        if child not in children:
+            children.append(child)
+
+    has_empty = rule_class.EMPTY in children
+    if has_empty:
+        children.remove(rule_class.EMPTY)
+
+    if not children:
+        return rule_class.EMPTY
+    elif len(children) == 1:
+        alt = children[0]
+    else:
+        alt = rule_class.Alternative(tuple(children))
+
+    return rule_class.Maybe(alt) if has_empty else alt
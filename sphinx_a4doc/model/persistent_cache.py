@@ -0,0 +1,123 @@
+import os
+import pickle
+import hashlib
+import tempfile
+
+from typing import *
+
+import sphinx.util.logging
+
+from sphinx_a4doc.model.model import Model
+
+
+__all__ = [
+    'PersistentModelCache',
+]
+
+
+logger = sphinx.util.logging.getLogger(__name__)
+
+
+CACHE_FORMAT = 5
+"""
+Version of the on-disk format. Bump it whenever model classes change
+in a way that makes old pickles unusable.
+
+"""
+
+
+def get_distribution_version(name: str = 'sphinx-a4doc') -> str:
+    try:
+        import importlib.metadata as metadata
+    except ImportError:  # python < 3.8
+        return ''
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        return ''
+
+
+class PersistentModelCache:
+    """
+    Stores loaded models on disk so that grammar files that did not change
+    since the previous build don't have to be parsed again.
+
+    There is one cache entry per grammar file. Each entry contains a hash
+    of the file contents, paths of the imported grammars, and the pickled
+    model itself. Imported models are not pickled; instead, they're resolved
+    through the model cache every time the entry is loaded. Thus, a change
+    in an imported grammar only invalidates entry for that grammar.
+
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._version = f'{CACHE_FORMAT}:{get_distribution_version()}'
+
+        self.hits = 0
+        """Number of models that were loaded from disk"""
+
+        self.misses = 0
+        """Number of models that had to be parsed"""
+
+    def get_path(self) -> str:
+        return self._path
+
+    def load(self, text: str, path: str, offset: int) -> Optional[Tuple[Model, List[str]]]:
+        """
+        Load model for the given file. Returns the model and a list of paths
+        of the imported grammars, or `None` if there is no valid entry.
+
+        """
+
+        entry_path = self._entry_path(path, offset)
+        key = self._key(text)
+
+        try:
+            with open(entry_path, 'rb') as f:
+                entry_key, imports, model = pickle.load(f)
+        except FileNotFoundError:
+            entry_key, imports, model = None, None, None
+        except Exception as e:
+            logger.debug(f'a4doc: unable to load cache entry for {path}: {e}')
+            entry_key, imports, model = None, None, None
+
+        if entry_key != key:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return model, imports
+
+    def store(self, text: str, path: str, offset: int, model: Model):
+        """
+        Save model for the given file.
+
+        """
+
+        imports = sorted(m.get_path() for m in model.get_imports())
+        entry = (self._key(text), imports, model)
+
+        try:
+            os.makedirs(self._path, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self._path, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, self._entry_path(path, offset))
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except Exception as e:
+            logger.debug(f'a4doc: unable to save cache entry for {path}: {e}')
+
+    def _key(self, text: str) -> str:
+        h = hashlib.sha256()
+        h.update(self._version.encode('utf-8'))
+        h.update(b'\0')
+        h.update(text.encode('utf-8'))
+        return h.hexdigest()
+
+    def _entry_path(self, path: str, offset: int) -> str:
+        name = hashlib.sha256(f'{path}:{offset}'.encode('utf-8')).hexdigest()
+        return os.path.join(self._path, name + '.pickle')
@@ -0,0 +1,141 @@
+import os
+import glob
+import concurrent.futures
+
+from typing import *
+
+import sphinx.util.logging
+
+from sphinx_a4doc.model.model import Model
+from sphinx_a4doc.model.impl import ModelCacheImpl, ModelImpl, LoaderSettings
+from sphinx_a4doc.model.persistent_cache import PersistentModelCache
+
+
+__all__ = [
+    'find_grammars',
+    'preload_models',
+]
+
+
+logger = sphinx.util.logging.getLogger(__name__)
+
+
+def find_grammars(base_path: str, patterns: Union[str, List[str]]) -> List[str]:
+    """
+    Find grammar files that match the given glob patterns. Patterns are
+    relative to the `base_path`. Special value ``'all'`` matches all ``.g4``
+    files in the `base_path` and its subdirectories.
+
+    """
+
+    if patterns == 'all':
+        patterns = ['**/*.g4']
+    elif isinstance(patterns, str):
+        patterns = [patterns]
+
+    paths = set()
+    for pattern in patterns:
+        pattern = os.path.join(base_path, os.path.expanduser(pattern))
+        for path in glob.glob(pattern, recursive=True):
+            if os.path.isfile(path):
+                paths.add(os.path.abspath(os.path.normpath(path)))
+
+    return sorted(paths)
+
+
+def preload_models(cache: ModelCacheImpl, paths: List[str], max_workers: Optional[int] = None) -> int:
+    """
+    Parse the given grammar files in a process pool and add them
+    to the cache. Returns number of grammars that were loaded.
+
+    Each file is parsed exactly once. Workers don't follow imports; instead,
+    they report paths of the imported grammars, and models are linked
+    together once they're merged into the cache. Workers load grammars
+    with the same loader settings as the given cache.
+
+    """
+
+    paths = [path for path in paths if not cache.is_loaded(path)]
+
+    if not paths:
+        return 0
+
+    persistent = cache.get_persistent_cache()
+    persistent_path = persistent.get_path() if persistent is not None else None
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = min(max_workers, len(paths))
+
+    entries = []
+
+    if max_workers <= 1:
+        for path in paths:
+            cache.from_file(path)
+        return len(paths)
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers) as executor:
+        futures = [
+            executor.submit(_load_single_file, path, persistent_path, cache.get_loader_settings())
+            for path in paths
+        ]
+        for future in concurrent.futures.as_completed(futures):
+            entry, logs, hits, misses = future.result()
+            for record in logs:
+                logger.handle(record)
+            if persistent is not None:
+                persistent.hits += hits
+                persistent.misses += misses
+            entries.append(entry)
+
+    cache.merge(entries)
+
+    return len(paths)
+
+
+class _SingleFileCache(ModelCacheImpl):
+    """
+    Cache that only loads one file. Imports are replaced with placeholders;
+    they're dropped when the model is pickled anyway.
+
+    Models are not linked: references would be resolved against
+    the placeholders. The main process links them once they're merged.
+
+    """
+
+    def __init__(self, path: str):
+        super().__init__()
+
+        self._path = path
+
+    def from_file(self, path: Union[str, Tuple[str, int]]) -> Model:
+        if isinstance(path, tuple):
+            path = path[0]
+        path = os.path.abspath(os.path.normpath(path))
+        if path == self._path:
+            return super().from_file(path)
+        else:
+            return ModelImpl(path, 0, False, True)
+
+    def _link_loaded(self):
+        self._unlinked.clear()
+
+
+def _load_single_file(path: str, persistent_path: Optional[str], settings: LoaderSettings):
+    collector = sphinx.util.logging.LogCollector()
+
+    with collector.collect():
+        cache = _SingleFileCache(path)
+        cache.set_loader_settings(settings)
+        if persistent_path is not None:
+            cache.set_persistent_cache(PersistentModelCache(persistent_path))
+        cache.from_file(path)
+        entry = cache.export(path)
+
+    persistent = cache.get_persistent_cache()
+    if persistent is not None:
+        hits, misses = persistent.hits, persistent.misses
+    else:
+        hits, misses = 0, 0
+
+    return entry, collector.logs, hits, misses
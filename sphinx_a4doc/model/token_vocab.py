@@ -0,0 +1,127 @@
+import os
+
+from typing import *
+
+from sphinx_a4doc.model.model import ModelCache, Position, LazyContent, LexerRule
+from sphinx_a4doc.model.impl import ModelImpl
+
+import sphinx.util.logging
+
+__all__ = [
+    'TokenVocabModel',
+    'GrammarContent',
+    'load_token_vocab',
+]
+
+
+logger = sphinx.util.logging.getLogger(__name__)
+
+
+class TokenVocabModel(ModelImpl):
+    """
+    Lightweight model of a lexer grammar, built from the ``.tokens`` file
+    that ANTLR generates for it.
+
+    It only knows names of tokens and contents of literal tokens.
+    Bodies of other tokens are loaded from the lexer grammar on first
+    access, see `GrammarContent`. Documentation and doc commands
+    of the lexer grammar are not available.
+
+    """
+
+    def needs_linking(self) -> bool:
+        # Literal bodies have no references, and other bodies come
+        # from the lexer grammar model which is linked on its own.
+        # Linking would also force loading of that grammar.
+        return False
+
+
+class GrammarContent(LazyContent):
+    """
+    Body of a token that is loaded from the lexer grammar it was declared in.
+
+    """
+
+    def __init__(self, cache: Optional[ModelCache], path: str, name: str):
+        self._cache = cache
+        self._path = path
+        self._name = name
+
+    def load(self):
+        cache = self._cache or ModelCache.instance()
+        logger.debug(f'a4doc: loading {self._path} to build body of {self._name}')
+        rule = cache.from_file(self._path).lookup_local(self._name)
+        if not isinstance(rule, LexerRule) or rule.content is None:
+            return LexerRule.EMPTY
+        return rule.content
+
+    def is_picklable(self) -> bool:
+        return True
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_cache'] = None
+        return state
+
+
+def load_token_vocab(cache: Optional[ModelCache], text: str, path: str) -> TokenVocabModel:
+    """
+    Build model from contents of a ``.tokens`` file.
+
+    Each line of the file is either ``NAME=TYPE`` or ``'literal'=TYPE``.
+    Tokens whose type is shared with a literal are literal tokens.
+
+    """
+
+    base, _ = os.path.splitext(path)
+    grammar_path = base + '.g4'
+
+    model = TokenVocabModel(path, 0, False, False)
+    model.set_name(os.path.basename(base))
+    model.set_type('lexer')
+
+    names: Dict[str, Tuple[str, int]] = {}
+    literals: Dict[str, str] = {}
+
+    for line, entry in enumerate(text.splitlines(), 1):
+        entry = entry.strip()
+        if not entry:
+            continue
+        key, sep, token_type = entry.rpartition('=')
+        if not sep or not key or not token_type.strip().isdigit():
+            logger.error(f'{path}:{line}: WARNING: invalid token definition {entry!r}')
+            continue
+        token_type = token_type.strip()
+        if key.startswith("'"):
+            literals.setdefault(token_type, key)
+        else:
+            names.setdefault(token_type, (key, line))
+
+    for token_type, (name, line) in names.items():
+        literal = literals.get(token_type)
+        if literal is not None:
+            content = LexerRule.Literal(content=literal)
+        else:
+            content = GrammarContent(cache, grammar_path, name)
+
+        rule = LexerRule(
+            name=name,
+            display_name=None,
+            model=model,
+            position=Position(path, line),
+            content=content,
+            is_doxygen_nodoc=True,
+            is_doxygen_inline=False,
+            is_doxygen_no_diagram=False,
+            importance=1,
+            documentation=[],
+            is_fragment=False,
+            is_literal=literal is not None,
+            section=None,
+        )
+
+        model.set_lexer_rule(rule.name, rule)
+        if literal is not None:
+            model.set_lexer_rule(literal, rule)
+
+    return model
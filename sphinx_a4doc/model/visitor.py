@@ -8,20 +8,68 @@ from typing import *
 __all__ = [
     'RuleContentVisitor',
     'CachedRuleContentVisitor',
+    'get_children',
 ]
 
 
 T = TypeVar('T')
 
 
+def get_children(r: RuleBase.RuleContent) -> Tuple[RuleBase.RuleContent, ...]:
+    """
+    Get direct children of the given rule content item.
+
+    """
+
+    if isinstance(r, (RuleBase.Sequence, RuleBase.Alternative)):
+        return r.children
+    elif isinstance(r, (RuleBase.Negation, RuleBase.ZeroPlus, RuleBase.OnePlus, RuleBase.Maybe)):
+        return r.child,
+    else:
+        return ()
+
+
+def _iter_node_classes(cls=RuleBase.RuleContent):
+    for subclass in cls.__subclasses__():
+        yield subclass
+        yield from _iter_node_classes(subclass)
+
+
 class RuleContentVisitor(Generic[T]):
     """
     Generic visitor for rule contents.
 
+    Each visitor class has a dispatch table which maps AST node classes
+    to visitor methods. It is built when the visitor class is created.
+    Lexer- and parser-specific methods that are not overridden
+    are skipped in favour of the common methods they forward to.
+
     """
 
+    _dispatch: Dict[type, Callable[['RuleContentVisitor', RuleBase.RuleContent], T]] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+
+        cls._dispatch = {
+            node_class: cls._resolve(node_class)
+            for node_class in _iter_node_classes()
+        }
+
+    @classmethod
+    def _resolve(cls, node_class: type) -> Callable[['RuleContentVisitor', RuleBase.RuleContent], T]:
+        name = node_class.__meta__.visitor_relay
+        while name in _FORWARDS and getattr(cls, name, None) is RuleContentVisitor.__dict__[name]:
+            name = _FORWARDS[name]
+        return getattr(cls, name, cls.visit_default)
+
     def visit(self, r: RuleBase.RuleContent) -> T:
-        return getattr(self, r.__meta__.visitor_relay, self.visit_default)(r)
+        try:
+            method = self._dispatch[type(r)]
+        except KeyError:
+            # Node class was created after this visitor class.
+            method = self._dispatch[type(r)] = type(self)._resolve(type(r))
+        return method(self, r)
 
     def visit_default(self, r: RuleBase.RuleContent) -> T:
         raise RuntimeError(f'no visitor for {r.__class__.__name__!r}')
@@ -132,11 +180,89 @@ class RuleContentVisitor(Generic[T]):
         return self.visit_default(r)
 
 
+# Methods of `RuleContentVisitor` that only forward to another method.
+_FORWARDS = {
+    'visit_lexer_literal': 'visit_literal',
+    'visit_lexer_range': 'visit_range',
+    'visit_lexer_charset': 'visit_charset',
+    'visit_lexer_reference': 'visit_reference',
+    'visit_lexer_doc': 'visit_doc',
+    'visit_lexer_wildcard': 'visit_wildcard',
+    'visit_lexer_negation': 'visit_negation',
+    'visit_lexer_zero_plus': 'visit_zero_plus',
+    'visit_lexer_one_plus': 'visit_one_plus',
+    'visit_lexer_maybe': 'visit_maybe',
+    'visit_lexer_sequence': 'visit_sequence',
+    'visit_lexer_alternative': 'visit_alternative',
+    'visit_parser_reference': 'visit_reference',
+    'visit_parser_doc': 'visit_doc',
+    'visit_parser_wildcard': 'visit_wildcard',
+    'visit_parser_negation': 'visit_negation',
+    'visit_parser_zero_plus': 'visit_zero_plus',
+    'visit_parser_one_plus': 'visit_one_plus',
+    'visit_parser_maybe': 'visit_maybe',
+    'visit_parser_sequence': 'visit_sequence',
+    'visit_parser_alternative': 'visit_alternative',
+    'visit_literal': 'visit_default',
+    'visit_range': 'visit_default',
+    'visit_charset': 'visit_default',
+    'visit_reference': 'visit_default',
+    'visit_doc': 'visit_default',
+    'visit_wildcard': 'visit_default',
+    'visit_negation': 'visit_default',
+    'visit_zero_plus': 'visit_default',
+    'visit_one_plus': 'visit_default',
+    'visit_maybe': 'visit_default',
+    'visit_sequence': 'visit_default',
+    'visit_alternative': 'visit_default',
+}
+
+
 class CachedRuleContentVisitor(RuleContentVisitor[T]):
-    def __init__(self):
+    """
+    Visitor that caches results for every rule content item.
+
+    Nodes are visited recursively, so visitor methods may skip some
+    of the children. In iterative mode, once recursion gets deeper than
+    `MAX_DEPTH` nodes, descendants of the current node are visited
+    before the node itself, using an explicit stack. Thus, when a visitor
+    method visits node's children, their results are already cached,
+    and recursion depth of the visitor doesn't depend on how deep
+    the rule body is. Note that this only applies to the visitor itself,
+    whatever consumes its results may still be recursive.
+
+    """
+
+    MAX_DEPTH = 100
+    """Recursion depth after which descendants are visited iteratively"""
+
+    def __init__(self, iterative: bool = True):
         self._cache: Dict[RuleBase.RuleContent, T] = WeakKeyDictionary()
+        self._iterative = iterative
+        self._depth = 0
 
     def visit(self, r: RuleBase.RuleContent) -> T:
-        if r not in self._cache:
-            self._cache[r] = super().visit(r)
-        return self._cache[r]
+        cache = self._cache
+        if r in cache:
+            return cache[r]
+        if self._iterative and self._depth >= self.MAX_DEPTH:
+            self._visit_descendants(r)
+        self._depth += 1
+        try:
+            result = cache[r] = super().visit(r)
+        finally:
+            self._depth -= 1
+        return result
+
+    def _visit_descendants(self, root: RuleBase.RuleContent):
+        cache = self._cache
+        stack = [(c, False) for c in get_children(root)]
+        while stack:
+            node, children_visited = stack.pop()
+            if node in cache:
+                continue
+            if children_visited:
+                cache[node] = RuleContentVisitor.visit(self, node)
+            else:
+                stack.append((node, True))
+                stack.extend((c, False) for c in get_children(node) if c not in cache)
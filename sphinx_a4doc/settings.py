@@ -246,12 +246,48 @@ class DiagramSettings:
     
     """
 
+    factor_alternatives: bool = False
+    """
+    Factor out elements that adjacent alternatives start or end with.
+    For example, ``'ALTER' 'TABLE' x | 'ALTER' 'TABLE' y`` is rendered
+    as ``'ALTER' 'TABLE' (x | y)``. This makes diagrams of large rules
+    much smaller. Use ``-v`` to see how many elements were removed
+    from each diagram.
+
+    .. parser-rule-diagram:: 'ALTER' 'TABLE' Id 'ADD' Column
+                           | 'ALTER' 'TABLE' Id 'DROP' Column
+                           | 'ALTER' 'TABLE' Id 'RENAME' 'TO' Id
+       :factor-alternatives:
+
+    .. versionadded:: 1.3.0
+
+    """
+
     alt: Optional[str] = None
     """
     If rendering engine does not support output of contents, specified
     string is used alternatively.
     """
 
+    choice_grid_threshold: Optional[int] = None
+    """
+    Choices with at least this many alternatives are packed into several
+    columns instead of a single tall one. Columns are added while
+    the diagram fits into ``max_width``. This keeps diagrams of long
+    keyword lists compact, and makes them much lighter to render.
+
+    Only choices between single-line alternatives are packed this way,
+    and the default alternative is not placed on the main line.
+
+    .. railroad-diagram::
+       :choice-grid-threshold: 6
+
+       - choice: [ADD, ALTER, ANALYZE, AND, AS, ASC, BEGIN, BETWEEN, BY]
+
+    .. versionadded:: 1.3.0
+
+    """
+
 
 @dataclass(frozen=True)
 class GrammarSettings:
@@ -459,6 +495,16 @@ class AutogrammarSettings(GrammarSettings):
     
     """
 
+    referenced_by: bool = field(default=False, metadata=dict(rebuild=True))
+    """
+    If enabled, render a list of rules that refer each documented rule
+    under its description. Rules from the documented grammar and from
+    grammars it imports are listed.
+
+    .. versionadded:: 1.3.0
+
+    """
+
 
 @dataclass(frozen=True)
 class AutoruleSettings(GrammarSettings):
@@ -469,6 +515,17 @@ class AutoruleSettings(GrammarSettings):
 
     """
 
+    referenced_by: bool = field(default=False, metadata=dict(rebuild=True))
+    """
+    If enabled, render a list of rules that refer the documented rule
+    under its description. Refer to the corresponding
+    :rst:opt:`a4:autogrammar <a4:autogrammar:referenced-by>`'s option
+    for more info.
+
+    .. versionadded:: 1.3.0
+
+    """
+
 
 @dataclass(frozen=True)
 class GlobalSettings:
@@ -484,6 +541,152 @@ class GlobalSettings:
 
     """
 
+    cache: bool = True
+    """
+    If enabled, parsed grammar files are stored on disk so that grammars
+    that did not change since the previous build are not parsed again.
+
+    .. versionadded:: 1.3.0
+
+    """
+
+    cache_dir: Optional[str] = None
+    """
+    Directory for storing parsed grammar files. By default, they're stored
+    in the doctree directory, next to other build caches.
+
+    .. versionadded:: 1.3.0
+
+    """
+
+    cache_check_hashes: bool = False
+    """
+    Grammars that were modified since they've been loaded are reloaded
+    automatically. By default, a grammar is considered modified if its file
+    size or modification time changed. If this setting is enabled,
+    contents of such grammars are also compared, so that grammars that were
+    touched but not changed are not reloaded.
+
+    This setting is mostly useful for long-running processes such as
+    ``sphinx-autobuild``.
+
+    .. versionadded:: 1.3.0
+
+    """
+
+    cache_max_models: Optional[int] = None
+    """
+    Maximum number of parsed grammars that are kept in memory. Once it's
+    exceeded, grammars that were used least recently are dropped, unless
+    they're imported by other grammars that are kept in memory. Dropped
+    grammars are loaded again when they're needed (from the on-disk cache,
+    if :py:attr:`cache` is enabled).
+
+    By default, all grammars are kept in memory.
+
+    .. versionadded:: 1.3.0
+
+    """
+
+    cache_max_memory: Optional[int] = None
+    """
+    Like :py:attr:`cache_max_models`, but limits approximate amount of memory
+    used by parsed grammars, in megabytes. Run sphinx with ``-v`` to see
+    how much memory each grammar takes.
+
+    .. versionadded:: 1.3.0
+
+    """
+
+    preload: Union[str, List[str], None] = None
+    """
+    Grammars that should be parsed before sphinx starts reading documents.
+    Can be either ``'all'`` to load every ``.g4`` file found in
+    the ``a4_base_path``, or a list of glob patterns relative
+    to the ``a4_base_path``.
+
+    Grammars are parsed in parallel, using as many processes as passed
+    to ``sphinx-build -j`` or, if parallel build is not enabled,
+    as many processes as there are CPUs.
+
+    .. versionadded:: 1.3.0
+
+    """
+
+    warm_up: bool = True
+    """
+    When documents are read in parallel, load all grammars used by autodoc
+    directives before sphinx forks its worker processes. This way, each
+    grammar is parsed only once instead of being parsed in every worker
+    that needs it.
+
+    .. versionadded:: 1.3.0
+
+    """
+
+    two_stage_parsing: bool = True
+    """
+    Parse grammars with fast SLL prediction first, and only fall back
+    to full LL prediction if that fails. Use ``-v`` to see how much time
+    each stage takes.
+
+    .. versionadded:: 1.3.0
+
+    """
+
+    fast_loader: bool = False
+    """
+    Load grammars with a hand-written parser instead of the ANTLR one.
+    It only supports syntax that's commonly used in grammars; files that
+    use anything else (e.g. rule arguments, return values or exception
+    handlers) are loaded by ANTLR as before.
+
+    .. versionadded:: 1.3.0
+
+    """
+
+    warm_up_parser: bool = True
+    """
+    Prime prediction caches of the ANTLR parser by parsing a small bundled
+    grammar before the first real grammar is parsed, so that it isn't parsed
+    with cold caches. If :py:attr:`cache` is enabled, warmed-up caches
+    are also saved next to the model cache and restored on the next run.
+
+    .. versionadded:: 1.3.0
+
+    """
+
+    token_vocab_files: bool = False
+    """
+    If a parser grammar imports tokens with the ``tokenVocab`` option,
+    and there is a ``.tokens`` file generated by ANTLR next to the lexer
+    grammar, load token names from that file instead of parsing the lexer
+    grammar. The lexer grammar is only parsed if a body of one of its
+    tokens is needed.
+
+    Note that doc commands from the lexer grammar, such as
+    ``//@ doc:name`` or ``//@ doc:inline``, are not applied to tokens
+    that are referenced from the parser grammar in this case.
+    Make sure the ``.tokens`` file is regenerated when the lexer changes.
+
+    .. versionadded:: 1.3.0
+
+    """
+
+    incremental_reparse: bool = False
+    """
+    When a grammar is modified while sphinx is running, only parse rules
+    whose text changed instead of the whole file. The whole file is still
+    parsed if anything outside of rules changed, e.g. grammar options,
+    imports or the ``tokens`` section, or if the grammar uses lexer modes.
+
+    This setting is mostly useful for live-preview tools such as
+    ``sphinx-autobuild`` working on very large grammars.
+
+    .. versionadded:: 1.3.0
+
+    """
+
 
 diagram_namespace = Namespace('a4_diagram', DiagramSettings)
 grammar_namespace = Namespace('a4_grammar', GrammarSettings)
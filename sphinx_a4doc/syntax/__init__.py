@@ -2,10 +2,12 @@ from .gen.syntax.ANTLRv4Lexer import ANTLRv4Lexer as Lexer
 from .gen.syntax.ANTLRv4Parser import ANTLRv4Parser as Parser
 from .gen.syntax.ANTLRv4ParserListener import ANTLRv4ParserListener as ParserListener
 from .gen.syntax.ANTLRv4ParserVisitor import ANTLRv4ParserVisitor as ParserVisitor
+from .char_stream import CharStream
 
 __all__ = [
     'Lexer',
     'Parser',
     'ParserListener',
     'ParserVisitor',
+    'CharStream',
 ]
@@ -0,0 +1,54 @@
+import sys
+
+from array import array
+
+from antlr4 import InputStream
+
+
+class CharStream(InputStream):
+    """
+    Input stream that stores code points in a compact buffer.
+
+    `antlr4.InputStream` converts text into a list of code points, which
+    takes eight bytes per character on top of the text itself. This stream
+    keeps the original string for `getText`, and serves `LA` from a ``bytes``
+    object with one byte per character if text is ASCII-only, or from
+    an ``array`` of UTF-32 code units otherwise. It is a drop-in replacement
+    for `InputStream`: the lexer only accesses `data` by index.
+
+    """
+
+    def __init__(self, data: str):
+        # Base constructor would build the list of code points.
+        self.name = '<empty>'
+        self.strdata = data
+        self._loadString()
+
+    def _loadString(self):
+        self._index = 0
+        self.data = _encode(self.strdata)
+        self._size = len(self.data)
+
+    def getText(self, start: int, stop: int) -> str:
+        # Some runtime versions build text from `data` char by char.
+        if stop >= self._size:
+            stop = self._size - 1
+        if start >= self._size:
+            return ''
+        return self.strdata[start:stop + 1]
+
+
+def _encode(text: str):
+    if text.isascii():
+        return text.encode('ascii')
+
+    data = array('I' if array('I').itemsize == 4 else 'L')
+    encoding = 'utf-32-le' if sys.byteorder == 'little' else 'utf-32-be'
+    # Encode in chunks, so that the whole text is never held
+    # in an intermediate buffer.
+    for i in range(0, len(text), _CHUNK_SIZE):
+        data.frombytes(text[i:i + _CHUNK_SIZE].encode(encoding, 'surrogatepass'))
+    return data
+
+
+_CHUNK_SIZE = 1 << 16
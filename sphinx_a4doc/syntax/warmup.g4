@@ -0,0 +1,160 @@
+/**
+ * A small grammar that uses most of the syntax found in real-world grammars.
+ *
+ * It is parsed once at startup to prime ANTLR's prediction caches,
+ * see `sphinx_a4doc.model.dfa_cache`.
+ */
+grammar Warmup;
+
+options {
+    tokenVocab = WarmupLexer;
+    language = Python3;
+    superClass = a.b.Base;
+}
+
+import Common, Other;
+
+tokens { INDENT, DEDENT, }
+
+channels { COMMENTS }
+
+@header {
+import sys
+def f(x): return {'a': "}", 'b': '{'}[x]
+}
+
+@parser::members {
+    /* { */ // }
+}
+
+/// **Statements**
+///
+/// Section description.
+
+/**
+ * Entry point.
+ */
+//@ doc:name Program
+//@ doc:importance 2
+program
+    : (statement | NEWLINE)* EOF
+    ;
+
+/** A single statement. */
+//@ doc:inline
+statement
+    : simple=simpleStatement NEWLINE # Simple
+    | compoundStatement # Compound
+    | <assoc=right> expr '=' expr # Assign
+    | // empty
+    ;
+
+simpleStatement
+    : 'pass' | 'break' | 'continue' | 'return' expr?
+    | 'import' NAME ('.' NAME)* ('as' NAME)?
+    | items+=expr (',' items+=expr)* ','?
+    ;
+
+compoundStatement
+    : 'if' expr ':' block ('elif' expr ':' block)* ('else' ':' block)?
+    | 'while' expr ':' block
+    | 'for' NAME 'in' expr ':' block
+    | {self.isDef()}? 'def' NAME '(' parameters? ')' ('->' expr)? ':' block
+    ;
+
+//@ doc:unimportant
+block
+    : NEWLINE INDENT statement+ DEDENT
+    | simpleStatement
+    ;
+
+parameters
+    : NAME ( ',' NAME )*
+      /** Trailing comma is allowed. */
+      ','?
+    ;
+
+/// **Expressions**
+
+expr
+    : <assoc=right> expr '**' expr
+    | ('+' | '-' | '~') expr
+    | expr ('*' | '/' | '%' | '//') expr
+    | expr op=('+' | '-') expr
+    | expr ('<' | '>' | '==' | '>=' | '<=' | '!=') expr
+    | 'not' expr
+    | expr ('and' | 'or') expr
+    | expr '(' arguments? ')'
+    | expr '[' expr ']'
+    | expr '.' NAME
+    | atom
+    ;
+
+arguments
+    : argument (',' argument)*?
+    ;
+
+argument
+    : (NAME '=')? expr
+    | '*' expr
+    | '**' expr
+    ;
+
+atom returns [int value]
+locals [int count = 0]
+@init { $count = 1; }
+    : NAME {$value = 1;}
+    | NUMBER
+    | STRING+
+    | '(' expr ')'
+    | '[' (expr (',' expr)*)? ']'
+    | ~(NEWLINE | INDENT | DEDENT)
+    | .
+    ;
+    catch [RecognitionException e] { raise e }
+    finally { pass }
+
+/// **Tokens**
+
+NAME
+    : ID_START ID_CONTINUE*
+    ;
+
+NUMBER
+    : [0-9]+ ('.' [0-9]*)? ([eE] [+-]? [0-9]+)?
+    | '0' [xX] [0-9a-fA-F]+
+    ;
+
+/** String literal */
+STRING
+    : '\'' ( ~['\\\r\n] | '\\' . )* '\''
+    | '"' ( ~["\\\r\n] | ESCAPE )*? '"'
+    ;
+
+NEWLINE
+    : ( '\r'? '\n' | '\r' ) SPACES? { self.onNewLine() }
+    ;
+
+SKIP_
+    : ( SPACES | COMMENT | LINE_JOINING ) -> skip
+    ;
+
+BLOCK_COMMENT
+    : '/*' .*? '*/' -> channel(HIDDEN)
+    ;
+
+OPEN_BRACE : '{' -> pushMode(INSIDE) ;
+
+fragment ID_START : [a-zA-Z_] | 'À'..'ÿ' ;
+fragment ID_CONTINUE : ID_START | [0-9] ;
+fragment ESCAPE : '\\' ( [btnfr"'\\] | 'u' HEX HEX HEX HEX ) ;
+fragment HEX : [0-9a-fA-F] ;
+fragment SPACES : [ \t]+ ;
+fragment COMMENT : '#' ~[\r\n\f]* ;
+fragment LINE_JOINING : '\\' SPACES? ( '\r'? '\n' | '\r' | '\f' ) ;
+
+mode INSIDE;
+
+CLOSE_BRACE : '}' -> popMode ;
+INSIDE_TEXT : ~[{}]+ -> type(STRING) ;
+INSIDE_OPEN : '{' -> more, pushMode(INSIDE) ;
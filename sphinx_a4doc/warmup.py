@@ -0,0 +1,124 @@
+import os
+import re
+
+import sphinx.util.logging
+import sphinx.util.parallel
+
+from sphinx_a4doc.autodoc_directive import resolve_grammar_path
+from sphinx_a4doc.model.model import ModelCache, Model
+from sphinx_a4doc.model.impl import ModelCacheImpl
+from sphinx_a4doc.model.preload import preload_models
+from sphinx_a4doc.settings import global_namespace
+
+from typing import *
+
+
+__all__ = [
+    'find_referenced_grammars',
+    'warm_up_models',
+]
+
+
+logger = sphinx.util.logging.getLogger(__name__)
+
+
+AUTOGRAMMAR_RE = re.compile(r'''
+    ^\s*\.\.\s+(?:a4:)?autogrammar::\s*(?P<path>\S+)
+    ''', re.UNICODE | re.VERBOSE | re.MULTILINE)
+
+AUTORULE_RE = re.compile(r'''
+    ^\s*\.\.\s+(?:a4:)?autorule::\s*(?P<path>\S+)\s+\S+\s*$
+    ''', re.UNICODE | re.VERBOSE | re.MULTILINE)
+
+REACHABLE_RE = re.compile(r'''
+    ^\s*:only-reachable-from:\s*(?P<path>[^\s.]+)\.\S+
+    ''', re.UNICODE | re.VERBOSE | re.MULTILINE)
+
+
+def find_referenced_grammars(env, docname: str) -> Set[str]:
+    """
+    Scan document source and find paths of all grammars used by autodoc
+    directives in this document.
+
+    This is a heuristic: it does not parse the document, so grammars from
+    included files or from directives generated by other extensions
+    are not found.
+
+    """
+
+    path = env.doc2path(docname)
+
+    try:
+        with open(path, 'r', encoding=env.config.source_encoding, errors='replace') as f:
+            source = f.read()
+    except OSError:
+        return set()
+
+    base_path = global_namespace.load_global_settings(env).base_path
+
+    names = set()
+    for regex in [AUTOGRAMMAR_RE, AUTORULE_RE, REACHABLE_RE]:
+        for match in regex.finditer(source):
+            names.add(match['path'])
+
+    return {
+        os.path.abspath(os.path.normpath(resolve_grammar_path(base_path, name)))
+        for name in names
+    }
+
+
+def warm_up_models(app, docnames: List[str]):
+    """
+    Load every grammar that's used by the given documents.
+
+    When sphinx reads documents in parallel, it forks worker processes.
+    Models that are loaded before the fork are inherited by workers,
+    so each grammar is parsed once instead of once per worker.
+
+    """
+
+    cache = ModelCache.instance()
+    if not isinstance(cache, ModelCacheImpl):
+        return
+
+    chunks = sphinx.util.parallel.make_chunks(docnames, app.parallel)
+
+    chunk_grammars: List[Set[str]] = []
+    for chunk in chunks:
+        grammars = set()
+        for docname in chunk:
+            grammars.update(find_referenced_grammars(app.env, docname))
+        chunk_grammars.append(grammars)
+
+    all_grammars = set().union(*chunk_grammars)
+    paths = sorted(path for path in all_grammars if os.path.exists(path))
+    if not paths:
+        return
+
+    preload_models(cache, paths, app.parallel)
+
+    # Without warm-up, each worker would load every grammar that's used
+    # by documents in its chunk, along with all imported grammars.
+    loads_with_warmup = set()
+    loads_without_warmup = 0
+    for grammars in chunk_grammars:
+        closure = _import_closure(cache.from_file(p) for p in grammars if p in paths)
+        loads_with_warmup.update(closure)
+        loads_without_warmup += len(closure)
+
+    saved = loads_without_warmup - len(loads_with_warmup)
+
+    logger.info(f'a4doc: warmed up {len(loads_with_warmup)} grammar(s) '
+                f'before forking, saved {saved} grammar load(s) in workers')
+
+
+def _import_closure(models: Iterable[Model]) -> Set[Model]:
+    seen = set()
+    models = list(models)
+    while models:
+        model = models.pop()
+        if model in seen:
+            continue
+        seen.add(model)
+        models.extend(model.get_imports())
+    return seen
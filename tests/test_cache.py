@@ -0,0 +1,95 @@
+import gc
+import os
+import weakref
+
+import pytest
+
+pytest.importorskip('sphinx')
+
+import sphinx_a4doc.model.impl
+from sphinx_a4doc.model.impl import ModelCacheImpl
+
+
+@pytest.fixture
+def paths(tmp_path):
+    paths = []
+    for name in 'ABC':
+        path = tmp_path / f'{name}.g4'
+        path.write_text(f'grammar {name};\nroot : x x ;\nx : \'x\' ;\n')
+        paths.append(str(path))
+    return paths
+
+
+@pytest.fixture
+def cache():
+    cache = ModelCacheImpl()
+    cache.set_fast_loader(True)
+    return cache
+
+
+def test_stats_are_cached(cache, paths, monkeypatch):
+    calls = []
+    get_model_stats = sphinx_a4doc.model.impl._get_model_stats
+
+    def counting_get_model_stats(model):
+        calls.append(model)
+        return get_model_stats(model)
+
+    monkeypatch.setattr(sphinx_a4doc.model.impl, '_get_model_stats', counting_get_model_stats)
+
+    cache.set_limits(max_size=10 ** 9)
+    for _ in range(3):
+        for path in paths:
+            cache.from_file(path)
+    assert len(calls) == len(paths)
+
+    stats = cache.get_model_stats()
+    assert len(calls) == len(paths)
+    assert cache._total_size == sum(s.size for s in stats)
+
+    cache.invalidate(paths[0])
+    assert cache._total_size == sum(s.size for s in cache.get_model_stats())
+
+
+def test_evicted_model_is_collected(cache, paths):
+    cache.set_limits(max_models=2)
+    ref = weakref.ref(cache.from_file(paths[0]))
+    cache.from_file(paths[1])
+    cache.from_file(paths[2])
+
+    assert not cache.is_loaded(paths[0])
+    gc.collect()
+    assert ref() is None
+
+
+def test_loading_other_grammars_keeps_symbol_index(cache, paths):
+    model = cache.from_file(paths[0])
+    assert model.lookup('x') is not None
+    symbols = model._symbols
+    graph = model.get_dependency_graph()
+
+    cache.from_file(paths[1])
+    cache.from_text('grammar T;\nt : \'t\' ;\n')
+
+    assert model.lookup('x') is not None
+    assert model._symbols is symbols
+    assert model.get_dependency_graph() is graph
+
+
+def test_update_invalidates_importers(cache, tmp_path):
+    cache.set_incremental(True)
+    lib = tmp_path / 'Lib.g4'
+    lib.write_text('grammar Lib;\nx : \'x\' ;\nz : \'z\' ;\n')
+    main = tmp_path / 'Main.g4'
+    main.write_text('grammar Main;\nimport Lib;\nroot : x y ;\n')
+
+    model = cache.from_file(str(main))
+    assert model.lookup('y') is None
+    version = model.get_version()
+
+    lib.write_text('grammar Lib;\nx : \'x\' ;\ny : \'y\' ;\nz : \'z\' ;\n')
+    os.utime(lib, ns=(0, 0))
+
+    assert cache.from_file(str(main)) is model
+    assert model.get_version() != version
+    assert model.lookup('y') is not None
@@ -0,0 +1,34 @@
+import pytest
+
+pytest.importorskip('antlr4')
+
+from antlr4 import CommonTokenStream, InputStream
+
+from sphinx_a4doc.syntax import Lexer, CharStream
+
+
+TEXTS = [
+    '',
+    "grammar X;\nr : 'a' [b-c]+ ;\n",
+    "grammar X;\n/** Ünïcödé 😀 */\nr : 'é' | '\U0001F600' ;\n",
+    'x' * 100000 + 'é',
+]
+
+
+@pytest.mark.parametrize('text', TEXTS, ids=range(len(TEXTS)))
+def test_get_text(text):
+    expected = InputStream(text)
+    actual = CharStream(text)
+    assert actual.size == expected.size
+    for start, stop in [(0, 0), (0, 5), (3, 2), (5, len(text) + 10), (len(text), len(text) + 1)]:
+        assert actual.getText(start, stop) == expected.getText(start, stop)
+
+
+@pytest.mark.parametrize('text', TEXTS, ids=range(len(TEXTS)))
+def test_tokens(text):
+    def lex(stream):
+        tokens = CommonTokenStream(Lexer(stream))
+        tokens.fill()
+        return [(t.type, t.text, t.line, t.column) for t in tokens.tokens]
+
+    assert lex(CharStream(text)) == lex(InputStream(text))
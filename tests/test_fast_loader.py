@@ -0,0 +1,162 @@
+import os
+
+import pytest
+
+pytest.importorskip('sphinx')
+pytest.importorskip('antlr4')
+
+from sphinx_a4doc.model.model import RuleBase
+from sphinx_a4doc.model.impl import ModelCacheImpl, ModelImpl
+from sphinx_a4doc.model.fast_loader import FastLoader, UnsupportedSyntax
+from sphinx_a4doc.model.loader import parse
+from sphinx_a4doc.model.visitor import get_children
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CORPUS = [
+    os.path.join(ROOT, 'docs', 'examples', 'Json.g4'),
+    os.path.join(ROOT, 'sphinx_a4doc', 'syntax', 'LexBasic.g4'),
+    os.path.join(ROOT, 'sphinx_a4doc', 'syntax', 'ANTLRv4Lexer.g4'),
+    os.path.join(ROOT, 'sphinx_a4doc', 'syntax', 'ANTLRv4Parser.g4'),
+]
+
+SNIPPETS = [
+    '''
+    grammar Simple;
+    root : A B? C* D+ | (A | B) ~C . EOF ;
+    A : 'a' ;
+    B : 'b' | 'B' ;
+    C : [a-z]+ ;
+    D : 'x' .. 'z' ;
+    ''',
+    '''
+    /** Grammar docs. */
+    grammar Docs;
+
+    /** Rule docs.
+     *
+     * Second paragraph.
+     */
+    //@ doc:name Human readable
+    //@ doc:importance 3
+    root : /** inline */ A ;
+
+    /// Section header.
+
+    //@ doc:inline
+    //@ doc:nodoc
+    //@ doc:no-diagram
+    other : root | ;
+
+    //@ doc:unimportant
+    A : 'a' ;
+    ''',
+    '''
+    lexer grammar Modes;
+    tokens { T1, T2 }
+    channels { COMMENTS }
+    A : 'a' -> skip ;
+    B : 'b' {action();} 'c' ;
+    fragment F : ~[abc] | ~'d' ;
+    mode INNER;
+    C : 'c' -> popMode ;
+    D : '' 'd' ;
+    ''',
+    '''
+    parser grammar Labels;
+    options { tokenVocab = Lexer; }
+    root : x=A y+=B (z=C | {pred}? D)* # Label
+         | ('a' 'b')+ ~('c' | 'd')    # Other
+         ;
+    ''',
+]
+
+
+def _load_antlr(text, path, in_memory):
+    return parse(ModelCacheImpl(), text, path, 0, in_memory, [], sll=False)
+
+
+def _load_fast(text, path, in_memory):
+    model = ModelImpl(path, 0, in_memory, False)
+    FastLoader(model, ModelCacheImpl()).load(text)
+    return model
+
+
+def _dump_content(content):
+    if content is None:
+        return None
+    name = type(content).__qualname__
+    if isinstance(content, RuleBase.Reference):
+        return name, content.name
+    if isinstance(content, RuleBase.Sequence):
+        return name, content.get_linebreaks(), tuple(map(_dump_content, content.children))
+    children = get_children(content)
+    if children:
+        return name, tuple(map(_dump_content, children))
+    return name, str(content)
+
+
+def _dump_rule(rule):
+    return (
+        type(rule).__qualname__,
+        rule.name,
+        rule.display_name,
+        rule.position.line,
+        rule.is_doxygen_nodoc,
+        rule.is_doxygen_inline,
+        rule.is_doxygen_no_diagram,
+        rule.importance,
+        rule.documentation,
+        rule.section.docs if rule.section is not None else None,
+        getattr(rule, 'is_literal', None),
+        getattr(rule, 'is_fragment', None),
+        _dump_content(rule.content),
+    )
+
+
+def _dump_model(model):
+    return (
+        model.get_name(),
+        model.get_type(),
+        model.get_model_docs(),
+        sorted(im.get_path() for im in model.get_imports()),
+        {name: _dump_rule(rule) for name, rule in model.get_lexer_rules().items()},
+        {name: _dump_rule(rule) for name, rule in model.get_parser_rules().items()},
+    )
+
+
+@pytest.mark.parametrize('path', CORPUS, ids=os.path.basename)
+def test_corpus(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+
+    expected = _load_antlr(text, path, False)
+    assert not expected.has_errors()
+
+    actual = _load_fast(text, path, False)
+
+    assert _dump_model(actual) == _dump_model(expected)
+
+
+@pytest.mark.parametrize('text', SNIPPETS)
+def test_snippets(text):
+    expected = _load_antlr(text, '<in-memory>', True)
+    assert not expected.has_errors()
+
+    actual = _load_fast(text, '<in-memory>', True)
+
+    assert _dump_model(actual) == _dump_model(expected)
+
+
+def test_unsupported_syntax():
+    text = '''
+    grammar Args;
+    root[int x] returns [int y] : A ;
+    A : 'a' ;
+    '''
+
+    model = ModelImpl('<in-memory>', 0, True, False)
+    with pytest.raises(UnsupportedSyntax):
+        FastLoader(model, ModelCacheImpl()).load(text)
+    assert model.lookup_local('A') is None
@@ -0,0 +1,43 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip('sphinx')
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+JSON = os.path.join(ROOT, 'docs', 'examples', 'Json.g4')
+
+CODE = '''
+import sys
+
+import sphinx_a4doc
+
+from sphinx_a4doc.contrib.railroad_diagrams import Diagram
+from sphinx_a4doc.model.impl import ModelCacheImpl
+from sphinx_a4doc.model.model_renderer import Renderer
+
+cache = ModelCacheImpl()
+cache.set_fast_loader(True)
+model = cache.from_file(sys.argv[1])
+assert not model.has_errors()
+
+for rule in model.get_non_terminals():
+    dia = Diagram()
+    dia.render(dia.load(Renderer().visit(rule.content)))
+
+print(sorted(name for name in sys.modules if name.split('.')[0] == 'antlr4'))
+'''
+
+
+def test_fast_loader_does_not_import_antlr():
+    # Modules are checked in a new process, since other tests import ANTLR.
+    result = subprocess.run(
+        [sys.executable, '-c', CODE, JSON],
+        cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True, check=True
+    )
+    assert result.stdout.strip() == '[]'
@@ -0,0 +1,54 @@
+import pytest
+
+pytest.importorskip('sphinx')
+
+from sphinx_a4doc.model.impl import ModelCacheImpl
+
+
+@pytest.fixture(params=['antlr', 'fast'])
+def cache(request):
+    if request.param == 'antlr':
+        pytest.importorskip('antlr4')
+    cache = ModelCacheImpl()
+    cache.set_fast_loader(request.param == 'fast')
+    return cache
+
+
+@pytest.mark.parametrize('body', [
+    "'a'",
+    "'a' {action();}",
+    "{action();} 'a'",
+    "'' 'a'",
+    "'a' ''",
+    "'a' []",
+    "('a')",
+    "('a' {action();})",
+    "'a' -> skip",
+    "'a' {action();} -> channel(HIDDEN)",
+    "x='a'",
+])
+def test_literal(cache, body):
+    model = cache.from_text(f'lexer grammar X;\nA : {body} ;\n')
+    rule = model.lookup('A')
+    assert rule.is_literal
+    assert str(rule.content) == "'a'"
+    assert model.lookup("'a'") is rule
+
+
+@pytest.mark.parametrize('body', [
+    "'a' 'b'",
+    "'a' | 'b'",
+    "'a'?",
+    "'a'*",
+    "'a' | ''",
+    "('a' | {action();})",
+    "('a' | {action();}) | 'b'",
+    "'a' B",
+    "''",
+    "[a]",
+])
+def test_not_literal(cache, body):
+    model = cache.from_text(f'lexer grammar X;\nA : {body} ;\nB : \'b\' ;\n')
+    rule = model.lookup('A')
+    assert not rule.is_literal
+    assert model.lookup("'a'") is None
@@ -0,0 +1,60 @@
+import pytest
+
+pytest.importorskip('sphinx')
+pytest.importorskip('antlr4')
+
+from sphinx_a4doc.model.impl import ModelCacheImpl
+from sphinx_a4doc.model.persistent_cache import PersistentModelCache
+
+
+TEXT = '''
+grammar X;
+root : A (',' A)* | b=B {action();} # Label ;
+other : /** inline */ root | ;
+A : [a-z]+ -> skip ;
+B : 'b' .. 'd' | ~[x] ;
+mode M;
+C : 'c' ;
+'''
+
+
+def _cache(tmp_path):
+    cache = ModelCacheImpl()
+    cache.set_fast_loader(False)
+    cache.set_persistent_cache(PersistentModelCache(str(tmp_path / 'cache')))
+    return cache
+
+
+def _rules(model):
+    return [*model.get_terminals(), *model.get_non_terminals()]
+
+
+def test_bodies_are_not_built_when_stored(tmp_path):
+    path = tmp_path / 'X.g4'
+    path.write_text(TEXT)
+
+    cache = _cache(tmp_path)
+    model = cache.from_file(str(path))
+    assert cache.get_persistent_cache().misses == 1
+
+    rules = _rules(model)
+    assert rules
+    for rule in rules:
+        assert '_lazy_content' in rule.__dict__, rule.name
+
+
+def test_bodies_are_built_from_source(tmp_path):
+    path = tmp_path / 'X.g4'
+    path.write_text(TEXT)
+
+    stored = _cache(tmp_path).from_file(str(path))
+    expected = {rule.name: str(rule.content) for rule in _rules(stored)}
+
+    cache = _cache(tmp_path)
+    model = cache.from_file(str(path))
+    assert cache.get_persistent_cache().hits == 1
+
+    assert {rule.name: str(rule.content) for rule in _rules(model)} == expected
+    assert expected['root'] == "A (',' A)* | B"
+    assert expected['A'] == '[a-z]+'
+    assert model.lookup('other').content.child.children[0].value == 'inline'
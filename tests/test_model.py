@@ -0,0 +1,83 @@
+import gc
+import pickle
+import weakref
+
+import pytest
+
+pytest.importorskip('sphinx')
+
+from sphinx_a4doc.model.impl import ModelCacheImpl
+from sphinx_a4doc.model.model import LexerRule, ParserRule, intern_content
+
+
+TEXT = '''
+grammar X;
+root : A (',' A)* | B (',' A)* ;
+other : A (',' A)* ;
+A : 'a' ;
+B : 'b' | A ;
+'''
+
+
+def _load(text=TEXT):
+    cache = ModelCacheImpl()
+    cache.set_fast_loader(True)
+    return cache.from_text(text)
+
+
+def test_equal_nodes_are_shared():
+    model = _load()
+    root = model.lookup('root').content
+    other = model.lookup('other').content
+    assert root.children[0] is other
+    assert root.children[1].children[1] is other.children[1]
+
+
+def test_nodes_are_not_shared_between_models():
+    a = _load().lookup('other').content
+    b = _load().lookup('other').content
+    assert str(a) == str(b) and a is not b
+    assert a.children[0].model is not b.children[0].model
+
+
+def test_references_are_bound():
+    model = _load()
+    ref = model.lookup('B').content.children[1]
+    assert isinstance(ref, LexerRule.Reference)
+    assert ref.get_reference() is model.lookup('A')
+
+
+def test_dropped_model_is_collected():
+    model = _load()
+    for rule in [*model.get_terminals(), *model.get_non_terminals()]:
+        str(rule.content)
+    assert model.get_references()
+    ref = weakref.ref(model)
+
+    del model, rule
+    gc.collect()
+
+    assert ref() is None
+
+
+def test_nodes_have_no_dict():
+    assert not hasattr(ParserRule.EMPTY, '__dict__')
+    assert not hasattr(LexerRule.Literal("'a'"), '__dict__')
+
+
+def test_sequence_linebreaks_dont_affect_equality():
+    a = LexerRule.Literal("'a'")
+    seq = LexerRule.Sequence((a, a))
+    assert seq.linebreaks is None
+    assert seq == LexerRule.Sequence((a, a), (False, True))
+    assert hash(seq) == hash(LexerRule.Sequence((a, a), (False, True)))
+    assert repr(seq) == repr(LexerRule.Sequence((a, a), (False, True)))
+
+
+def test_interning_keeps_linebreaks():
+    a = LexerRule.Literal("'a'")
+    plain = intern_content(LexerRule.Sequence((a, a)))
+    wrapped = intern_content(LexerRule.Sequence((a, a), (False, True)))
+    assert plain.linebreaks is None
+    assert wrapped.linebreaks == (False, True)
+    assert pickle.loads(pickle.dumps(wrapped)).linebreaks == (False, True)
@@ -0,0 +1,139 @@
+import re
+
+import pytest
+
+pytest.importorskip('sphinx')
+
+from sphinx_a4doc.contrib.railroad_diagrams import Diagram, FormattedItem, GridChoice
+from sphinx_a4doc.settings import DiagramSettings, InternalAlignment
+
+
+PATH_RE = re.compile(r'([Mmhva])([^Mmhva]*)')
+
+
+def _pieces(d):
+    # Splits path data into `(kind, start, end, sweep)` pieces.
+    pieces = []
+    x = y = None
+    for cmd, args in PATH_RE.findall(d):
+        args = [float(a) for a in args.split()]
+        if cmd == 'M':
+            x, y = args
+        elif cmd == 'm':
+            x, y = x + args[0], y + args[1]
+        elif cmd == 'h':
+            pieces.append(('line', (x, y), (x + args[0], y), None))
+            x += args[0]
+        elif cmd == 'v':
+            pieces.append(('line', (x, y), (x, y + args[0]), None))
+            y += args[0]
+        elif cmd == 'a':
+            pieces.append(('arc', (x, y), (x + args[5], y + args[6]), args[4]))
+            x, y = x + args[5], y + args[6]
+    return [p for p in pieces if p[1] != p[2]]
+
+
+def _collect(fmt: FormattedItem, pieces, rects):
+    item = fmt.diagram_item
+    if item.name == 'path':
+        pieces.extend(_pieces(item.attrs['d']))
+    elif item.name == 'rect':
+        a = item.attrs
+        rects.append((a['x'], a['y'] + a['height'] / 2, a['x'] + a['width']))
+    for child in fmt.children:
+        if isinstance(child, FormattedItem):
+            _collect(child, pieces, rects)
+    return pieces, rects
+
+
+def _on_line(point, piece):
+    kind, (x1, y1), (x2, y2), _ = piece
+    px, py = point
+    return (
+        kind == 'line' and
+        min(x1, x2) <= px <= max(x1, x2) and
+        min(y1, y2) <= py <= max(y1, y2)
+    )
+
+
+def _dangling(pieces):
+    # Ends of pieces that don't touch any other piece.
+    result = set()
+    for i, piece in enumerate(pieces):
+        for point in piece[1:3]:
+            if not any(
+                j != i and (point in other[1:3] or _on_line(point, other))
+                for j, other in enumerate(pieces)
+            ):
+                result.add(point)
+    return result
+
+
+@pytest.fixture
+def dia():
+    return Diagram(settings=DiagramSettings(
+        choice_grid_threshold=3,
+        max_width=300,
+        internal_alignment=InternalAlignment.LEFT,
+    ))
+
+
+@pytest.fixture
+def grid(dia):
+    grid = dia.choice(*[dia.terminal(text) for text in 'abcdefgh'])
+    assert isinstance(grid, GridChoice)
+    assert len(grid.column_widths) > 1
+    return grid
+
+
+def _format(grid, reverse):
+    return _collect(grid.format(5, 7, grid.width, reverse, InternalAlignment.LEFT), [], [])
+
+
+@pytest.mark.parametrize('reverse', [False, True])
+def test_grid_choice_is_connected(grid, reverse):
+    pieces, rects = _format(grid, reverse)
+
+    assert len(rects) == 8
+    ends = {point for piece in pieces for point in piece[1:3]}
+    assert {(5, 7), (5 + grid.width, 7)} <= ends
+
+    # Entry and exit of the grid may also be forks, so they aren't
+    # necessarily dangling; every other loose end must be a node.
+    terminals = set()
+    for left, y, right in rects:
+        terminals.add((left, y))
+        terminals.add((right, y))
+    assert _dangling(pieces) - {(5, 7), (5 + grid.width, 7)} == terminals
+
+
+def test_grid_choice_exit_bus(grid):
+    pieces, rects = _format(grid, False)
+    bus_y = 7 + grid.down
+    arc_radius = grid.settings.arc_radius
+
+    bus = [p for p in pieces if p[0] == 'line' and p[1][1] == p[2][1] == bus_y]
+    assert len(bus) == 1
+    _, (start, _), (end, _), _ = bus[0]
+
+    # Bus starts right where the first exit rail turns into it.
+    first_rail_x = min(right for _, _, right in rects) + arc_radius
+    assert start == first_rail_x + arc_radius
+    assert end == 5 + grid.width - arc_radius * 2
+
+
+def test_grid_choice_reverse_is_mirrored(grid):
+    pieces, rects = _format(grid, False)
+    r_pieces, r_rects = _format(grid, True)
+
+    def mirror(point):
+        return 2 * 5 + grid.width - point[0], point[1]
+
+    assert sorted(
+        (kind, mirror(start), mirror(end), None if sweep is None else 1 - sweep)
+        for kind, start, end, sweep in pieces
+    ) == sorted(r_pieces)
+    assert sorted(
+        (2 * 5 + grid.width - right, y, 2 * 5 + grid.width - left)
+        for left, y, right in rects
+    ) == sorted(r_rects)
@@ -0,0 +1,61 @@
+import pytest
+
+pytest.importorskip('sphinx')
+
+from sphinx_a4doc.model.impl import ModelCacheImpl
+
+
+LEXER = '''
+lexer grammar L;
+A : 'a' ;
+B : A A ;
+'''
+
+PARSER = '''
+parser grammar P;
+options { tokenVocab = L; }
+y : A ;
+x : A B | y ;
+'''
+
+OTHER = '''
+parser grammar O;
+options { tokenVocab = L; }
+z : A ;
+'''
+
+
+@pytest.fixture
+def cache(tmp_path):
+    for name, text in [('L', LEXER), ('P', PARSER), ('O', OTHER)]:
+        (tmp_path / f'{name}.g4').write_text(text)
+    cache = ModelCacheImpl()
+    cache.set_fast_loader(True)
+    return cache
+
+
+def _names(rules):
+    return [rule.name for rule in rules]
+
+
+def test_referrers(cache, tmp_path):
+    parser = cache.from_file(str(tmp_path / 'P.g4'))
+    lexer = cache.from_file(str(tmp_path / 'L.g4'))
+
+    a = lexer.lookup('A')
+    assert _names(cache.get_referrers(a, parser)) == ['B', 'y', 'x']
+    assert _names(cache.get_referrers(a, lexer)) == ['B']
+    assert _names(cache.get_referrers(parser.lookup('y'), parser)) == ['x']
+    assert cache.get_referrers(parser.lookup('x'), parser) == []
+
+
+def test_referrers_dont_depend_on_loaded_models(cache, tmp_path):
+    parser = cache.from_file(str(tmp_path / 'P.g4'))
+    a = parser.lookup('A')
+    expected = cache.get_referrers(a, parser)
+
+    cache.from_file(str(tmp_path / 'O.g4'))
+    assert cache.get_referrers(a, parser) == expected
+
+    cache.set_limits(max_models=2)
+    assert _names(cache.get_referrers(a, parser)) == _names(expected)
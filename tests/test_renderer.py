@@ -0,0 +1,164 @@
+import random
+
+import pytest
+
+pytest.importorskip('sphinx')
+
+from sphinx_a4doc.model.impl import ModelCacheImpl
+from sphinx_a4doc.model.model import LexerRule
+from sphinx_a4doc.model.model_renderer import Renderer
+
+
+class _BaselineRenderer(Renderer):
+    # Quadratic implementation of `_optimize_sequence` that was used before
+    # it was rewritten as a single pass. Output of both must be identical.
+
+    def _optimize_sequence(self, seq, lb):
+        assert len(seq) == len(lb)
+
+        for i in range(len(seq) - 1, -1, -1):
+            star = seq[i]
+
+            if not isinstance(star, LexerRule.ZeroPlus):
+                continue
+            if not isinstance(star.child, LexerRule.Sequence):
+                continue
+
+            nested_seq = list(star.child.children)
+            nested_seq_lb = list(star.child.get_linebreaks())
+
+            for j in range(len(nested_seq) - 1, -1, -1):
+                k = i + j - len(nested_seq)
+                if k < 0 or seq[k] != nested_seq[j]:
+                    seq_start = k + 1
+                    nested_seq_start = j + 1
+                    break
+            else:
+                seq_start = i - len(nested_seq)
+                nested_seq_start = 0
+
+            if seq_start == i:
+                continue
+
+            repeat = self._optimize_sequence(nested_seq[:nested_seq_start],
+                                             nested_seq_lb[:nested_seq_start])
+            main = self._optimize_sequence(nested_seq[nested_seq_start:],
+                                           nested_seq_lb[nested_seq_start:])
+
+            item = self._one_or_more(main, repeat)
+
+            seq[seq_start:i + 1] = [item]
+            lb[seq_start:i + 1] = [any(lb[seq_start:i + 1])]
+
+            return self._optimize_sequence(seq, lb)
+
+        return self._sequence(*[
+            e if isinstance(e, dict) else self.visit(e) for e in seq
+        ], linebreaks=lb)
+
+
+def _lit(name):
+    return LexerRule.Literal(f"'{name}'")
+
+
+def _seq(*children, linebreaks=None):
+    return LexerRule.Sequence(tuple(children), linebreaks)
+
+
+def _star(*children):
+    return LexerRule.ZeroPlus(_seq(*children))
+
+
+X, SEP, SEMI, Y = _lit('x'), _lit(','), _lit(';'), _lit('y')
+
+CORPUS = [
+    _seq(X, _star(SEP, X)),
+    _seq(X, Y, _star(SEP, X, Y)),
+    _seq(X, Y, _star(X, Y)),
+    _seq(Y, X, _star(SEP, X)),
+    _seq(X, _star(SEP, X), Y, _star(SEP, Y)),
+    _seq(X, _star(SEP, X, _star(SEMI, X))),
+    _seq(X, _star(SEMI, X), _star(SEP, X, _star(SEMI, X))),
+    _seq(X, _star(SEP, Y)),
+    _seq(_star(SEP, X), X),
+    _seq(X, X, _star(X), _star(X, X)),
+    _seq(X, _star(SEP, X), linebreaks=(True, False)),
+    _seq(X, SEP, _star(SEP, X), linebreaks=(False, True, False)),
+]
+
+
+def _random_sequence(rnd: random.Random, depth=0):
+    items = []
+    for _ in range(rnd.randint(1, 12)):
+        if items and depth < 2 and rnd.random() < 0.3:
+            # Mostly repeat a suffix of the sequence, so that it's folded.
+            suffix = items[-rnd.randint(1, len(items)):]
+            if rnd.random() < 0.3:
+                suffix = [rnd.choice([X, Y])] + suffix
+            prefix = [rnd.choice([SEP, SEMI]) for _ in range(rnd.randint(0, 2))]
+            children = prefix + suffix
+            if rnd.random() < 0.2:
+                children.append(_random_sequence(rnd, depth + 1))
+            items.append(LexerRule.ZeroPlus(_seq(*children)))
+        else:
+            items.append(rnd.choice([X, Y, SEP, SEMI]))
+    return _seq(*items, linebreaks=tuple(rnd.random() < 0.2 for _ in items))
+
+
+@pytest.mark.parametrize('content', CORPUS, ids=str)
+def test_optimize_sequence_corpus(content):
+    assert Renderer().visit(content) == _BaselineRenderer().visit(content)
+
+
+def test_optimize_sequence_random():
+    rnd = random.Random(42)
+    folded = 0
+    for _ in range(2000):
+        content = _random_sequence(rnd)
+        expected = _BaselineRenderer().visit(content)
+        assert Renderer().visit(content) == expected, str(content)
+        folded += 'one_or_more' in repr(expected)
+    # Make sure that the corpus actually exercises folding.
+    assert folded > 1000
+
+
+def test_optimize_sequence():
+    assert Renderer().visit(_seq(X, _star(SEP, X))) == Renderer._sequence(
+        Renderer._one_or_more(
+            Renderer._sequence(Renderer._literal("'x'"), linebreaks=[False]),
+            Renderer._sequence(Renderer._literal("','"), linebreaks=[False]),
+        ),
+        linebreaks=[False],
+    )
+
+
+def test_recursive_inline_rule(caplog):
+    cache = ModelCacheImpl()
+    cache.set_fast_loader(True)
+    model = cache.from_text('grammar X;\nr : a ;\n//@ doc:inline\na : B a? ;\nB : \'b\' ;\n')
+
+    # Rule is expanded once, and refers itself from within the expansion.
+    expected = Renderer._sequence(
+        Renderer._terminal('b', 'X.B'),
+        Renderer._optional(Renderer._non_terminal('a', 'X.a', title_is_weak=True)),
+        linebreaks=list(model.lookup('a').content.get_linebreaks()),
+    )
+    assert Renderer().visit(model.lookup('r').content) == expected
+    assert Renderer().visit(model.lookup('r').content) == expected
+
+    warnings = [r.getMessage() for r in caplog.records if 'is recursive' in r.getMessage()]
+    assert len(warnings) == 1
+    assert warnings[0].startswith('<in-memory>:3: WARNING: inline rule \'a\'')
+
+
+def test_inline_rules_are_not_shared_between_renderers():
+    cache = ModelCacheImpl()
+    cache.set_fast_loader(True)
+    model = cache.from_text('grammar X;\nr : a ;\n//@ doc:inline\na : X (\',\' X)* ;\nX : \'x\' ;\n')
+
+    class DashRenderer(Renderer):
+        def _optimize_sequence(self, seq, lb):
+            return self._terminal('-')
+
+    assert Renderer().visit(model.lookup('r').content) != Renderer._terminal('-')
+    assert DashRenderer().visit(model.lookup('r').content) == Renderer._terminal('-')
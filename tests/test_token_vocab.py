@@ -0,0 +1,33 @@
+import pytest
+
+pytest.importorskip('sphinx')
+
+from sphinx_a4doc.model.impl import ModelCacheImpl
+from sphinx_a4doc.model.reachable_finder import find_reachable_rules
+
+
+@pytest.fixture
+def cache(tmp_path):
+    (tmp_path / 'L.g4').write_text("lexer grammar L;\nA : 'a' ;\nB : F+ ;\nfragment F : [b] ;\n")
+    (tmp_path / 'L.tokens').write_text("A=1\nB=2\n'a'=1\n")
+    (tmp_path / 'P.g4').write_text('parser grammar P;\noptions { tokenVocab = L; }\nr : A s ;\ns : B ;\nt : A ;\n')
+    cache = ModelCacheImpl()
+    cache.set_fast_loader(True)
+    cache.set_token_vocab_files(True)
+    return cache
+
+
+def test_reachable_rules_dont_load_lexer(cache, tmp_path):
+    parser = cache.from_file(str(tmp_path / 'P.g4'))
+
+    reachable = find_reachable_rules(parser.lookup('r'))
+
+    assert {rule.name for rule in reachable} == {'r', 's', 'A', 'B'}
+    assert not cache.is_loaded(str(tmp_path / 'L.g4'))
+
+
+def test_lexer_is_loaded_on_demand(cache, tmp_path):
+    parser = cache.from_file(str(tmp_path / 'P.g4'))
+
+    assert str(parser.lookup('B').content) == 'F+'
+    assert cache.is_loaded(str(tmp_path / 'L.g4'))
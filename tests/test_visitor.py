@@ -0,0 +1,73 @@
+import pytest
+
+pytest.importorskip('sphinx')
+
+from sphinx_a4doc.model.model import LexerRule, ParserRule, intern_content
+from sphinx_a4doc.model.visitor import RuleContentVisitor, CachedRuleContentVisitor
+
+
+def _nested(depth):
+    content = ParserRule.WILDCARD
+    for _ in range(depth):
+        content = ParserRule.Maybe(content)
+    # Interning caches hashes bottom-up, so that hashing doesn't recurse.
+    return intern_content(content)
+
+
+class _Depth(CachedRuleContentVisitor[int]):
+    def __init__(self, iterative=True):
+        super().__init__(iterative)
+        self.visited = []
+
+    def visit_default(self, r):
+        self.visited.append(r)
+        return 0
+
+    def visit_maybe(self, r):
+        self.visited.append(r)
+        return self.visit(r.child) + 1
+
+    def visit_sequence(self, r):
+        # Only the first child is visited.
+        self.visited.append(r)
+        return self.visit(r.children[0]) + 1
+
+
+def test_dispatch():
+    class Visitor(RuleContentVisitor[str]):
+        def visit_literal(self, r):
+            return 'literal'
+
+        def visit_lexer_charset(self, r):
+            return 'lexer charset'
+
+        def visit_wildcard(self, r):
+            return 'wildcard'
+
+        def visit_parser_wildcard(self, r):
+            return 'parser wildcard'
+
+    visitor = Visitor()
+    assert visitor.visit(LexerRule.Literal("'a'")) == 'literal'
+    assert visitor.visit(LexerRule.CharSet('[a]')) == 'lexer charset'
+    assert visitor.visit(LexerRule.WILDCARD) == 'wildcard'
+    assert visitor.visit(ParserRule.WILDCARD) == 'parser wildcard'
+    with pytest.raises(RuntimeError):
+        visitor.visit(LexerRule.Range('a', 'b'))
+
+
+def test_deep_body():
+    depth = 20000
+    assert _Depth().visit(_nested(depth)) == depth
+    with pytest.raises(RecursionError):
+        _Depth(iterative=False).visit(_nested(depth))
+
+
+def test_skipped_children_are_not_visited():
+    skipped = ParserRule.Maybe(ParserRule.Doc('skipped'))
+    content = intern_content(ParserRule.Sequence((_nested(10), skipped)))
+
+    visitor = _Depth()
+    assert visitor.visit(content) == 11
+    assert content.children[1] not in visitor.visited
+    assert content.children[1].child not in visitor.visited